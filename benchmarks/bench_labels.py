@@ -0,0 +1,150 @@
+"""
+Benchmark of the query fetching the labels of many entities, on entities
+with several labels per label predicate (e.g. one per language).
+
+Compares the former query, with one OPTIONAL per label predicate (whose
+rows are the cross product of the labels of every predicate), with the
+current one, a UNION binding ?label_pred (whose rows are the labels).
+Both are run on an in-memory rdflib graph, reporting the rows returned,
+the time to run the query and collect the labels, and the labels
+collected, which should be the same:
+
+    python benchmarks/bench_labels.py --entities 500 --labels 1 4 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import rdflib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), "grontopi")
+EX = rdflib.Namespace("http://example.org/kg/")
+LANGUAGES = ["en", "es", "fr", "de", "it", "pt", "nl", "ca", "eu", "gl"]
+
+
+def load_access_class(workdir: str):
+    # The label predicates are read from the config, which is loaded when
+    # the module is first imported
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as fout:
+        json.dump({"cache_backend": "memory",
+                   "logging_config": {"level": "WARNING"}}, fout)
+    os.environ["CONFIG_PATH"] = config_path
+    sys.path.insert(0, APP_DIR)
+    from config import conf
+    from data_access.sparql_data_access import SPARQLAccess
+    return SPARQLAccess, conf
+
+
+def make_graph(num_entities: int, labels: int) -> rdflib.Graph:
+    """
+    Entities with `labels` rdfs:labels and as many skos:prefLabels, each in
+    a different language
+    """
+    graph = rdflib.Graph()
+    for i in range(num_entities):
+        entity = EX[f"E{i}"]
+        for j in range(labels):
+            lang = LANGUAGES[j % len(LANGUAGES)]
+            graph.add((entity, rdflib.RDFS.label,
+                       rdflib.Literal(f"Entity {i} {j}", lang=lang)))
+            graph.add((entity, rdflib.namespace.SKOS.prefLabel,
+                       rdflib.Literal(f"E{i} ({j})", lang=lang)))
+    return graph
+
+
+def optional_query(entity_ids, label_uris) -> str:
+    # The query as it was, for comparison
+    varnames = [f"?labvar_{i}" for i in range(len(label_uris))]
+    optionals = "".join(f"OPTIONAL {{ ?s {rdflib.URIRef(lu).n3()} {vn} }} .\n"
+                        for vn, lu in zip(varnames, label_uris))
+    subjvalues = " ".join(rdflib.URIRef(e).n3() for e in entity_ids)
+    return f"""
+        SELECT ?s {" ".join(varnames)}
+        WHERE {{
+            VALUES ?s {{ {subjvalues} }}
+            {optionals}
+        }}
+    """
+
+
+def collect_optional(response_json, label_uris) -> dict:
+    ent2labels = {}
+    for binding in response_json["results"]["bindings"]:
+        labels = ent2labels.setdefault(binding["s"]["value"], set())
+        for i, lu in enumerate(label_uris):
+            value = binding.get(f"labvar_{i}")
+            if value is not None:
+                labels.add((str(lu), value["value"],
+                            value.get("xml:lang", "")))
+    return ent2labels
+
+
+def run_query(graph: rdflib.Graph, query: str) -> dict:
+    return json.loads(graph.query(query).serialize(format="json"))
+
+
+def measure(fun, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        stime = time.perf_counter()
+        result = fun()
+        times.append(time.perf_counter() - stime)
+    return {"best_s": min(times), "median_s": statistics.median(times),
+            "result": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--labels", type=int, nargs="+", default=[1, 4, 8],
+                        help="labels of every entity, per label predicate")
+    parser.add_argument("--batch", type=int, default=100,
+                        help="entities per query")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="grontopi_labels_bench_")
+    SPARQLAccess, conf = load_access_class(workdir)
+    access = SPARQLAccess(query_endpoint="http://localhost/unused")
+    label_uris = conf.label_uris
+
+    for labels in args.labels:
+        graph = make_graph(args.entities, labels)
+        entity_ids = [str(EX[f"E{i}"]) for i in range(args.entities)]
+        batches = [entity_ids[i:i + args.batch]
+                   for i in range(0, len(entity_ids), args.batch)]
+
+        def old():
+            rows, ent2labels = 0, {}
+            for batch in batches:
+                resp = run_query(graph, optional_query(batch, label_uris))
+                rows += len(resp["results"]["bindings"])
+                ent2labels.update(collect_optional(resp, label_uris))
+            return rows, sum(len(v) for v in ent2labels.values())
+
+        def new():
+            rows, ent2labels = 0, {}
+            for batch in batches:
+                resp = run_query(graph,
+                                 access._query_many_entity_labels(batch))
+                rows += len(resp["results"]["bindings"])
+                ent2labels.update(access._collect_labels_for_entities(resp))
+            return rows, sum(len(v) for v in ent2labels.values())
+
+        print(f"{args.entities} entities, {labels} labels per predicate")
+        for name, fun in (("OPTIONAL", old), ("UNION", new)):
+            res = measure(fun, args.repeat)
+            rows, collected = res["result"]
+            print(f"  {name:9s} rows {rows:9d}  labels {collected:7d}  "
+                  f"best {res['best_s']:9.4f}s  "
+                  f"median {res['median_s']:9.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks of OntologyReader on synthetic OWL/SKOS ontologies.
+
+For every combination of the given sizes, times (best and median of
+--repeat runs) and measures the peak memory allocated by
+OntologyReader.__init__, get_classes, get_relations, get_properties,
+get_catalogues and get_maximal_class. Results are appended, as one JSON
+object per line tagged with the current git commit, to --results, so that
+runs on different commits can be compared:
+
+    python benchmarks/bench_ontology.py --classes 50 200 800 --depth 4 \\
+        --catalogues 5 --catalogue-size 200
+    python benchmarks/bench_ontology.py --compare HEAD~1 HEAD
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import ONTNS, SyntheticOntology
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), "grontopi")
+DEFAULT_RESULTS = os.path.join(HERE, "results", "ontology.jsonl")
+
+
+def git_commit(ref: str = "HEAD") -> str:
+    """
+    The short hash of ref, as results are tagged, or ref itself if git
+    cannot resolve it (e.g. a hash of a commit no longer in the repo)
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", ref], cwd=HERE, text=True,
+            stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown" if ref == "HEAD" else ref
+
+
+def load_reader_class(workdir: str):
+    # OntologyReader reads the namespace of the ontology from the config,
+    # which is loaded when the module is first imported
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as fout:
+        json.dump({"ontonamespace": str(ONTNS),
+                   "cache_backend": "memory",
+                   "logging_config": {"level": "WARNING"}}, fout)
+    os.environ["CONFIG_PATH"] = config_path
+    sys.path.insert(0, APP_DIR)
+    from utils.owlreading import OntologyReader
+    return OntologyReader
+
+
+def measure(fun, repeat: int):
+    times = []
+    for _ in range(repeat):
+        stime = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - stime)
+    tracemalloc.start()
+    fun()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"best_s": min(times),
+            "median_s": statistics.median(times),
+            "peak_kb": round(peak / 1024, 1)}
+
+
+def bench_one(OntologyReader, workdir: str, params: dict, repeat: int,
+              seed: int) -> dict:
+    onto = SyntheticOntology(seed=seed, **params)
+    path = os.path.join(workdir, "ontology.ttl")
+    onto.serialize(path)
+
+    results = {"__init__": measure(lambda: OntologyReader(path), repeat)}
+    reader = OntologyReader(path)
+    rng = random.Random(seed)
+    classlists = [[c.n3() for c in rng.sample(onto.classes,
+                                              min(3, len(onto.classes)))]
+                  for _ in range(1000)]
+
+    def maximal_classes():
+        for cl in classlists:
+            reader.get_maximal_class(cl)
+
+    results["get_classes"] = measure(reader.get_classes, repeat)
+    results["get_relations"] = measure(reader.get_relations, repeat)
+    results["get_properties"] = measure(reader.get_properties, repeat)
+    results["get_catalogues"] = measure(reader.get_catalogues, repeat)
+    # 1000 calls, as a single call is too fast to time reliably
+    results["get_maximal_class_x1000"] = measure(maximal_classes, repeat)
+    return results
+
+
+def compare(results_path: str, base: str, head: str):
+    # Results are tagged with short hashes, refs like HEAD~1 are resolved
+    base, head = git_commit(base), git_commit(head)
+    runs = {}
+    with open(results_path) as fin:
+        for line in fin:
+            run = json.loads(line)
+            key = json.dumps(run["params"], sort_keys=True)
+            runs[(run["commit"], key)] = run["results"]
+    keys = sorted({k for c, k in runs if c in (base, head)})
+    for key in keys:
+        if (base, key) not in runs or (head, key) not in runs:
+            continue
+        print(key)
+        for method, res in runs[(head, key)].items():
+            before = runs[(base, key)].get(method)
+            if before is None:
+                continue
+            ratio = res["median_s"] / max(before["median_s"], 1e-9)
+            print(f"  {method:26s} {before['median_s']:10.5f}s -> "
+                  f"{res['median_s']:10.5f}s  x{ratio:5.2f}   "
+                  f"{before['peak_kb']:10.1f}kB -> {res['peak_kb']:10.1f}kB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classes", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--depth", type=int, nargs="+", default=[3])
+    parser.add_argument("--relations-per-class", type=float, default=1.0)
+    parser.add_argument("--union-ratio", type=float, nargs="+",
+                        default=[0.2],
+                        help="share of relations with a union domain")
+    parser.add_argument("--catalogues", type=int, nargs="+", default=[2])
+    parser.add_argument("--catalogue-size", type=int, nargs="+",
+                        default=[50])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=DEFAULT_RESULTS)
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"),
+                        help="compare the stored results of two commits")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results, *args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="grontopi_onto_bench_")
+    OntologyReader = load_reader_class(workdir)
+    commit = git_commit()
+    os.makedirs(os.path.dirname(args.results), exist_ok=True)
+
+    grid = itertools.product(args.classes, args.depth, args.union_ratio,
+                             args.catalogues, args.catalogue_size)
+    for ncls, depth, union_ratio, ncats, catsize in grid:
+        params = {"num_classes": ncls, "depth": depth,
+                  "num_relations": max(1, int(ncls *
+                                              args.relations_per_class)),
+                  "union_domain_ratio": union_ratio,
+                  "num_catalogues": ncats, "catalogue_size": catsize}
+        results = bench_one(OntologyReader, workdir, params, args.repeat,
+                            args.seed)
+        run = {"commit": commit, "time": time.time(), "params": params,
+               "results": results}
+        with open(args.results, "a") as fout:
+            fout.write(json.dumps(run) + "\n")
+        print(json.dumps(params))
+        for method, res in results.items():
+            print(f"  {method:26s} best {res['best_s']:9.5f}s  "
+                  f"median {res['median_s']:9.5f}s  "
+                  f"peak {res['peak_kb']:10.1f}kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of the x2KG converter on a large generated wikitable.
+
+Compares building the whole graph and serializing it as Turtle with
+streaming N-Triples (plain and gzip-compressed), reporting time and peak
+memory (as traced by tracemalloc) of each. Links are resolved with a
+generated wikimapper database, unless another one is given:
+
+    python benchmarks/bench_x2kg.py --rows 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import rdflib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "grontopi", "utils"))
+
+import x2KG  # noqa: E402
+
+COLUMNS = ["Target", "Title", "Date", "Place", "Country",
+           "Assassin or other entity", "class=unsortable|Ref"]
+
+
+def make_wikitable(num_rows: int, num_distinct: int, seed: int = 0) -> str:
+    """
+    A wikitable like the one in sample_data, whose link columns draw from
+    pools of `num_distinct` entities, with some rowspans
+    """
+    rng = random.Random(seed)
+    lines = ["Some text before the table", '{| class="wikitable sortable"']
+    lines += ["!" + c for c in COLUMNS]
+    spanning = 0
+    for i in range(num_rows):
+        lines.append("|-")
+        lines.append(f"|[[Person {i}]]")
+        if spanning == 0 and rng.random() < 0.1:
+            spanning = 3
+            lines.append(f'| rowspan="3" |[[Office '
+                         f'{rng.randrange(num_distinct)}]]')
+        elif spanning == 0:
+            lines.append(f"|[[Office {rng.randrange(num_distinct)}]]")
+        spanning = max(0, spanning - 1)
+        lines.append(f"|{{{{dts|{rng.randrange(-2000, 2022)}}}}}")
+        lines.append(f"|[[City {rng.randrange(num_distinct)}]]")
+        lines.append(f"|{{{{flag|Country {rng.randrange(num_distinct)}}}}}")
+        lines.append(f"|[[Person {rng.randrange(num_rows)}]] and "
+                     f"[[Group {rng.randrange(num_distinct)}]]")
+        lines.append("|<ref>A reference</ref>")
+    lines.append("|}")
+    return "\n".join(lines)
+
+
+def make_mapping_db(path: str, num_rows: int, num_distinct: int):
+    """
+    A wikimapper-like database mapping every other generated page name
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE mapping (wikipedia_id INTEGER, "
+                 "wikipedia_title TEXT, wikidata_id TEXT)")
+    names = [f"Person_{i}" for i in range(num_rows)]
+    for prefix in ["Office", "City", "Country", "Group"]:
+        names += [f"{prefix}_{i}" for i in range(num_distinct)]
+    conn.executemany("INSERT INTO mapping VALUES (?, ?, ?)",
+                     [(i, name, f"Q{i}") for i, name in enumerate(names)
+                      if i % 2 == 0])
+    conn.execute("CREATE INDEX idx_title ON mapping(wikipedia_title)")
+    conn.commit()
+    conn.close()
+
+
+def make_converter(mapping):
+    ontns = rdflib.namespace.Namespace("https://sample.ontolog/")
+    return x2KG.Records2RDF(
+        record_class=ontns["Event"],
+        column_classes={"Target": ontns["Person"],
+                        "Title": ontns["Office"],
+                        "Place": ontns["Place"],
+                        "Assassin or other entity":
+                            ontns["Collective_Person"],
+                        "Country": ontns["Place"]},
+        row_to_oolumn_links={"Target": ontns["hasAsVictim"],
+                             "Place": ontns["happenedInPlace"],
+                             "Assassin or other entity":
+                                 ontns["hasAsPerpetrator"],
+                             "Date": ontns["occurredInDate"]},
+        intercolumn_links={("Target", "Title"): ontns["holdsOfficeOf"],
+                           ("Target", "Country"): ontns["livedInCountry"],
+                           ("Place", "Country"): ontns["isLocatedIn"]},
+        rowname_pattern="Assesination of {__Target__}",
+        entity_namespace=rdflib.namespace.Namespace(
+            "https://en.wikipedia.org/wiki/"),
+        mappingfile=mapping)
+
+
+def run(name, fun):
+    tracemalloc.start()
+    stime = time.perf_counter()
+    result = fun()
+    elapsed = time.perf_counter() - stime
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:22s} {elapsed:9.2f}s  peak {peak / 2 ** 20:9.1f}MB  "
+          f"{result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--distinct", type=int, default=500,
+                        help="size of the pools of offices, places...")
+    parser.add_argument("--mapping", default=None,
+                        help="a wikimapper database to resolve URIs with. "
+                             "By default one is generated for the table")
+    parser.add_argument("--no-mapping", action="store_true",
+                        help="keep wikipedia URIs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    text = make_wikitable(args.rows, args.distinct, args.seed)
+    outdir = tempfile.mkdtemp(prefix="grontopi_x2kg_bench_")
+    mapping = args.mapping
+    if mapping is None and not args.no_mapping:
+        mapping = os.path.join(outdir, "mapping.db")
+        make_mapping_db(mapping, args.rows, args.distinct)
+
+    def parse():
+        return len(x2KG.WikimarkupDynamicList(text).content)
+
+    def turtle():
+        wl = x2KG.WikimarkupDynamicList(text)
+        g = make_converter(mapping).convert(wl.content)
+        g.serialize(format="ttl", destination=os.path.join(outdir, "kg.ttl"))
+        return len(g)
+
+    def ntriples(suffix):
+        def fun():
+            wl = x2KG.WikimarkupDynamicList(text)
+            # A new converter each time, so that URIs are resolved anew
+            return make_converter(mapping).convert_to_ntriples(
+                wl.content, os.path.join(outdir, "kg" + suffix))
+        return fun
+
+    print(f"{args.rows} rows, {len(text) / 2 ** 20:.1f}MB of wikitext")
+    run("parse", parse)
+    run("graph + turtle", turtle)
+    run("stream n-triples", ntriples(".nt"))
+    run("stream n-triples gzip", ntriples(".nt.gz"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Load test of GrOntoPI against a synthetic knowledge graph.
+
+Generates an ontology and a knowledge graph, serves the graph with the
+SPARQL stand-in (or uses an already running endpoint), starts GrOntoPI with
+uvicorn and drives every route with a configurable concurrency. Reports
+throughput, p50/p99 latency per route, error counts and the peak memory of
+the API process, as JSON.
+
+    python benchmarks/load_test.py --entities 2000 --requests 200 \\
+        --concurrency 8 --output bench_output.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+import httpx
+import psutil
+
+from synthetic import write_benchmark_data
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), "grontopi")
+
+
+def n3(uri: str) -> str:
+    return "<" + uri + ">"
+
+
+def build_scenarios(entities: List[str], classes: List[str],
+                    relations: List[str],
+                    rng: random.Random) -> Dict[str, Callable]:
+    """
+    Every scenario is a function returning the (method, path, params, json)
+    of one request. Keep one per route in routes.py.
+    """
+    def pick():
+        return n3(rng.choice(entities))
+
+    return {
+        "static_schemas": lambda: ("GET", "/static_schemas", {}, None),
+        "entities_by_id": lambda: ("GET", "/entities/by_id",
+                                   {"entity_id": pick()}, None),
+        "entities_by_ids": lambda: ("POST", "/entities/by_ids", {},
+                                    [pick() for _ in range(20)]),
+        "entity_links": lambda: ("GET", "/entities/links",
+                                 {"entity_id": pick(),
+                                  "predicate": n3(rng.choice(relations)),
+                                  "direction": rng.choice(("out", "in"))},
+                                 None),
+        "entities_by_class": lambda: (
+            "GET", "/entities/by_class_with_labels",
+            {"class_id": n3(rng.choice(classes)),
+             "per_page": 100}, None),
+        "entities_connected_to": lambda: ("GET", "/entitites/connected_to",
+                                          {"central_entity": pick()}, None),
+        "entities_connected_to_counts": lambda: (
+            "GET", "/entitites/connected_to",
+            {"central_entity": pick(), "counts_only": "true"}, None),
+        "entities_connected_to_many": lambda: (
+            "POST", "/entitites/connected_to_many", {},
+            [pick() for _ in range(20)]),
+        "entity_neighbourhood": lambda: ("GET", "/entities/neighbourhood",
+                                         {"central_entity": pick(),
+                                          "depth": 2}, None),
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def drive(base_url: str, make_request: Callable, num_requests: int,
+                concurrency: int) -> Dict:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        nonlocal errors
+        method, path, params, body = make_request()
+        async with semaphore:
+            stime = time.perf_counter()
+            try:
+                resp = await client.request(method, path, params=params,
+                                            json=body)
+                ok = resp.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - stime)
+            errors += 0 if ok else 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        stime = time.perf_counter()
+        await asyncio.gather(*[one(client) for _ in range(num_requests)])
+        elapsed = time.perf_counter() - stime
+
+    return {"requests": num_requests,
+            "errors": errors,
+            "throughput_rps": round(num_requests / elapsed, 2),
+            "p50_ms": round(1000 * percentile(latencies, 50), 2),
+            "p99_ms": round(1000 * percentile(latencies, 99), 2)}
+
+
+class PeakMemory(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                rss = self.process.memory_info().rss
+            except psutil.Error:
+                return
+            self.peak = max(self.peak, rss)
+            time.sleep(self.interval)
+
+
+def wait_for(url: str, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise TimeoutError(f"{url} did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--relations", type=int, default=20)
+    parser.add_argument("--degree", type=int, default=5,
+                        help="mean number of outgoing links per entity")
+    parser.add_argument("--hubs", type=int, default=5,
+                        help="number of entities receiving half the links")
+    parser.add_argument("--requests", type=int, default=100,
+                        help="requests per route and phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", nargs="*",
+                        help="only run these scenarios")
+    parser.add_argument("--endpoint",
+                        help="use this SPARQL endpoint instead of starting "
+                             "the stand-in; it must already hold the data "
+                             "written to --workdir")
+    parser.add_argument("--workdir", help="where to write generated data")
+    parser.add_argument("--sparql-port", type=int, default=3031)
+    parser.add_argument("--api-port", type=int, default=8031)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report here")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="grontopi_bench_")
+    endpoint = args.endpoint or \
+        f"http://127.0.0.1:{args.sparql_port}/sparql"
+    data = write_benchmark_data(workdir, num_classes=args.classes,
+                                num_relations=args.relations,
+                                num_entities=args.entities,
+                                mean_degree=args.degree,
+                                num_hubs=args.hubs,
+                                endpoint=endpoint, seed=args.seed)
+
+    processes = []
+    try:
+        if args.endpoint is None:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "sparql_standin.py"),
+                 data["kg"], "--port", str(args.sparql_port)]))
+            wait_for(endpoint + "?query=ASK%7B%7D")
+
+        env = dict(os.environ, CONFIG_PATH=data["config"])
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--port", str(args.api_port), "--log-level", "warning"],
+            cwd=APP_DIR, env=env)
+        processes.append(api)
+        base_url = f"http://127.0.0.1:{args.api_port}"
+        wait_for(base_url + "/openapi.json")
+
+        memory = PeakMemory(api.pid)
+        memory.start()
+        rng = random.Random(args.seed)
+        scenarios = build_scenarios(data["entities"], data["classes"],
+                                    data["relations"], rng)
+        report = {"parameters": vars(args), "routes": {}}
+        for name, make_request in scenarios.items():
+            if args.routes and name not in args.routes:
+                continue
+            # The first pass mostly misses the cache, the second one
+            # replays the same requests
+            rng.seed(args.seed)
+            cold = asyncio.run(drive(base_url, make_request, args.requests,
+                                     args.concurrency))
+            rng.seed(args.seed)
+            warm = asyncio.run(drive(base_url, make_request, args.requests,
+                                     args.concurrency))
+            report["routes"][name] = {"cold": cold, "warm": warm}
+            print(name, json.dumps(report["routes"][name]), flush=True)
+        memory.running = False
+        report["api_peak_rss_mb"] = round(memory.peak / 2 ** 20, 1)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(report, indent=1)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as fout:
+            fout.write(output)
+
+
+if __name__ == "__main__":
+    main()
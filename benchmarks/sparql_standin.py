@@ -0,0 +1,97 @@
+"""
+A minimal SPARQL 1.1 protocol endpoint serving an rdflib graph loaded from
+files. It is slow compared to a real triplestore, but it needs nothing else
+running and answers exactly the same queries, so that changes in the number
+and shape of the queries GrOntoPI makes show up in benchmarks.
+
+It also takes updates (application/sparql-update or update= POSTs) and
+N-Triples POSTed to /data, as the graph store protocol does, so that
+grontopi/utils/load_kg.py can be tried against it.
+
+    python benchmarks/sparql_standin.py kg.nt --port 3031
+"""
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import rdflib
+
+RESULTS_JSON = "application/sparql-results+json"
+
+
+class SPARQLHandler(BaseHTTPRequestHandler):
+    graph: rdflib.Graph = None
+    # rdflib graphs are not safe to query from several threads at once
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self._answer(params.get("query", [None])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("application/sparql-query"):
+            self._answer(body)
+        elif ctype.startswith("application/sparql-update"):
+            self._modify(lambda: self.graph.update(body))
+        elif ctype.startswith("application/n-triples"):
+            self._modify(lambda: self.graph.parse(data=body, format="nt"))
+        elif "update" in parse_qs(body):
+            update = parse_qs(body)["update"][0]
+            self._modify(lambda: self.graph.update(update))
+        else:
+            self._answer(parse_qs(body).get("query", [None])[0])
+
+    def _modify(self, change):
+        try:
+            with self.lock:
+                change()
+        except Exception as e:
+            self.send_error(400, str(e)[:200])
+            return
+        self.send_response(204)
+        self.end_headers()
+
+    def _answer(self, query):
+        if query is None:
+            self.send_error(400, "Missing query")
+            return
+        try:
+            with self.lock:
+                result = self.graph.query(query)
+                payload = result.serialize(format="json")
+        except Exception as e:
+            self.send_error(400, str(e)[:200])
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", RESULTS_JSON)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(paths, host="127.0.0.1", port=3031):
+    graph = rdflib.Graph()
+    for path in paths:
+        graph.parse(path)
+    SPARQLHandler.graph = graph
+    server = ThreadingHTTPServer((host, port), SPARQLHandler)
+    print(f"Serving {len(graph)} triples at http://{host}:{port}/sparql",
+          flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+",
+                        help="RDF files to load, in any format rdflib reads")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3031)
+    args = parser.parse_args()
+    serve(args.files, host=args.host, port=args.port)
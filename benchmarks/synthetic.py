@@ -0,0 +1,228 @@
+import json
+import random
+from typing import Dict, List
+
+import rdflib
+from rdflib.collection import Collection
+
+ONTNS = rdflib.namespace.Namespace("https://bench.grontopi/onto/")
+ENTNS = rdflib.namespace.Namespace("https://bench.grontopi/entity/")
+
+owlns = rdflib.namespace.OWL
+rdfns = rdflib.namespace.RDF
+rdfsns = rdflib.namespace.RDFS
+skosns = rdflib.namespace.SKOS
+xsdns = rdflib.namespace.XSD
+rdftype = rdfns["type"]
+
+LANGS = ["en", "es", "fr", "de"]
+
+
+class SyntheticOntology:
+    """
+    An ontology shaped the way GrOntoPI expects it: a tree of classes under
+    ThingsDomain, object properties between them and literal properties.
+
+    :param num_classes: number of classes, besides ThingsDomain
+    :param depth: depth of the subclass tree
+    :param num_relations: number of object properties
+    :param num_properties: number of literal (data) properties
+    :param union_domain_ratio: fraction of the object properties whose
+        domain is an owl:unionOf two classes
+    :param num_catalogues: number of SKOS catalogues
+    :param catalogue_size: number of concepts in every catalogue
+    """
+    def __init__(self, num_classes: int = 10, depth: int = 2,
+                 num_relations: int = 10, num_properties: int = 3,
+                 union_domain_ratio: float = 0.0,
+                 num_catalogues: int = 0, catalogue_size: int = 0,
+                 seed: int = 0):
+        self.rng = random.Random(seed)
+        self.graph = rdflib.Graph()
+        self.root = ONTNS["ThingsDomain"]
+        self.classes: List[rdflib.URIRef] = []
+        self.relations: List[rdflib.URIRef] = []
+        self.properties: List[rdflib.URIRef] = []
+        self.relation_ends: Dict[rdflib.URIRef, tuple] = {}
+
+        self._add_class(self.root, "Things Domain", None)
+        self._add_classes(num_classes, max(1, depth))
+        self._add_relations(num_relations, union_domain_ratio)
+        self._add_properties(num_properties)
+        self._add_catalogues(num_catalogues, catalogue_size)
+
+    def _add_class(self, cls, label, parent):
+        self.graph.add((cls, rdftype, owlns["Class"]))
+        self.graph.add((cls, rdfsns["label"], rdflib.Literal(label,
+                                                             lang="en")))
+        if parent is not None:
+            self.graph.add((cls, rdfsns["subClassOf"], parent))
+
+    def _add_classes(self, num_classes, depth):
+        levels = [[self.root]]
+        per_level = max(1, num_classes // depth)
+        for i in range(num_classes):
+            level = min(depth, 1 + i // per_level)
+            if len(levels) <= level:
+                levels.append([])
+            parent = self.rng.choice(levels[level - 1])
+            cls = ONTNS[f"Class{i}"]
+            self._add_class(cls, f"Class {i}", parent)
+            levels[level].append(cls)
+            self.classes.append(cls)
+
+    def _add_relations(self, num_relations, union_domain_ratio):
+        for i in range(num_relations):
+            rel = ONTNS[f"relation{i}"]
+            dom, ran = self.rng.choice(self.classes), \
+                self.rng.choice(self.classes)
+            self.graph.add((rel, rdftype, owlns["ObjectProperty"]))
+            self.graph.add((rel, rdfsns["label"],
+                            rdflib.Literal(f"relation {i}", lang="en")))
+            self.graph.add((rel, rdfsns["range"], ran))
+            if self.rng.random() < union_domain_ratio:
+                other = self.rng.choice(self.classes)
+                union = rdflib.BNode()
+                members = rdflib.BNode()
+                Collection(self.graph, members, [dom, other])
+                self.graph.add((union, rdftype, owlns["Class"]))
+                self.graph.add((union, owlns["unionOf"], members))
+                self.graph.add((rel, rdfsns["domain"], union))
+                self.relation_ends[rel] = ((dom, other), ran)
+            else:
+                self.graph.add((rel, rdfsns["domain"], dom))
+                self.relation_ends[rel] = ((dom,), ran)
+            self.relations.append(rel)
+
+    def _add_properties(self, num_properties):
+        for i in range(num_properties):
+            prop = ONTNS[f"property{i}"]
+            self.graph.add((prop, rdftype, rdfns["Property"]))
+            self.graph.add((prop, rdfsns["label"],
+                            rdflib.Literal(f"property {i}", lang="en")))
+            self.graph.add((prop, rdfsns["domain"],
+                            self.rng.choice(self.classes)))
+            self.graph.add((prop, rdfsns["range"], xsdns["string"]))
+            self.properties.append(prop)
+
+    def _add_catalogues(self, num_catalogues, catalogue_size):
+        for c in range(num_catalogues):
+            cat = ONTNS[f"Catalogue{c}"]
+            self.graph.add((cat, rdftype, ONTNS["Catalogo"]))
+            self.graph.add((cat, skosns["prefLabel"],
+                            rdflib.Literal(f"Catalogue {c}", lang="en")))
+            concepts = [cat]
+            for k in range(catalogue_size):
+                concept = ONTNS[f"Catalogue{c}_concept{k}"]
+                self.graph.add((concept, rdftype, skosns["Concept"]))
+                self.graph.add((concept, skosns["prefLabel"],
+                                rdflib.Literal(f"Concept {c}.{k}",
+                                               lang="en")))
+                self.graph.add((concept, skosns["altLabel"],
+                                rdflib.Literal(f"Concepto {c}.{k}",
+                                               lang="es")))
+                self.graph.add((concept, skosns["broader"],
+                                self.rng.choice(concepts)))
+                concepts.append(concept)
+
+    def serialize(self, destination: str):
+        self.graph.serialize(format="ttl", destination=destination)
+
+
+def make_knowledge_graph(onto: SyntheticOntology,
+                         num_entities: int = 1000,
+                         mean_degree: int = 5,
+                         num_hubs: int = 0,
+                         labels_per_entity: int = 1,
+                         seed: int = 0) -> rdflib.Graph:
+    """
+    Instances of the classes of `onto`, with labels in several languages,
+    literal properties and links. A few hub entities, if requested, are the
+    target of a large share of all links.
+    """
+    rng = random.Random(seed)
+    g = rdflib.Graph()
+    ents_by_class = {cls: [] for cls in onto.classes}
+    for i in range(num_entities):
+        ent = ENTNS[f"E{i}"]
+        cls = rng.choice(onto.classes)
+        ents_by_class[cls].append(ent)
+        g.add((ent, rdftype, cls))
+        for k in range(labels_per_entity):
+            for lang in LANGS[:1 + (i + k) % len(LANGS)]:
+                g.add((ent, rdfsns["label"],
+                       rdflib.Literal(f"Entity {i} {k} {lang}", lang=lang)))
+            g.add((ent, skosns["prefLabel"],
+                   rdflib.Literal(f"E{i} ({k})", lang="en")))
+        for prop in onto.properties:
+            g.add((ent, prop, rdflib.Literal(f"value of E{i}", lang="en")))
+
+    hubs = [ENTNS[f"E{i}"] for i in range(min(num_hubs, num_entities))]
+    for i in range(num_entities):
+        ent = ENTNS[f"E{i}"]
+        for _ in range(mean_degree):
+            rel = rng.choice(onto.relations)
+            _, ran = onto.relation_ends[rel]
+            if hubs and rng.random() < 0.5:
+                target = rng.choice(hubs)
+            elif ents_by_class[ran]:
+                target = rng.choice(ents_by_class[ran])
+            else:
+                continue
+            g.add((ent, rel, target))
+    return g
+
+
+def make_config(endpoint: str, ontology_path: str,
+                onto: SyntheticOntology, kg: rdflib.Graph) -> Dict:
+    entities = sorted({str(s) for s, _, _ in kg.triples((None, rdftype,
+                                                        None))})
+    return {
+        "sparql_endpoint": endpoint,
+        "different_graphs": False,
+        "ontology_path": ontology_path,
+        "ontonamespace": str(ONTNS),
+        "cache_backend": "memory",
+        "logging_config": {"level": "WARNING"},
+        "ontology_config": {
+            "type_predicate": [str(rdftype)],
+            "label_uris": [str(rdfsns["label"]), str(skosns["prefLabel"])]
+        },
+        "openAPIExamples": {
+            "entities": entities[:2],
+            "classes": [str(onto.classes[0])],
+            "default_language": "en"
+        }
+    }
+
+
+def write_benchmark_data(directory: str, num_classes: int = 20,
+                         num_relations: int = 20, num_entities: int = 1000,
+                         mean_degree: int = 5, num_hubs: int = 5,
+                         labels_per_entity: int = 1,
+                         endpoint: str = "http://127.0.0.1:3031/sparql",
+                         seed: int = 0) -> Dict:
+    """
+    Writes an ontology, a knowledge graph and a GrOntoPI config using them
+    into `directory`
+    :return: the paths of the written files (keys ontology, kg and config)
+        and the URIs of the generated entities, classes and relations
+    """
+    onto = SyntheticOntology(num_classes=num_classes, depth=3,
+                             num_relations=num_relations, seed=seed)
+    kg = make_knowledge_graph(onto, num_entities=num_entities,
+                              mean_degree=mean_degree, num_hubs=num_hubs,
+                              labels_per_entity=labels_per_entity,
+                              seed=seed)
+    result = {"ontology": f"{directory}/ontology.ttl",
+              "kg": f"{directory}/kg.nt",
+              "config": f"{directory}/config.json",
+              "entities": [str(ENTNS[f"E{i}"]) for i in range(num_entities)],
+              "classes": [str(c) for c in onto.classes],
+              "relations": [str(r) for r in onto.relations]}
+    onto.serialize(result["ontology"])
+    kg.serialize(format="nt", destination=result["kg"])
+    with open(result["config"], "w") as fout:
+        json.dump(make_config(endpoint, result["ontology"], onto, kg), fout,
+                  indent=1)
+    return result
@@ -6,6 +6,8 @@ from typing import List, Union
 
 import rdflib
 
+from utils.logconfig import setup_logging, DEFAULT_LOGGING_CONFIG
+
 owl_ns = rdflib.namespace.OWL
 rdf_ns = rdflib.namespace.RDF
 a = rdf_ns["type"]
@@ -22,6 +24,10 @@ class GrOntoPIConfig:
         self.auth_server_kid = None
         self.auth_server_n = None
         self.interservices_token = None
+        # Tokens whose signature was verified are remembered (until they
+        # expire, and at most this many seconds) to skip verifying them again
+        self.auth_token_cache_ttl = 300
+        self.auth_token_cache_size = 10000
         self.ontonamespace = "http://www.wikidata.org/wiki/"
         self.sparql_endpoint = "https://query.wikidata.org/bigdata/namespace/wdq/sparql"
         self.sparql_credentials = None
@@ -58,9 +64,119 @@ class GrOntoPIConfig:
         self.label_uris = [rdfs_ns["label"],
                            skos_ns["prefLabel"],
                            ]
-
+        # Languages whose labels are given, in this order, for entities
+        # without labels in the language asked for. "" stands for labels
+        # without a language and "*" for all labels
+        self.label_fallback_languages = ["", "en", "*"]
+
+        # "redis" for a cache shared among workers, "memory" for a cache
+        # local to each worker (useful for development and benchmarks)
+        self.cache_backend = "redis"
         self.redis_cache_url = "redis_cache"
         self.redis_cache_port = "6379"
+        # zlib level for cached values (0 disables compression) and the
+        # minimum size, in bytes, of a value for it to be compressed
+        self.cache_compression_level = 6
+        self.cache_compression_min_size = 512
+        # Cached results older than cache_soft_ttl seconds are served but
+        # refreshed in the background (0 to never refresh them), and those
+        # older than cache_hard_ttl are dropped (0 to keep them until they
+        # are invalidated). A refresh taking longer than
+        # cache_refresh_timeout may be started again. A refresh that finds
+        # the data changed bumps the data version, and with it the ETags of
+        # every route (see http_cache_control), as responses combine
+        # results about several entities and any of them may be built from
+        # it. This is intended: on an endpoint whose data keeps changing,
+        # raise cache_soft_ttl (or set it to 0, so that only invalidations
+        # change the ETags) to keep 304s frequent. Results dropped after
+        # cache_hard_ttl are fetched again without changing the ETags, so
+        # a 304 may confirm a response older than that: invalidate the
+        # changed entities (e.g. with load_kg.py) when the data changes
+        self.cache_soft_ttl = 3600
+        self.cache_hard_ttl = 7 * 24 * 3600
+        self.cache_refresh_timeout = 60
+        # Entities found not to exist are answered with a 404 (or 400)
+        # without querying the endpoint for this many seconds (0 disables it)
+        self.negative_cache_ttl = 300
+        # A Bloom filter of the typed entities, to check whether entities
+        # exist without queries. It is rebuilt every
+        # entity_filter_refresh_interval seconds, paging through the
+        # entities entity_filter_page_size at a time, and shared through
+        # redis, where workers look for changes every
+        # entity_filter_reload_interval seconds
+        self.entity_filter_enabled = False
+        self.entity_filter_error_rate = 0.01
+        self.entity_filter_refresh_interval = 3600
+        self.entity_filter_reload_interval = 30
+        self.entity_filter_page_size = 10000
+        # At most this many links of an entity per predicate and direction
+        # (0 for no limit) are described by default; the rest are paged
+        # through with /entities/links, at most links_max_page_size at a time
+        self.links_per_predicate = 0
+        self.links_max_page_size = 1000
+        # Limits of /entities/neighbourhood: the depth, nodes and edges asked
+        # for are capped at these, and the expansion stops after
+        # neighbourhood_timeout seconds. Entities are expanded
+        # neighbourhood_batch_size per query
+        self.neighbourhood_max_depth = 3
+        self.neighbourhood_max_nodes = 500
+        self.neighbourhood_max_edges = 2000
+        self.neighbourhood_timeout = 10
+        self.neighbourhood_batch_size = 100
+        # The most entities /entitites/connected_to_many takes at once
+        self.bulk_neighbourhood_max_entities = 100
+
+        self.logging_config = dict(DEFAULT_LOGGING_CONFIG)
+        # Per-request tracing of SPARQL sub-queries. When enabled, or when a
+        # request carries the X-GrOntoPI-Trace header, the response gets a
+        # Server-Timing header. Spans are also sent to OpenTelemetry if
+        # tracing_export_spans is set and opentelemetry-api is installed.
+        self.tracing_enabled = False
+        self.tracing_export_spans = False
+
+        # Admission control. Every client (the email of its token, or its
+        # IP) gets a token bucket refilled at rate_limit_per_second up to
+        # rate_limit_burst; a request costs one token, plus one for every
+        # rate_limit_entities_per_token entities it posts.
+        # max_in_flight_requests (0 for no limit) caps the requests being
+        # served at once. Both are shared among workers with the redis cache
+        # backend, and are per worker with the memory one.
+        self.rate_limit_enabled = False
+        self.rate_limit_per_second = 10.0
+        self.rate_limit_burst = 50
+        self.rate_limit_entities_per_token = 20
+        self.max_in_flight_requests = 0
+        # A request still counted after this many seconds is assumed lost
+        # (e.g. its worker died) and stops counting
+        self.in_flight_timeout = 120
+
+        # Cache-Control header of the GET routes whose responses carry an
+        # ETag and Last-Modified and answer conditional requests with 304,
+        # by path. Routes not listed get none of these headers
+        self.http_cache_control = {
+            "/entities/by_id": "max-age=60",
+            "/entities/by_class_with_labels": "max-age=60",
+            "/entitites/connected_to": "max-age=60",
+        }
+
+        # Cache warm-up, on startup and with POST /cache/warm. The entities
+        # and classes of openAPIExamples and of these lists are fetched,
+        # with the warmup_top_accessed most asked for ones (counted by each
+        # worker, or in redis), warmup_concurrency at a time. Startup waits
+        # for at most warmup_timeout seconds
+        self.warmup_on_startup = False
+        self.warmup_entities = []
+        self.warmup_classes = []
+        self.warmup_top_accessed = 100
+        self.warmup_concurrency = 4
+        self.warmup_timeout = 120
+        # The maintenance routes (/cache/invalidate, /cache/warm) answer 403
+        # unless maintenance_enabled. With OAuth2 they also need the
+        # inter-services token or a token with the maintenance_role realm
+        # role. They take at most maintenance_max_uris URIs at once
+        self.maintenance_enabled = False
+        self.maintenance_role = "grontopi-admin"
+        self.maintenance_max_uris = 1000
 
     def load_json_config(self, config_path):
         if os.path.isfile(config_path):
@@ -118,4 +234,5 @@ if environ.get("CONFIG_PATH") is not None:
 
 # If the config file exists, we use it to overide configs
 conf.load_json_config(configpath)
-print(conf.__dict__.items())
\ No newline at end of file
+setup_logging(conf.logging_config)
+logging.getLogger(__name__).debug("Configuration: %s", conf.__dict__)
@@ -1,5 +1,9 @@
 import json
 import asyncio
+import base64
+import functools
+import logging
+import time
 from typing import List, Dict, Set, Tuple
 
 import rdflib
@@ -9,7 +13,8 @@ from pydantic import parse_obj_as
 from aiocache import Cache
 
 from models.api_models import EntityDescription, \
-    EntityListWithLabels, EntityNeighbourhoodSummary
+    EntityListWithLabels, EntityNeighbourhoodSummary, EntityLinksPage, \
+    EntityNeighbourhoodGraph
 
 from models.entity_models import EntityWithLabel, LabelWithLang
 from models.ontology_models import EntityURI, ClassURI
@@ -18,16 +23,60 @@ from models.entity_models import PredicateObjectTuple
 from config import conf as cfg
 from utils.rdfutils import URI, LIT
 from utils.owlreading import OntologyReader
+from utils.Caching import CompactSerializer, CacheTagIndex, cache_key
+from utils import metrics
+from utils.tracing import traced_query
+from utils.entity_filter import entity_filter
 from data_access.abstract_data_access import GraphAccess
 
-cache = Cache(cache_class=Cache.REDIS,
-              namespace="main",
-              endpoint=cfg.redis_cache_url,
-              port=int(cfg.redis_cache_port))
+logger = logging.getLogger(__name__)
 
-print("Trying redis at",
-      cfg.redis_cache_url,
-      cfg.redis_cache_port, "\n\n")
+_serializer = CompactSerializer(
+    compression_level=cfg.cache_compression_level,
+    min_compress_size=cfg.cache_compression_min_size)
+if cfg.cache_backend == "memory":
+    cache = Cache(cache_class=Cache.MEMORY,
+                  namespace="main",
+                  serializer=_serializer)
+    logger.info("Using in-memory cache")
+else:
+    cache = Cache(cache_class=Cache.REDIS,
+                  namespace="main",
+                  endpoint=cfg.redis_cache_url,
+                  port=int(cfg.redis_cache_port),
+                  serializer=_serializer)
+    logger.info("Using redis cache at %s:%s",
+                cfg.redis_cache_url, cfg.redis_cache_port)
+# Which cached results are about which entities, for invalidate_entities
+tag_index = CacheTagIndex(cache, shared=cfg.cache_backend != "memory",
+                          ttl=cfg.cache_hard_ttl)
+# When cached results were last invalidated, see data_version
+DATA_VERSION_KEY = "data_version"
+# Prefix of the keys of when every deployment first served, see deployed_at
+DEPLOYMENT_PREFIX = "deployment:"
+# Prefix of the keys marking entities found not to exist, see known_missing
+MISSING_PREFIX = "missing:"
+# Prefix of the keys of the labels of every entity, in all languages
+LABELS_PREFIX = "labels:"
+# The parts of an EntityDescription that can be left out, see
+# fetch_entities_from_list_of_ids
+ENTITY_FIELDS = ("data_properties", "object_properties", "inverse_properties",
+                 "object_labels")
+
+
+def encode_cursor(after: str) -> str:
+    return base64.urlsafe_b64encode(after.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    :raise ValueError: if cursor was not made by encode_cursor
+    """
+    try:
+        return base64.b64decode(cursor.encode("ascii"), altchars=b"-_",
+                                validate=True).decode("utf-8")
+    except (UnicodeError, ValueError, base64.binascii.Error):
+        raise ValueError("Invalid cursor")
 
 
 class SPARQLAccess(GraphAccess):
@@ -36,18 +85,13 @@ class SPARQLAccess(GraphAccess):
                  typepred=rdflib.namespace.RDF["type"],
                  different_graphs=False):
         self.query_endpoint = query_endpoint
-        user_agent = 'Grontogopi/0.1 (' \
-                     'https://github.com/cnb-angelus/grontopi; ' \
-                     'grontopi@gmail.com)'
+        self.query_credentials = query_credentials
 
-        print(self.query_endpoint, "\t<~~~~~~~ Endpoint")
-        self.query_client = SPARQLWrapper(self.query_endpoint,
-                                          agent=user_agent)
-        self.query_client.setReturnFormat(JSON)
-        self.query_client.setMethod("POST")
-        if query_credentials is not None and len(query_credentials) == 2:
-            self.query_client.setCredentials(query_credentials[0],
-                                             query_credentials[1])
+        logger.info("SPARQL endpoint: %s", self.query_endpoint)
+        self.query_client = self._new_client()
+        # Keys of stale cached results being refreshed by this worker
+        self._refreshing = set()
+        self._refresh_tasks = set()
 
         self.typepred_list = [rdflib.namespace.RDF["type"]]
         if isinstance(typepred, rdflib.URIRef) or isinstance(typepred, str):
@@ -56,38 +100,281 @@ class SPARQLAccess(GraphAccess):
             self.typepred_list = [URI(x) for x in typepred]
 
         self.differentgraphs = different_graphs
-        self._varname2labelpred = {"?labvar_" + str(i): lu
-                                   for i, lu in enumerate(cfg.label_uris)}
         super().__init__()
 
-    async def _query(self, query, no_cache=False):
+    def _new_client(self) -> SPARQLWrapper:
+        user_agent = 'Grontogopi/0.1 (' \
+                     'https://github.com/cnb-angelus/grontopi; ' \
+                     'grontopi@gmail.com)'
+        client = SPARQLWrapper(self.query_endpoint, agent=user_agent)
+        client.setReturnFormat(JSON)
+        client.setMethod("POST")
+        credentials = self.query_credentials
+        if credentials is not None and len(credentials) == 2:
+            client.setCredentials(credentials[0], credentials[1])
+        return client
+
+    async def _query(self, query, no_cache=False, postprocess=None,
+                     kind="generic", tags=None):
         """
         This method just takes care of the SPARQL query, choosing the right
         HTTP verb as per WikiData recommendation to use GET for small queries
         :param query:
+        :param kind: what the query is for (labels, classes, links...). Only
+            used to label metrics and traces
+        :param postprocess: a function applied to the SPARQL JSON result
+            before it is cached. Cache hits return its output directly, so
+            it should return compact, msgpack-friendly structures
+        :param tags: the URIs (in n3) of the entities or classes the result
+            is about. The cached result is dropped by invalidate_entities
+            when any of them changes
         :return:
+
+        Cached results older than cfg.cache_soft_ttl are still returned
+        right away, but refreshed in the background; they are dropped after
+        cfg.cache_hard_ttl.
+        """
+        query_clean = self._clean_query(query)
+        # Cached values are [time stored, result]
+        key = cache_key(query_clean, prefix="s")
+        with traced_query(kind, len(query_clean),
+                          export_spans=cfg.tracing_export_spans) as span:
+            cached_value = await cache.get(key, default=None)
+            if cached_value is not None:
+                stored_at, resp = cached_value
+                stale = 0 < cfg.cache_soft_ttl < time.time() - stored_at
+                metrics.record_cache_lookup(cfg.cache_backend, kind, True,
+                                            stale=stale)
+                span.cache = "stale" if stale else "hit"
+                logger.debug("Cache hit", extra={"kind": kind, "key": key,
+                                                 "stale": stale})
+                if stale:
+                    await self._refresh_in_background(
+                        key, query_clean, kind, postprocess, tags, resp)
+                return resp
+            metrics.record_cache_lookup(cfg.cache_backend, kind, False)
+            span.cache = "miss"
+            # In a thread, with its own client, not to block the requests
+            # being served meanwhile
+            resp = await asyncio.get_event_loop().run_in_executor(
+                None, self._query_endpoint, query_clean, kind, no_cache,
+                self._new_client())
+            span.rows = len(resp["results"]["bindings"])
+            if postprocess is not None:
+                resp = postprocess(resp)
+            await self._store(key, resp, tags)
+            logger.debug("Cache miss", extra={"kind": kind, "key": key})
+            return resp
+
+    @staticmethod
+    def _clean_query(query: str) -> str:
+        return "\n".join([x.strip() for x in query.split("\n")])
+
+    @staticmethod
+    async def _store(key, resp, tags):
+        await cache.set(key, [time.time(), resp],
+                        ttl=cfg.cache_hard_ttl or None)
+        await tag_index.add(key, tags)
+
+    async def _refresh_in_background(self, key, query_clean, kind,
+                                     postprocess, tags, old_resp,
+                                     store=None):
         """
-        query_clean = "\n".join([x.strip() for x in query.split("\n")])
-        cached_value = await cache.get(query_clean, default=None)
-        if cached_value is not None:
-            print("Cache hit")
-            return cached_value
-        self.query_client.setQuery(query_clean)
-        self.query_client.setMethod("GET")
+        Refreshes a stale cached result in a task, unless it is already
+        being refreshed
+        :param store: how the new result is cached, _store by default
+        """
+        if key in self._refreshing:
+            return
+        try:
+            # Only one worker refreshes a given result at a time
+            await cache.add("r:" + key, 1, ttl=cfg.cache_refresh_timeout)
+        except ValueError:
+            return
+        self._refreshing.add(key)
+        task = asyncio.get_event_loop().create_task(self._refresh(
+            key, query_clean, kind, postprocess, tags, old_resp,
+            store or self._store))
+        # The loop only keeps weak references to tasks
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, key, query_clean, kind, postprocess, tags,
+                       old_resp, store):
+        try:
+            # In a thread, with its own client, not to block the requests
+            # being served meanwhile
+            resp = await asyncio.get_event_loop().run_in_executor(
+                None, self._query_endpoint, query_clean, kind, False,
+                self._new_client())
+            if postprocess is not None:
+                resp = postprocess(resp)
+            await store(key, resp, tags)
+            if resp != old_resp:
+                # Responses built from it may change, see data_version
+                await cache.set(DATA_VERSION_KEY, time.time())
+            logger.debug("Refreshed stale result",
+                         extra={"kind": kind, "key": key})
+        except Exception as e:
+            logger.warning("Could not refresh stale %s result: %s", kind, e)
+        finally:
+            self._refreshing.discard(key)
+
+    def _query_endpoint(self, query_clean, kind, no_cache=False,
+                        client=None):
+        if client is None:
+            client = self.query_client
+        client.setQuery(query_clean)
+        client.setMethod("GET")
         if no_cache or len(query_clean) > 1000:
-            self.query_client.setMethod("POST")
-        resp = self.query_client.queryAndConvert()
-        await cache.set(query_clean, resp)
-        print("Cache miss")
+            client.setMethod("POST")
+        stime = time.perf_counter()
+        in_flight = metrics.SPARQL_IN_FLIGHT.labels(kind=kind)
+        in_flight.inc()
+        try:
+            resp = client.queryAndConvert()
+        except Exception:
+            metrics.SPARQL_ERRORS.labels(kind=kind).inc()
+            raise
+        finally:
+            in_flight.dec()
+            metrics.SPARQL_LATENCY.labels(kind=kind).observe(
+                time.perf_counter() - stime)
+        metrics.SPARQL_ROWS.labels(kind=kind).observe(
+            len(resp["results"]["bindings"]))
         return resp
 
+    async def invalidate_entities(self, uris: List[str]) -> int:
+        """
+        Drops the cached results about any of the given entities or classes,
+        for instance after new triples about them were loaded
+        :return: the number of cached results dropped
+        """
+        n3s = [URI(u).n3() for u in uris]
+        deleted = await tag_index.invalidate(n3s)
+        # They may exist now
+        await asyncio.gather(*[cache.delete(prefix + n) for n in n3s
+                               for prefix in (MISSING_PREFIX, LABELS_PREFIX)])
+        await entity_filter.add(n3s)
+        await cache.set(DATA_VERSION_KEY, time.time())
+        logger.info("Invalidated %d cached results about %d URIs",
+                    deleted, len(uris))
+        return deleted
+
+    async def known_missing(self,
+                            entities: List[EntityURI]) -> List[EntityURI]:
+        """
+        Those of the given entities that were found not to exist in the last
+        cfg.negative_cache_ttl seconds, without querying the endpoint
+        """
+        if not cfg.negative_cache_ttl or len(entities) == 0:
+            return []
+        n3s = [URI(e).n3() for e in entities]
+        flags = await cache.multi_get([MISSING_PREFIX + n for n in n3s])
+        missing = []
+        for n3, flag in zip(n3s, flags):
+            metrics.record_cache_lookup("negative", "entity", flag is not None)
+            if flag is not None:
+                missing.append(parse_obj_as(EntityURI, n3))
+        return missing
+
+    async def remember_missing(self, entities: List[EntityURI]):
+        """
+        Marks the given entities as not existing for cfg.negative_cache_ttl
+        seconds, or until they are invalidated
+        """
+        if not cfg.negative_cache_ttl or len(entities) == 0:
+            return
+        await cache.multi_set([(MISSING_PREFIX + URI(e).n3(), 1)
+                               for e in entities],
+                              ttl=cfg.negative_cache_ttl)
+
+    async def data_version(self) -> float:
+        """
+        The time cached results were last invalidated, or first asked for if
+        they never were. Results served from the cache can only have changed
+        if this did, so it serves as a version of the data for HTTP caching
+        """
+        return await self._first_time(DATA_VERSION_KEY)
+
+    async def deployed_at(self, deployment: str) -> float:
+        """
+        The time a deployment (see http_caching.deployment_tag) first
+        served. Responses may have changed then, whatever the data version
+        """
+        return await self._first_time(DEPLOYMENT_PREFIX + deployment)
+
+    @staticmethod
+    async def _first_time(key: str) -> float:
+        # The time stored in key, which is set to now if there is none
+        stored = await cache.get(key)
+        if stored is None:
+            try:
+                await cache.add(key, time.time())
+            except ValueError:
+                # Another worker set it meanwhile
+                pass
+            stored = await cache.get(key)
+        return stored
+
+    async def warm_up(self, entities: List[str], classes: List[str],
+                      onto: OntologyReader, lang: str = "en",
+                      per_page: int = 100, concurrency: int = 4) -> Dict:
+        """
+        Makes the queries of the entity routes for the given entities, and
+        of the first page of the listing of the given classes, so that
+        their results are cached before anyone asks for them
+        :param concurrency: how many entities or classes are fetched at once
+        :return: how many entities and classes were fetched, and failed
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        failures = 0
+
+        async def bounded(coro_fun, uri):
+            nonlocal failures
+            async with semaphore:
+                try:
+                    await coro_fun(uri)
+                except Exception as e:
+                    failures += 1
+                    logger.warning("Could not warm up %s: %s", uri, e)
+
+        async def entity(uri):
+            await self.fetch_entities_from_list_of_ids([uri], onto=onto,
+                                                       lang=lang)
+            await self.fetch_entities_around(uri, onto_config=onto,
+                                             lang=lang)
+
+        async def listing(uri):
+            await self.fetch_entities_of_classes(uri, start=0,
+                                                 per_page=per_page,
+                                                 lang=lang)
+
+        stime = time.perf_counter()
+        await asyncio.gather(*[bounded(entity, e) for e in entities],
+                             *[bounded(listing, c) for c in classes])
+        result = {"entities": len(entities), "classes": len(classes),
+                  "failures": failures,
+                  "seconds": round(time.perf_counter() - stime, 3)}
+        logger.info("Cache warmed up: %s", result)
+        return result
+
     async def fetch_entities_from_list_of_ids(self,
                                               entitylist: List[EntityURI],
                                               onto: OntologyReader,
                                               lang: str = "en",
                                               force_full=False,
+                                              fields=ENTITY_FIELDS,
+                                              links_per_predicate=0,
                                               ) -> List[EntityDescription]:
-        print(self.query_endpoint, "<--- Different graphs\n\n")
+        """
+        :param fields: the parts of the descriptions (see ENTITY_FIELDS) to
+            compute. Those left out are not queried, and are None
+        :param links_per_predicate: if not 0, at most this many links are
+            given for every predicate and direction. The others are listed
+            in link_pages, to be paged through with fetch_links_page
+        """
+        logger.debug("Describing %d entities", len(entitylist))
         classgetter = self._get_classes_for_entities(
             entitylist=entitylist,
             onto_config=onto)
@@ -100,6 +387,10 @@ class SPARQLAccess(GraphAccess):
         entity_descriptions = []
         allmissinglabels = set()
         for entity, labels in ent2labels.items():
+            if entity not in ent2class:
+                # Labels are given for every entity asked for, but those
+                # without a class do not exist
+                continue
             ewl = {
                 "uri": entity,
                 "label": labels,
@@ -110,14 +401,16 @@ class SPARQLAccess(GraphAccess):
                 "inverse_properties": [],
             }
             if force_full or len(entitylist) == 1:
-                ewl, _missinglabs = await self._add_links_to_entity(ewl=ewl,
-                                                                    onto=onto,
-                                                                    lang=lang)
+                ewl, _missinglabs = await self._add_links_to_entity(
+                    ewl=ewl, onto=onto, lang=lang, fields=fields,
+                    links_per_predicate=links_per_predicate)
                 _missinglabs: Set[EntityURI]
                 allmissinglabels.update(_missinglabs)
 
             entity_descriptions.append(EntityDescription.parse_obj(ewl))
 
+        if "object_labels" not in fields:
+            return entity_descriptions
         newlabels = await self._get_labels_for_entities([x
                                                          for x
                                                          in allmissinglabels],
@@ -125,7 +418,8 @@ class SPARQLAccess(GraphAccess):
 
         for ed in entity_descriptions:
             ed: EntityDescription
-            for op in ed.object_properties + ed.inverse_properties:
+            for op in (ed.object_properties or []) + \
+                    (ed.inverse_properties or []):
                 op: PredicateObjectTuple
                 euri = URI(op.object).n3()
                 nl = newlabels.get(euri, [])
@@ -140,15 +434,17 @@ class SPARQLAccess(GraphAccess):
                                         prefix: str = "",
                                         ) -> EntityListWithLabels:
         query = self._query_entities_of_class(class_id, start,
-                                              per_page,
-                                              lang, prefix)
+                                              per_page, prefix)
 
-        rj = await self._query(query)
-        ent2labels = self._collect_labels_for_entities(rj)
+        entities = await self._query(
+            query, postprocess=self._collect_entities,
+            kind="class_listing", tags=[URI(class_id).n3()])
+        ent2labels = await self._get_labels_for_entities(entities, lang=lang)
 
         # Now we present them as required by the output model
         entities_with_labels = []
-        for entity, labels in ent2labels.items():
+        for entity in entities:
+            labels = ent2labels[entity]
             ewl = {
                 "entity": entity,
                 "labels": labels,
@@ -164,13 +460,47 @@ class SPARQLAccess(GraphAccess):
                                           onto_config: OntologyReader
                                           ) -> List[EntityURI]:
 
+        known_missing = await self.known_missing(entities)
+        skipped = set([URI(e).n3() for e in known_missing])
+        entities = [e for e in entities if URI(e).n3() not in skipped]
+        if entity_filter.ready:
+            # Those the filter has do exist, but for a few false positives
+            return known_missing + [
+                parse_obj_as(EntityURI, URI(e).n3()) for e in entities
+                if URI(e).n3() not in entity_filter]
         classes = await self._get_classes_for_entities(
             entitylist=entities,
             onto_config=onto_config)
         found = set([x for x in classes.keys()])
         origentities = set([URI(e).n3() for e in entities])
-        return [parse_obj_as(EntityURI, e)
-                for e in origentities.difference(found)]
+        missing = [parse_obj_as(EntityURI, e)
+                   for e in origentities.difference(found)]
+        await self.remember_missing(missing)
+        return known_missing + missing
+
+    async def typed_entities_count(self,
+                                   onto_config: OntologyReader) -> int:
+        query = self._query_typed_entities(onto_config, count=True)
+        resp = await self._query_uncached(query, kind="entity_filter")
+        return int(resp["results"]["bindings"][0]["n"]["value"])
+
+    async def typed_entities(self, onto_config: OntologyReader,
+                             start: int, size: int) -> List[str]:
+        """
+        A page of the entities with a class of the study domain, in n3
+        """
+        query = self._query_typed_entities(onto_config, start=start,
+                                           size=size)
+        resp = await self._query_uncached(query, kind="entity_filter")
+        return [URI(b["s"]["value"]).n3()
+                for b in resp["results"]["bindings"]]
+
+    async def _query_uncached(self, query, kind):
+        # In a thread, with its own client, not to block the requests
+        query_clean = self._clean_query(query)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._query_endpoint, query_clean, kind, True,
+            self._new_client())
 
     async def fetch_entities_around(self,
                                     entity_id: EntityURI,
@@ -185,23 +515,100 @@ class SPARQLAccess(GraphAccess):
                                                            lang=lang,
                                                            onto=onto_config,
                                                            force_full=False)
-        descsdict = {URI(de.uri).n3(): de for de in descs}
-        linkedents = []
-        linkcount = dict()
+        descsdict = {URI(de.uri).n3(): (de.class_id, de.label)
+                     for de in descs}
+        subron3 = parse_obj_as(RoleURI, onto_config.rdf_ns["subject"].n3())
+        preron3 = parse_obj_as(RoleURI, onto_config.rdf_ns["predicate"].n3())
+        linked = [(op.predicate, op.object, subron3)
+                  for op in ewl["object_properties"]] + \
+                 [(op.predicate, op.object, preron3)
+                  for op in ewl["inverse_properties"]]
+        return self._summarize_neighbourhood(linked, descsdict)
+
+    async def fetch_entities_around_many(self,
+                                         entity_ids: List[EntityURI],
+                                         onto_config: OntologyReader,
+                                         lang: str = "en",
+                                         batch_size: int = 100
+                                         ) -> Dict[str,
+                                                   EntityNeighbourhoodSummary]:
+        """
+        What fetch_entities_around gives for each of the given entities, by
+        entity. Their links are fetched batch_size entities per query, and
+        the entities linked to any of them are described once
+        """
+        centers = list(dict.fromkeys([URI(e).n3() for e in entity_ids]))
+        centerset = set(centers)
+        batches = [centers[i:i + batch_size]
+                   for i in range(0, len(centers), batch_size)]
+        results = await asyncio.gather(*[
+            self._query(self._query_frontier_links(b, onto_config),
+                        postprocess=self._compact_frontier_links,
+                        kind="neighbourhood", tags=b)
+            for b in batches])
+
         subron3 = parse_obj_as(RoleURI, onto_config.rdf_ns["subject"].n3())
         preron3 = parse_obj_as(RoleURI, onto_config.rdf_ns["predicate"].n3())
-        for op, rol in [(x, subron3) for x in ewl["object_properties"]] + \
-                       [(x, preron3) for x in ewl["inverse_properties"]]:
-            op: PredicateObjectTuple
-            entn3 = URI(op.object).n3()
-            entdeesc = descsdict[entn3]
-            entdeesc: EntityDescription
-            pn3 = URI(op.predicate).n3()
-            cn3 = URI(entdeesc.class_id).n3()
-            neighbor_desct = {"link_type": op.predicate,
-                              "entity": op.object,
-                              "entity_class": entdeesc.class_id,
-                              "labels": entdeesc.label,
+        outlinks = {c: [] for c in centers}
+        inlinks = {c: [] for c in centers}
+        # A link of a center to itself is found both out of it and into it,
+        # but is a single link, as in fetch_entities_around
+        seen = set()
+        for rows in results:
+            for sub, pre, obj, other in rows:
+                if (sub, pre, obj, other) in seen:
+                    continue
+                seen.add((sub, pre, obj, other))
+                if other == obj and sub in centerset:
+                    outlinks[sub].append((pre, obj, subron3))
+                else:
+                    inlinks[obj].append((pre, sub, preron3))
+
+        neighbours = list(set([e for links in (outlinks, inlinks)
+                               for c in centers for _, e, _ in links[c]]))
+        neighbours = [parse_obj_as(EntityURI, e) for e in neighbours]
+        nbatches = [neighbours[i:i + batch_size]
+                    for i in range(0, len(neighbours), batch_size)]
+        described = await asyncio.gather(
+            *[self._get_classes_for_entities(b, onto_config)
+              for b in nbatches],
+            *[self._get_labels_for_entities(b, lang=lang) for b in nbatches])
+        ent2class, ent2labels = dict(), dict()
+        for d in described[:len(nbatches)]:
+            ent2class.update(d)
+        for d in described[len(nbatches):]:
+            ent2labels.update(d)
+        # As fetch_entities_from_list_of_ids, only those with a class
+        descsdict = {e: (ent2class[e], labels)
+                     for e, labels in ent2labels.items() if e in ent2class}
+
+        summaries = dict()
+        for c in centers:
+            linked = [link for link in outlinks[c] + inlinks[c]
+                      if link[1] in descsdict]
+            summaries[c] = self._summarize_neighbourhood(linked, descsdict)
+        return summaries
+
+    @staticmethod
+    def _summarize_neighbourhood(linked: List[Tuple],
+                                 descsdict: Dict
+                                 ) -> EntityNeighbourhoodSummary:
+        """
+        :param linked: (predicate, linked entity, role of the central
+            entity) tuples, for every link
+        :param descsdict: (class, labels) of the linked entities, by n3
+        """
+        linkedents = []
+        linkcount = dict()
+        for pre, ent, rol in linked:
+            entn3 = URI(ent).n3()
+            class_id, labels = descsdict[entn3]
+            pn3 = URI(pre).n3()
+            cn3 = URI(class_id).n3()
+            neighbor_desct = {"link_type": pre,
+                              "entity": ent,
+                              "entity_class": class_id,
+                              "labels": labels,
                               "central_entity_role": rol
                               }
             linkedents.append(neighbor_desct)
@@ -212,33 +619,180 @@ class SPARQLAccess(GraphAccess):
         result = {"linked_entities": linkedents, "link_count": linkcount}
         return parse_obj_as(EntityNeighbourhoodSummary, result)
 
+    async def count_entities_around(self,
+                                    entity_id: EntityURI,
+                                    onto_config: OntologyReader,
+                                    ) -> EntityNeighbourhoodSummary:
+        """
+        The link_count of fetch_entities_around, without its linked
+        entities, counted by the endpoint in a single aggregate query
+        """
+        eid = URI(entity_id).n3()
+        query = self._query_link_summary(eid, onto_config)
+        rows = await self._query(query,
+                                 postprocess=self._compact_link_summary,
+                                 kind="link_summary", tags=[eid])
+        linkcount = dict()
+        for pn3, classes, count in rows:
+            if not classes:
+                # Literals
+                continue
+            cn3 = URI(onto_config.get_maximal_class(classes)).n3()
+            thisclass = linkcount.get(cn3, dict())
+            thisclass[pn3] = count + thisclass.get(pn3, 0)
+            linkcount[cn3] = thisclass
+        result = {"linked_entities": [], "link_count": linkcount}
+        return parse_obj_as(EntityNeighbourhoodSummary, result)
+
+    async def fetch_neighbourhood(self,
+                                  entity_id: EntityURI,
+                                  onto_config: OntologyReader,
+                                  depth: int = 2,
+                                  lang: str = "en",
+                                  max_nodes: int = 500,
+                                  max_edges: int = 2000,
+                                  timeout: float = 10,
+                                  batch_size: int = 100
+                                  ) -> EntityNeighbourhoodGraph:
+        """
+        The entities up to depth links away from an entity, and the links
+        among them found on the way. Every level is expanded from the
+        entities first reached in the previous one, batch_size at a time,
+        and expansion stops early (telling why in truncated) once max_nodes
+        entities or max_edges links are found, or after timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        root = URI(entity_id).n3()
+        # Entity: the level it was first reached at
+        visited = {root: 0}
+        edges = dict()
+        frontier = [root]
+        truncated = None
+        # The same for every request, so that a frontier is cached once
+        # whatever the budget left; extra links are dropped below
+        limit = max(max_edges, cfg.neighbourhood_max_edges) + 1
+        for level in range(1, depth + 1):
+            newfrontier = []
+            for i in range(0, len(frontier), batch_size):
+                batch = frontier[i:i + batch_size]
+                query = self._query_frontier_links(batch, onto_config,
+                                                   limit=limit)
+                try:
+                    rows = await asyncio.wait_for(
+                        self._query(query,
+                                    postprocess=self._compact_frontier_links,
+                                    kind="neighbourhood", tags=batch),
+                        timeout=max(0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    truncated = "deadline"
+                    break
+                for sub, pre, obj, other in rows:
+                    if (sub, pre, obj) in edges:
+                        continue
+                    if len(edges) >= max_edges:
+                        truncated = "edges"
+                        break
+                    if other not in visited:
+                        if len(visited) >= max_nodes:
+                            truncated = "nodes"
+                            continue
+                        visited[other] = level
+                        newfrontier.append(other)
+                    edges[(sub, pre, obj)] = None
+                if len(rows) >= limit and truncated is None:
+                    # Some links were left out by the LIMIT
+                    truncated = "edges"
+                if truncated is not None:
+                    break
+            frontier = newfrontier
+            if truncated is not None or len(frontier) == 0:
+                break
+
+        nodes = [parse_obj_as(EntityURI, e) for e in visited]
+        batches = [nodes[i:i + batch_size]
+                   for i in range(0, len(nodes), batch_size)]
+        described = await asyncio.gather(
+            *[self._get_classes_for_entities(b, onto_config)
+              for b in batches],
+            *[self._get_labels_for_entities(b, lang=lang) for b in batches])
+        ent2class, ent2labels = dict(), dict()
+        for d in described[:len(batches)]:
+            ent2class.update(d)
+        for d in described[len(batches):]:
+            ent2labels.update(d)
+        result = {
+            "nodes": [{"entity": e, "entity_class": ent2class.get(e),
+                       "labels": ent2labels.get(e, []), "depth": lev}
+                      for e, lev in visited.items()],
+            "edges": [{"subject": sub, "predicate": pre, "object": obj}
+                      for sub, pre, obj in edges],
+            "truncated": truncated}
+        return parse_obj_as(EntityNeighbourhoodGraph, result)
+
     # ToDo make this work for a list of entities, to make a single query
     async def _add_links_to_entity(self,
                                    ewl: Dict,
                                    onto: OntologyReader,
-                                   lang: str) -> Tuple[Dict, Set]:
+                                   lang: str,
+                                   fields=ENTITY_FIELDS,
+                                   links_per_predicate=0
+                                   ) -> Tuple[Dict, Set]:
         eid = ewl["uri"]
-        query_links = self._query_entity_links(entity_id=eid,
-                                               onto_cfg=onto)
-        rjlinks_ = await self._query(query_links)
-        rjlinks = rjlinks_["results"]["bindings"]
+        outpreds, inpreds = self._link_predicates(onto, fields)
+        rjlinks = []
+        link_pages = None
+        if links_per_predicate > 0 and (outpreds or inpreds):
+            # Predicates with too many links get a page of them each, the
+            # rest are fetched at once
+            counts = await self._count_links(eid, onto, lang,
+                                             outpreds, inpreds)
+            large = [(p, d, n) for p, d, n in counts
+                     if n > links_per_predicate]
+            largeset = set([(p, d) for p, d, _ in large])
+            outpreds = [p for p in outpreds
+                        if (URI(p).n3(), "out") not in largeset]
+            inpreds = [p for p in inpreds
+                       if (URI(p).n3(), "in") not in largeset]
+            pages = await asyncio.gather(*[
+                self._links_page(eid, p, d, onto, lang, links_per_predicate)
+                for p, d, _ in large])
+            link_pages = []
+            for (p, d, n), (rows, next_cursor) in zip(large, pages):
+                rjlinks += rows
+                link_pages.append({"predicate": p, "direction": d,
+                                   "total": n, "next_cursor": next_cursor})
+        query_links = self._query_links(eid, onto, outpreds, inpreds)
+        if query_links is not None:
+            rjlinks += await self._query(query_links,
+                                         postprocess=self._compact_links,
+                                         kind="links", tags=[eid])
 
+        dps, ops, ips, ents = self._split_links(rjlinks, eid, lang, fields)
+        newdesc = {"data_properties": dps,
+                   "object_properties": ops,
+                   "inverse_properties": ips}
+        ewl.update({k: v if k in fields else None
+                    for k, v in newdesc.items()})
+        ewl["link_pages"] = link_pages
+        return ewl, ents
+
+    @staticmethod
+    def _split_links(rjlinks, eid, lang, fields=ENTITY_FIELDS):
+        """
+        Sorts compact link rows into data, object and inverse properties
+        :return: those, and the linked entities
+        """
         dps, ops, ips = [], [], []
         ents = set()
 
-        for binding in rjlinks:
-            sub = URI(binding["s"]["value"]).n3()
-            pre = URI(binding["p"]["value"]).n3()
-            oty = binding["o"]["type"]
-            if oty == "uri":
-                obj = URI(binding["o"]["value"]).n3()
-            else:
-                if binding["o"].get("xml:lang", lang) != lang:
-                    continue
-                obj = binding["o"]["value"].replace('"', '').strip()
+        for sub, pre, is_uri, obj, objlang in rjlinks:
+            if not is_uri and (objlang or lang) != lang:
+                continue
 
             tup = {"predicate": parse_obj_as(RelationURI, pre)}
-            if oty == "uri":
+            if is_uri:
+                if sub == eid and "object_properties" not in fields:
+                    continue
                 if sub == eid:
                     tup["object"] = parse_obj_as(EntityURI, obj)
                     ops.append(parse_obj_as(PredicateObjectTuple, tup))
@@ -250,30 +804,171 @@ class SPARQLAccess(GraphAccess):
             else:
                 tup["literal"] = obj
                 dps.append(tup)
+        return dps, ops, ips, ents
 
-        newdesc = {"data_properties": dps,
-                   "object_properties": ops,
-                   "inverse_properties": ips}
-        ewl.update(newdesc)
-        return ewl, ents
+    async def _count_links(self, eid, onto, lang, outpreds,
+                           inpreds) -> List[List]:
+        """
+        :return: [predicate, direction, number of links] rows
+        """
+        query = self._query_links(
+            eid, onto, outpreds, inpreds, lang=lang,
+            select="SELECT ?p ?dir (COUNT(DISTINCT ?x) AS ?n)",
+            modifiers="GROUP BY ?p ?dir")
+        if query is None:
+            return []
+        return await self._query(query, postprocess=self._compact_link_counts,
+                                 kind="link_counts", tags=[eid])
+
+    async def _links_page(self, eid, predicate, direction, onto, lang,
+                          limit, after=None):
+        """
+        The first limit links through predicate in the given direction
+        ("out" or "in"), in the order of the other ends, after the one
+        given
+        :return: their compact rows, and the cursor of the next page, if any
+        """
+        outpreds = [predicate] if direction == "out" else []
+        inpreds = [predicate] if direction == "in" else []
+        query = self._query_links(
+            eid, onto, outpreds, inpreds, lang=lang, after=after,
+            select="SELECT DISTINCT ?s ?p ?o ?x",
+            # One more, to know whether there is a next page
+            modifiers=f"ORDER BY STR(?x) LIMIT {limit + 1}")
+        rows = await self._query(query, postprocess=self._compact_link_page,
+                                 kind="links_page", tags=[eid])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][5])
+        return [row[:5] for row in rows], next_cursor
+
+    async def fetch_links_page(self,
+                               entity_id: EntityURI,
+                               predicate: RelationURI,
+                               direction: str,
+                               onto: OntologyReader,
+                               lang: str = "en",
+                               limit: int = 100,
+                               cursor: str = None) -> EntityLinksPage:
+        """
+        A page of the links of an entity through a predicate, out of the
+        entity ("out") or into it ("in")
+        :param cursor: the next_cursor of the previous page, if any
+        :raise ValueError: if the cursor is not valid
+        """
+        eid = URI(entity_id).n3()
+        pn3 = URI(predicate).n3()
+        after = decode_cursor(cursor) if cursor else None
+        outpreds = [pn3] if direction == "out" else []
+        inpreds = [pn3] if direction == "in" else []
+        counts, (rows, next_cursor) = await asyncio.gather(
+            self._count_links(eid, onto, lang, outpreds, inpreds),
+            self._links_page(eid, pn3, direction, onto, lang, limit, after))
+        dps, ops, ips, ents = self._split_links(rows, eid, lang)
+        labels = await self._get_labels_for_entities(
+            [parse_obj_as(EntityURI, e) for e in ents], lang=lang)
+        for op in ops + ips:
+            op.object_labels = labels.get(URI(op.object).n3(), [])
+        page = {"entity": eid, "predicate": pn3, "direction": direction,
+                "total": sum([n for _, _, n in counts]),
+                "next_cursor": next_cursor,
+                "data_properties": dps, "object_properties": ops,
+                "inverse_properties": ips}
+        return EntityLinksPage.parse_obj(page)
 
     async def _get_labels_for_entities(self, entitylist: List[EntityURI],
-                                       lang: str = "en"):
-        query_labels = self._query_many_entity_labels(entity_ids=entitylist,
-                                                      lang=lang)
-        # Here we get the set of labels for every entity
-        rjlabs = await self._query(query_labels)
-        ent2labels = self._collect_labels_for_entities(rjlabs)
-        return ent2labels
+                                       lang: str = "en"
+                                       ) -> Dict[str, List[LabelWithLang]]:
+        """
+        The labels of every entity in lang, or else in the first language of
+        cfg.label_fallback_languages it has labels in (see _select_labels).
+        The labels of every entity are fetched and cached in all languages,
+        so that they are shared by requests in any language
+        """
+        if len(entitylist) == 0:
+            return dict()
+        n3s = list(dict.fromkeys([URI(e).n3() for e in entitylist]))
+        # Cached values are [time stored, labels], as those of _query
+        cached = await cache.multi_get([LABELS_PREFIX + n for n in n3s])
+        ent2labels = dict()
+        stale = dict()
+        for n3, value in zip(n3s, cached):
+            if value is None:
+                metrics.record_cache_lookup("entity_labels", "labels", False)
+                continue
+            stored_at, labels = value
+            is_stale = 0 < cfg.cache_soft_ttl < time.time() - stored_at
+            metrics.record_cache_lookup("entity_labels", "labels", True,
+                                        stale=is_stale)
+            ent2labels[n3] = labels
+            if is_stale:
+                stale[n3] = labels
+        if stale:
+            # Served as they are, and refreshed afterwards
+            query_clean = self._clean_query(
+                self._query_many_entity_labels(entity_ids=list(stale)))
+            await self._refresh_in_background(
+                cache_key(query_clean, prefix="l"), query_clean, "labels",
+                functools.partial(self._labels_by_entity,
+                                  entities=list(stale)),
+                list(stale), stale, store=self._store_labels)
+        missing = [n for n in n3s if n not in ent2labels]
+        if missing:
+            query_labels = self._query_many_entity_labels(entity_ids=missing)
+            with traced_query("labels", len(query_labels),
+                              export_spans=cfg.tracing_export_spans) as span:
+                span.cache = "miss"
+                resp = await self._query_uncached(query_labels, kind="labels")
+                span.rows = len(resp["results"]["bindings"])
+            fetched = self._labels_by_entity(resp, missing)
+            await self._store_labels(None, fetched, missing)
+            ent2labels.update(fetched)
+        return self._inflate_labels(
+            {n: self._select_labels(labels, lang)
+             for n, labels in ent2labels.items()})
+
+    def _labels_by_entity(self, response_json, entities: List[str]) -> Dict:
+        """
+        The labels of a labels query by entity, with also those of the
+        given entities without any, not to ask for them again
+        """
+        fetched = self._collect_labels_for_entities(response_json)
+        return {n: fetched.get(n, []) for n in entities}
+
+    @staticmethod
+    async def _store_labels(key, ent2labels, tags):
+        # As _store, but for the labels of every entity under its own key
+        await cache.multi_set([(LABELS_PREFIX + n, [time.time(), labels])
+                               for n, labels in ent2labels.items()],
+                              ttl=cfg.cache_hard_ttl or None)
+
+    @staticmethod
+    def _select_labels(labels: List[List], lang: str) -> List[List]:
+        """
+        The labels in lang or, if there are none, in the first language of
+        cfg.label_fallback_languages with any. There "" stands for labels
+        without a language, and "*" for all labels
+        """
+        for preferred in [lang] + list(cfg.label_fallback_languages):
+            if preferred == "*":
+                return labels
+            chosen = [label for label in labels if label[2] == preferred]
+            if chosen:
+                return chosen
+        return []
 
     async def _get_classes_for_entities(self,
                                         entitylist: List[EntityURI],
                                         onto_config: OntologyReader):
+        if len(entitylist) == 0:
+            return dict()
         query_classes = self._query_many_entity_classes(entity_ids=entitylist,
                                                         onto_cfg=onto_config,
                                                         )
-        rjcls = await self._query(query_classes)
-        ent2classes = self._group_classes_by_entity(rjcls)
+        ent2classes = await self._query(
+            query_classes, postprocess=self._group_classes_by_entity,
+            kind="classes", tags=[URI(e).n3() for e in entitylist])
         ent2class = {ent: onto_config.get_maximal_class(classes)
                      for ent, classes in ent2classes.items()}
         return ent2class
@@ -286,21 +981,15 @@ class SPARQLAccess(GraphAccess):
             longname += unidecode.unidecode(lwl.label_value.lower()) + " "
         return longname
 
-    # ToDo get all labels in a single binding, using OPTIONAL
     def _query_many_entity_labels(self,
-                                  entity_ids: List[EntityURI],
-                                  lang: str = "en"):
+                                  entity_ids: List[EntityURI]):
+        """
+        The labels of the given entities, in all languages, one row each
+        with the variables ?s ?label_pred ?label_val
+        """
         graphextra_start = "GRAPH ?g {" if self.differentgraphs else "\n"
         graphextra_end = "}" if self.differentgraphs else "\n"
 
-        label_optionals = ""
-        filterparts = []
-        for vn, lp in self._varname2labelpred.items():
-            label_optionals += f"OPTIONAL {{ ?s {URI(lp).n3()}  {vn}  }} . \n"
-            filter = f"(!BOUND({vn}) || LANG({vn})='{lang}')\n"
-            filterparts.append(filter)
-        filters = "FILTER(\n " + " && ".join(filterparts) + "\n)"
-
         subjvalues = " ".join([URI(eid).n3() for eid in entity_ids])
         uniontermns = []
         for luri in cfg.label_uris:
@@ -313,56 +1002,176 @@ class SPARQLAccess(GraphAccess):
             uniontermns.append(uterm)
 
         query = f"""
-                 SELECT ?s {" ".join([vn
-                                      for vn in self._varname2labelpred.keys()
-                                      ])}
+                 SELECT DISTINCT ?s ?label_pred ?label_val
                  WHERE {{
                      {graphextra_start}
                          VALUES ?s {{ {subjvalues} }}
-                    {label_optionals}
+                         {"UNION".join(uniontermns)}
                     {graphextra_end}
-                    {filters}
                  }}
 
                  """
         return query
 
-    def _query_entity_links(self,
-                            entity_id: EntityURI,
+    @staticmethod
+    def _link_predicates(onto_cfg: OntologyReader, fields=ENTITY_FIELDS):
+        """
+        :return: the predicates of the links out of an entity, and of those
+            into it, that make the given fields
+        """
+        outpreds = []
+        if "object_properties" in fields:
+            outpreds += list(onto_cfg.allrelations)
+        if "data_properties" in fields:
+            outpreds += list(onto_cfg.allproperties)
+        inpreds = []
+        if "inverse_properties" in fields:
+            inpreds = list(onto_cfg.allrelations) + \
+                list(onto_cfg.allproperties)
+        return outpreds, inpreds
+
+    def _query_frontier_links(self, entity_ids: List[EntityURI],
+                              onto_cfg: OntologyReader, limit: int = None):
+        """
+        The links between any of the given entities (?c) and entities of
+        the study domain (?x), in either direction, through the predicates
+        of _query_links
+        """
+        graphextra_start = "GRAPH ?g {" if self.differentgraphs else "\n"
+        graphextra_end = "}" if self.differentgraphs else "\n"
+
+        allowed_classes = ", ".join([URI(clsuri).n3() for clsuri in
+                                     onto_cfg.all_study_domain_classes])
+        outpreds, inpreds = self._link_predicates(onto_cfg)
+        outvalues = " ".join([URI(puri).n3() for puri in outpreds])
+        invalues = " ".join([URI(puri).n3() for puri in inpreds])
+        centervalues = " ".join([URI(eid).n3() for eid in entity_ids])
+        typepreds = " ".join([URI(x).n3() for x in self.typepred_list])
+        query = f"""
+                 SELECT DISTINCT ?c ?p ?x ?dir
+                 WHERE {{
+                     {graphextra_start}
+                         VALUES ?c {{ {centervalues} }}
+                         VALUES ?typepred {{ {typepreds}  }}
+                         {{
+                            VALUES ?p {{ {outvalues} }}
+                            ?c ?p ?x .
+                            BIND ("out" AS ?dir) .
+                         }}
+                         UNION
+                         {{
+                            VALUES ?p {{ {invalues} }}
+                            ?x ?p ?c .
+                            BIND ("in" AS ?dir) .
+                         }}
+                         ?x ?typepred ?cls .
+                     {graphextra_end}
+                     FILTER( ?cls in ( {allowed_classes} ) )
+                 }}
+                 {"" if limit is None else f"LIMIT {limit}"}
+                 """
+        return query
+
+    def _query_link_summary(self, entity_id: EntityURI,
                             onto_cfg: OntologyReader):
+        """
+        The number of links of an entity to other entities by predicate and
+        by the classes of the other entity (space separated, as a neighbour
+        is counted in its maximal class)
+        """
+        outpreds, inpreds = self._link_predicates(
+            onto_cfg, ("object_properties", "inverse_properties"))
+        neighbours = self._query_links(
+            entity_id, onto_cfg, outpreds, inpreds,
+            select="SELECT ?p ?x ?dir "
+                   "(GROUP_CONCAT(DISTINCT STR(?cls); separator=\" \") "
+                   "AS ?classes)",
+            modifiers="GROUP BY ?p ?x ?dir")
+        # A link of the entity to itself is found in both directions, but
+        # is a single link, as in the description
+        query = f"""
+                 SELECT ?p ?classes (COUNT(*) AS ?n)
+                 WHERE {{
+                     {{ {neighbours} }}
+                     FILTER(?dir = "out" || ?x != {entity_id})
+                 }}
+                 GROUP BY ?p ?classes
+                 """
+        return query
 
+    def _query_links(self,
+                     entity_id: EntityURI,
+                     onto_cfg: OntologyReader,
+                     outpreds: List,
+                     inpreds: List,
+                     select: str = "SELECT DISTINCT ?s ?p ?o",
+                     modifiers: str = "",
+                     lang: str = None,
+                     after: str = None):
+        """
+        A query on the links of an entity through outpreds, out of it, and
+        through inpreds, into it. Its patterns bind ?x to the other end of
+        the links, and ?dir to "out" or "in"
+        :param lang: if given, only literals in this language (or none)
+        :param after: if given, only links whose other end comes after it
+        :return: None if there are no predicates
+        """
         graphextra_start = "GRAPH ?g {" if self.differentgraphs else "\n"
         graphextra_end = "}" if self.differentgraphs else "\n"
 
         allowed_classes = onto_cfg.all_study_domain_classes
         allowed_classes = ", ".join([URI(clsuri).n3() for clsuri in
                                      allowed_classes])
-        predvalues = list(onto_cfg.allrelations) + list(onto_cfg.allproperties)
-        predvalues = " ".join([URI(puri).n3() for puri in predvalues])
 
         typepreds = " ".join([URI(x).n3() for x in self.typepred_list])
 
         euri = URI(entity_id).n3()
-        query = f"""
-                 SELECT DISTINCT ?s ?p ?o
-                 WHERE {{
-                     {graphextra_start}
-                         VALUES ?p {{ {predvalues} }}
-                         VALUES ?typepred {{ {typepreds}  }}
-                         {{ 
+        patterns = []
+        if outpreds:
+            predvalues = " ".join([URI(puri).n3() for puri in outpreds])
+            patterns.append(f"""
+                         {{
+                            VALUES ?p {{ {predvalues} }}
                             {euri} ?p ?o .
-                            BIND ({euri} AS ?s) . 
+                            BIND ({euri} AS ?s) .
+                            BIND (?o AS ?x) .
+                            BIND ("out" AS ?dir) .
                             OPTIONAL {{ ?o ?typepred ?cls }}
-                          }}
-                         UNION
+                          }}""")
+        if inpreds:
+            predvalues = " ".join([URI(puri).n3() for puri in inpreds])
+            patterns.append(f"""
                          {{
+                            VALUES ?p {{ {predvalues} }}
                             ?s ?p {euri} .
                             ?s  ?typepred ?cls
                             BIND ({euri} AS ?o)
-                         }}
+                            BIND (?s AS ?x) .
+                            BIND ("in" AS ?dir) .
+                         }}""")
+        if not patterns:
+            return None
+        union = "\n                         UNION".join(patterns)
+        filters = ""
+        if lang is not None:
+            lang = rdflib.Literal(lang).n3()
+            filters += f"""
+                     FILTER( !isLiteral(?x) || lang(?x) = "" ||
+                             lang(?x) = {lang} )"""
+        if after is not None:
+            after = rdflib.Literal(after).n3()
+            filters += f"""
+                     FILTER( STR(?x) > {after} )"""
+        query = f"""
+                 {select}
+                 WHERE {{
+                     {graphextra_start}
+                         VALUES ?typepred {{ {typepreds}  }}
+                         {union}
                         {graphextra_end}
-                     FILTER( isLiteral(?o) || ?cls in ( {allowed_classes} )  ) 
-                 }}        
+                     FILTER( isLiteral(?o) || ?cls in ( {allowed_classes} )  ) {filters}
+                 }}
+                 {modifiers}
                  """
         return query
 
@@ -391,35 +1200,57 @@ class SPARQLAccess(GraphAccess):
                  """
         return query
 
+    def _query_typed_entities(self, onto_cfg: OntologyReader,
+                              start: int = 0, size: int = 0,
+                              count: bool = False):
+        graphextra_start = "GRAPH ?g {" if self.differentgraphs else "\n"
+        graphextra_end = "}" if self.differentgraphs else "\n"
+
+        allowed_classes = ", ".join([URI(clsuri).n3() for clsuri in
+                                     onto_cfg.all_study_domain_classes])
+        typepreds = " ".join([URI(x).n3() for x in self.typepred_list])
+        if count:
+            select, page = "SELECT (COUNT(DISTINCT ?s) AS ?n)", ""
+        else:
+            select = "SELECT DISTINCT ?s"
+            page = f"ORDER BY ?s OFFSET {start} LIMIT {size}"
+        query = f"""
+                 {select}
+                 WHERE {{
+                     {graphextra_start}
+                         ?s ?typepred ?cls .
+                         VALUES ?typepred {{ {typepreds}  }}
+                     {graphextra_end}
+                     FILTER(?cls in ( {allowed_classes} ) )
+                 }}
+                 {page}
+                 """
+        return query
+
     def _query_entities_of_class(self,
                                  class_id: ClassURI,
                                  start: int = 0,
                                  per_page: int = 1000,
-                                 lang: str = "en",
                                  prefix: str = "",
                                  ):
         """
-        Creates a query with variables ?s ?label_pred ?label_val
-        This query will return a binding for every entity,label pair
+        Creates a query with the variable ?s, for a page of the entities of
+        a class. Their labels are fetched apart, see
+        _get_labels_for_entities
         :param class_id: The URI of the class of entities
         :param start:    The
         :param per_page:
-        :param lang:
+        :param prefix: if longer than 2, only entities with a label (of the
+            first of cfg.label_uris, in any language) starting with it
         :return:
         """
-        label_optionals = ""
-
-        filterparts = []
-        for vn, lp in self._varname2labelpred.items():
-            label_optionals += f"OPTIONAL {{ ?s {URI(lp).n3()}  {vn}  }} . \n"
-            filter = f"(!BOUND({vn}) || LANG({vn})='{lang}')\n"
-            filterparts.append(filter)
-
+        label_match = ""
         if len(prefix) > 2:
-            stringmatcher = f" (STRSTARTS(LCASE(?labvar_0)," \
-                            f" '{prefix.lower()}'))  \n"
-            filterparts.append(stringmatcher)
-        filters = "FILTER(\n " + " && ".join(filterparts) + "\n)"
+            labpred = URI(cfg.label_uris[0]).n3()
+            prefix = rdflib.Literal(prefix.lower()).n3()
+            label_match = f"""
+                        ?s {labpred} ?label_val .
+                        FILTER(STRSTARTS(LCASE(STR(?label_val)), {prefix}))"""
 
         graphextra_start = "GRAPH ?g {" if self.differentgraphs else "\n"
         graphextra_end = "}" if self.differentgraphs else "\n"
@@ -427,16 +1258,12 @@ class SPARQLAccess(GraphAccess):
         typepreds = " ".join([URI(x).n3() for x in self.typepred_list])
 
         query = f"""
-                SELECT ?s {" ".join([vn
-                                     for vn in self._varname2labelpred.keys()
-                                     ])}
+                SELECT DISTINCT ?s
                 WHERE {{
                     {graphextra_start}
                     VALUES ?typepred {{ {typepreds}  }}
-                        ?s  ?typepred {class_id} .
-                    {label_optionals}
+                        ?s  ?typepred {class_id} .{label_match}
                     {graphextra_end}
-                    {filters}
                 }}
 
                 OFFSET {start} LIMIT {per_page}
@@ -454,22 +1281,110 @@ class SPARQLAccess(GraphAccess):
             ent2classes[entity] = current_classes
         return ent2classes
 
-    def _collect_labels_for_entities(self, response_json):
+    @staticmethod
+    def _compact_links(response_json: Dict) -> List[List]:
+        """
+        Reduces the bindings of a links query to
+        [subject, predicate, object_is_uri, object, object_lang] rows
+        """
+        rows = []
+        for binding in response_json["results"]["bindings"]:
+            sub = URI(binding["s"]["value"]).n3()
+            pre = URI(binding["p"]["value"]).n3()
+            is_uri = binding["o"]["type"] == "uri"
+            if is_uri:
+                obj = URI(binding["o"]["value"]).n3()
+            else:
+                obj = binding["o"]["value"].replace('"', '').strip()
+            rows.append([sub, pre, is_uri, obj,
+                         binding["o"].get("xml:lang")])
+        return rows
+
+    @classmethod
+    def _compact_link_page(cls, response_json: Dict) -> List[List]:
+        """
+        Like _compact_links, with the other end of every link, as a string,
+        added to its row
+        """
+        rows = cls._compact_links(response_json)
+        for row, binding in zip(rows, response_json["results"]["bindings"]):
+            row.append(binding["x"]["value"])
+        return rows
+
+    @staticmethod
+    def _compact_frontier_links(response_json: Dict) -> List[List]:
+        """
+        Reduces the bindings of a frontier links query to
+        [subject, predicate, object, entity reached] rows
+        """
+        rows = []
+        for b in response_json["results"]["bindings"]:
+            center = URI(b["c"]["value"]).n3()
+            other = URI(b["x"]["value"]).n3()
+            pre = URI(b["p"]["value"]).n3()
+            if b["dir"]["value"] == "out":
+                rows.append([center, pre, other, other])
+            else:
+                rows.append([other, pre, center, other])
+        return rows
+
+    @staticmethod
+    def _compact_link_summary(response_json: Dict) -> List[List]:
+        """
+        Reduces the bindings of a link summary query to
+        [predicate, [class, ...], count] rows
+        """
+        return [[URI(b["p"]["value"]).n3(),
+                 [URI(c).n3() for c in b["classes"]["value"].split()],
+                 int(b["n"]["value"])]
+                for b in response_json["results"]["bindings"]]
+
+    @staticmethod
+    def _compact_link_counts(response_json: Dict) -> List[List]:
+        """
+        Reduces the bindings of a link counts query to
+        [predicate, direction, count] rows
+        """
+        # Without any link, some stores give a single row with only ?dir
+        # bound (and ?n 0) for the empty group
+        return [[URI(b["p"]["value"]).n3(), b["dir"]["value"],
+                 int(b["n"]["value"])]
+                for b in response_json["results"]["bindings"]
+                if "p" in b and "n" in b]
+
+    def _collect_labels_for_entities(self, response_json) -> Dict:
+        """
+        Groups the labels in a SPARQL result by entity, as
+        {entity: [[label_predicate, label_value, label_lang], ...]}
+        """
         ent2labels = {}
+        seen = set()
         for binding in response_json["results"]["bindings"]:
             entity = URI(binding["s"]["value"]).n3()
-            current_labels = ent2labels.get(entity, [])
-            for _varname, pred in self._varname2labelpred.items():
-                varname = _varname[1:]
-                if varname in binding.keys():
-                    labpred = str(URI(pred).n3())
-                    labval = LIT(binding[varname]["value"]).n3()
-                    lablang = LIT(binding[varname]["xml:lang"]).n3()
-                    labwithlang = {"label_predicate": labpred.replace('"', ''),
-                                   "label_value": labval.replace('"', ''),
-                                   "label_lang": lablang.replace('"', '')
-                                   }
-                    current_labels.append(LabelWithLang.parse_obj(labwithlang))
-            ent2labels[entity] = current_labels
+            labpred = str(URI(binding["label_pred"]["value"]).n3())
+            labval = LIT(binding["label_val"]["value"]).n3()
+            lablang = LIT(binding["label_val"].get("xml:lang", "")).n3()
+            label = (labpred.replace('"', ''),
+                     labval.replace('"', ''),
+                     lablang.replace('"', ''))
+            # The same triple may be in several graphs
+            if (entity, label) in seen:
+                continue
+            seen.add((entity, label))
+            ent2labels.setdefault(entity, []).append(list(label))
 
         return ent2labels
+
+    @staticmethod
+    def _collect_entities(response_json) -> List[str]:
+        return [URI(binding["s"]["value"]).n3()
+                for binding in response_json["results"]["bindings"]]
+
+    @staticmethod
+    def _inflate_labels(ent2labels: Dict) -> Dict[str, List[LabelWithLang]]:
+        # Values come from our own cache, so there is no need to validate
+        return {entity: [LabelWithLang.construct(label_predicate=lp,
+                                                 label_value=lv,
+                                                 label_lang=ll)
+                         for lp, lv, ll in labels]
+                for entity, labels in ent2labels.items()}
@@ -1,12 +1,25 @@
+import asyncio
+import contextlib
+import logging
 import random as ran
+import time
 
-from fastapi import FastAPI, Request, Response
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pyfiglet import Figlet
+from starlette.routing import Match
 
-from routes import router
+from routes import router, graph, onto, warm_cache
 from config import conf as cfg
+from utils import metrics
+from utils import http_caching
+from utils.admission import admission_control
+from utils.entity_filter import entity_filter
+from utils.OAuth2_serverside import user_invalidator
+from utils.logconfig import request_id_var, new_request_id
+from utils.tracing import start_request_trace, finish_request_trace
 
 
 version = "0.0.3"
@@ -22,6 +35,113 @@ app = FastAPI(
 )
 
 
+def _route_template(request: Request) -> str:
+    # Metrics are labelled with the route's path template, never with the
+    # raw URL, to keep their cardinality bounded
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+_deployment = None
+
+
+def deployment_tag() -> str:
+    # Computed once the routes are all included, on the first request
+    global _deployment
+    if _deployment is None:
+        _deployment = http_caching.deployment_tag(version, app.openapi(),
+                                                  cfg)
+    return _deployment
+
+
+# The router's admission dependency, for the requests answered before it
+admitted = contextlib.asynccontextmanager(admission_control)
+
+
+# Declared first, so that the metrics middleware counts its 304s too
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    policy = None
+    if request.method == "GET":
+        route = _route_template(request)
+        policy = cfg.http_cache_control.get(route)
+    if policy is None:
+        return await call_next(request)
+    deployment = deployment_tag()
+    # Responses of a new deployment may differ for the same data
+    data_version = max(await graph.data_version(),
+                       await graph.deployed_at(deployment))
+    etag = http_caching.make_etag(route, request.query_params.multi_items(),
+                                  data_version, deployment)
+    headers = {"ETag": etag,
+               "Last-Modified": http_caching.http_date(data_version),
+               "Cache-Control": policy}
+    if http_caching.is_not_modified(request.headers, etag, data_version):
+        # The route is skipped, but neither admission control nor the
+        # check of credentials
+        try:
+            async with admitted(request):
+                await user_invalidator()(request)
+                return Response(status_code=304, headers=headers)
+        except HTTPException as e:
+            return JSONResponse({"detail": e.detail}, status_code=e.status_code,
+                                headers=e.headers)
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+# Declared before the GZip middleware so that it sees uncompressed sizes
+@app.middleware("http")
+async def collect_request_metrics(request: Request, call_next):
+    route = _route_template(request)
+    stime = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        metrics.REQUEST_LATENCY.labels(
+            route=route, method=request.method, status=str(status)
+        ).observe(time.perf_counter() - stime)
+    size = response.headers.get("content-length")
+    if size is not None:
+        metrics.RESPONSE_SIZE.labels(route=route).observe(int(size))
+    return response
+
+
+@app.middleware("http")
+async def trace_sparql_queries(request: Request, call_next):
+    if not (cfg.tracing_enabled or "X-GrOntoPI-Trace" in request.headers):
+        return await call_next(request)
+    token = start_request_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        trace = finish_request_trace(token)
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    # Honour the id given by a reverse proxy, so logs can be correlated
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Added last, so that it wraps every other middleware, 304s included
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -30,6 +150,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.include_router(router, dependencies=[Depends(admission_control)])
+
+
+@app.on_event("startup")
+async def warm_cache_on_startup():
+    # Workers only get traffic once startup is over, i.e. with a warm cache
+    if not cfg.warmup_on_startup:
+        return
+    try:
+        await asyncio.wait_for(warm_cache(), timeout=cfg.warmup_timeout)
+    except asyncio.TimeoutError:
+        logging.getLogger(__name__).warning(
+            "Cache warm-up did not finish in %ss", cfg.warmup_timeout)
+
+
+@app.on_event("startup")
+async def start_entity_filter():
+    if cfg.entity_filter_enabled:
+        asyncio.get_event_loop().create_task(
+            entity_filter.maintain(graph, onto_config=onto))
+
 
-app.include_router(router)
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
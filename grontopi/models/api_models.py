@@ -14,11 +14,29 @@ class EntityListWithLabels(BaseModel):
     query: Optional[str]
 
 
+class LinkPageInfo(BaseModel):
+    predicate: RelationURI
+    # "out" for links from the entity, "in" for links to it
+    direction: str
+    total: int
+    next_cursor: Optional[str]
+
+
 class EntityDescription(BaseModel):
     uri: EntityURI
     label: Optional[List[LabelWithLang]]
     class_id: ClassURI
     longname: Optional[str]
+    # None when left out with the fields parameter
+    data_properties: Optional[List[PredicateLiteralTuple]]
+    object_properties: Optional[List[PredicateObjectTuple]]
+    inverse_properties: Optional[List[PredicateObjectTuple]]
+    # The predicates whose links were cut to links_per_predicate
+    link_pages: Optional[List[LinkPageInfo]]
+
+
+class EntityLinksPage(LinkPageInfo):
+    entity: EntityURI
     data_properties: List[PredicateLiteralTuple]
     object_properties: List[PredicateObjectTuple]
     inverse_properties: List[PredicateObjectTuple]
@@ -38,4 +56,32 @@ class EntityNeighbourDescription(BaseModel):
 
 class EntityNeighbourhoodSummary(BaseModel):
     linked_entities : List[EntityNeighbourDescription]
-    link_count : Dict[ClassURI,Dict[RelationURI, int]]
\ No newline at end of file
+    link_count : Dict[ClassURI,Dict[RelationURI, int]]
+
+
+class EntityNeighbourhoods(BaseModel):
+    neighbourhoods: Dict[EntityURI, EntityNeighbourhoodSummary]
+    # Those of the entities asked for that do not exist
+    missing: List[EntityURI]
+
+
+class NeighbourhoodNode(BaseModel):
+    entity: EntityURI
+    entity_class: Optional[ClassURI]
+    labels: List[LabelWithLang]
+    # Links away from the central entity
+    depth: int
+
+
+class NeighbourhoodEdge(BaseModel):
+    subject: EntityURI
+    predicate: RelationURI
+    object: EntityURI
+
+
+class EntityNeighbourhoodGraph(BaseModel):
+    nodes: List[NeighbourhoodNode]
+    edges: List[NeighbourhoodEdge]
+    # Why the expansion stopped early ("nodes", "edges" or "deadline"), if
+    # it did
+    truncated: Optional[str]
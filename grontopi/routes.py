@@ -1,19 +1,24 @@
+import logging
 from datetime import datetime
 from typing import List
 
 from fastapi import APIRouter, Depends
 from fastapi import HTTPException
-from utils.OAuth2_serverside import user_invalidator
+from utils.OAuth2_serverside import user_invalidator, maintainer
 
 
 from models.api_models import EntityDescription
 from models.api_models import EntityListWithLabels
-from models.ontology_models import EntityURI, ClassURI
-from data_access.sparql_data_access import SPARQLAccess
+from models.api_models import EntityLinksPage, EntityNeighbourhoodGraph
+from models.api_models import EntityNeighbourhoods
+from models.ontology_models import EntityURI, ClassURI, RelationURI
+from data_access.sparql_data_access import SPARQLAccess, ENTITY_FIELDS
 from utils.owlreading import OntologyReader
 from utils.rdfutils import URI
+from utils.access_log import access_log
 from config import conf as cfg
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 onto = OntologyReader(ontologypath=cfg.ontology_path)
 graph = SPARQLAccess(query_endpoint=cfg.sparql_endpoint,
@@ -26,6 +31,22 @@ exent = URI(cfg.openAPIExamples["entities"][0]).n3()
 exents = [URI(x).n3() for x in cfg.openAPIExamples["entities"]]
 excls = URI(cfg.openAPIExamples["classes"][0]).n3()
 deflang = cfg.openAPIExamples["default_language"]
+fields_description = (
+    " The fields parameter, a comma separated subset of "
+    + ", ".join(ENTITY_FIELDS) + ", limits the description to those parts, "
+    "the others are null and not queried. All of them by default")
+
+
+def parse_fields(fields: str) -> List[str]:
+    if not fields:
+        return list(ENTITY_FIELDS)
+    asked = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in asked if f not in ENTITY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Unknown fields", "fields": unknown})
+    return asked
 
 
 @router.get(
@@ -46,47 +67,64 @@ async def catalogs_ontology(
         "message": "OK", "catalogs": cats, "classes": clss, "relations": rels,
         "properties": props}
     dt = datetime.now() - stime
-    print(
-        f"\n\n---- Finished static schemas {dt.total_seconds()}     <-")
+    logger.debug("Static schemas computed in %.3fs", dt.total_seconds())
     return response
 
 
 @router.get(
     "/entities/by_id", tags=["Statements"],
+    description="Describes an entity." + fields_description +
+                ". With links_per_predicate (0 for no limit, unless the "
+                "server limits them), predicates with more links give only "
+                "that many, and are listed in link_pages with a cursor for "
+                "/entities/links",
     response_model=EntityDescription)
 async def entities_by_id(entity_id: EntityURI = exent,
                          lang: str = deflang,
+                         fields: str = "",
+                         links_per_predicate: int = cfg.links_per_predicate,
                          user_info: str = Depends(user_invalidator())
                          ):
-    res = await graph.fetch_entities_from_list_of_ids(entitylist=[entity_id],
-                                                      onto=onto,
-                                                      lang=lang
-                                                      )
+    fields = parse_fields(fields)
+    # When the server limits them, clients cannot ask for all the links
+    if links_per_predicate < 0 or (cfg.links_per_predicate > 0
+                                   and links_per_predicate == 0):
+        raise HTTPException(
+            status_code=400,
+            detail="links_per_predicate must be positive" if
+            cfg.links_per_predicate > 0 else
+            "links_per_predicate must be positive, or 0 for no limit")
+    links_per_predicate = min(links_per_predicate, cfg.links_max_page_size)
+    access_log.record("entity", [URI(entity_id).n3()])
+    # Also remembers it if missing, to answer again without queries
+    if await graph.check_existence_of_entities([entity_id],
+                                               onto_config=onto):
+        raise HTTPException(status_code=404, detail="Entity not found")
+    res = await graph.fetch_entities_from_list_of_ids(
+        entitylist=[entity_id], onto=onto, lang=lang, fields=fields,
+        links_per_predicate=links_per_predicate)
     if res is None or not res or res[0] is None:
+        await graph.remember_missing([entity_id])
         raise HTTPException(status_code=404, detail="Entity not found")
-    res = res[0]
-
-    if isinstance(res, dict):
-        if not any(
-                (res["data_properties"],
-                 res["object_properties"], res["inverse_properties"])):
-            raise HTTPException(status_code=404, detail="Entity not found")
-        return res
-
-    return res
+    return res[0]
 
 
 @router.post(
     "/entities/by_ids",
     tags=["Statements"],
+    description="Describes several entities. Their links are only given "
+                "when a single one is asked for." + fields_description,
     response_model=List[EntityDescription])
 async def entities_by_ids(entity_ids: List[EntityURI] = exents,
                           lang: str = deflang,
+                          fields: str = "",
                           user_info: str = Depends(user_invalidator())
                           ):
-    res = await graph.fetch_entities_from_list_of_ids(entitylist=entity_ids,
-                                                      onto=onto,
-                                                      lang=lang)
+    fields = parse_fields(fields)
+    access_log.record("entity", [URI(e).n3() for e in entity_ids])
+    res = await graph.fetch_entities_from_list_of_ids(
+        entitylist=entity_ids, onto=onto, lang=lang, fields=fields,
+        links_per_predicate=cfg.links_per_predicate)
 
     if res is None or len(res) == 0:
         raise HTTPException(status_code=404, detail="Entity not found")
@@ -94,6 +132,34 @@ async def entities_by_ids(entity_ids: List[EntityURI] = exents,
     return res
 
 
+@router.get(
+    "/entities/links", tags=["Statements"],
+    description="Pages through the links of an entity through a predicate, "
+                "out of the entity (direction=out) or into it (in). The "
+                "next_cursor of a page gives the next one",
+    response_model=EntityLinksPage)
+async def entity_links(predicate: RelationURI,
+                       entity_id: EntityURI = exent,
+                       direction: str = "out",
+                       limit: int = 100,
+                       cursor: str = "",
+                       lang: str = deflang,
+                       user_info: str = Depends(user_invalidator())
+                       ):
+    if direction not in ("out", "in"):
+        raise HTTPException(status_code=400,
+                            detail="direction must be out or in")
+    access_log.record("entity", [URI(entity_id).n3()])
+    try:
+        return await graph.fetch_links_page(
+            entity_id=entity_id, predicate=predicate, direction=direction,
+            onto=onto, lang=lang,
+            limit=max(1, min(limit, cfg.links_max_page_size)),
+            cursor=cursor or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get(
     "/entities/by_class_with_labels", tags=["Statements"],
     description="Gets entities of a given class. Optionally can set a prefix"
@@ -106,6 +172,7 @@ async def entities_labels(class_id: ClassURI = excls,
                           prefix : str = "",
                           user_info: str = Depends(user_invalidator())
                           ):
+    access_log.record("class", [URI(class_id).n3()])
     res = await graph.fetch_entities_of_classes(class_id=class_id,
                                           start=start, per_page=per_page,
                                           lang=lang,
@@ -113,19 +180,143 @@ async def entities_labels(class_id: ClassURI = excls,
     return res
 
 
-@router.get("/entitites/connected_to", tags=["Statements"])
+@router.get(
+    "/entitites/connected_to", tags=["Statements"],
+    description="Describes the entities linked to an entity, and counts "
+                "its links by class and predicate. With counts_only, only "
+                "counts them, in a single aggregate query")
 async def entities_connected_to(central_entity: EntityURI = exent,
                                 lang: str = deflang,
+                                counts_only: bool = False,
                                 user_info: str = Depends(user_invalidator())
                                 ):
+    access_log.record("entity", [URI(central_entity).n3()])
     chk = await graph.check_existence_of_entities([central_entity],
                                                   onto_config=onto)
     if len(chk) > 0:
         raise HTTPException(
             status_code=400,
             detail={"message": "Entity does not exist", "entities": chk})
+    if counts_only:
+        return await graph.count_entities_around(entity_id=central_entity,
+                                                 onto_config=onto)
     res = await graph.fetch_entities_around(entity_id=central_entity,
                                             lang=lang,
                                             onto_config=onto)
 
     return res
+
+
+@router.post(
+    "/entitites/connected_to_many", tags=["Statements"],
+    description="What /entitites/connected_to gives for every entity "
+                "posted, by entity. Entities linked to several of them are "
+                "described only once",
+    response_model=EntityNeighbourhoods)
+async def entities_connected_to_many(entity_ids: List[EntityURI] = exents,
+                                     lang: str = deflang,
+                                     user_info: str = Depends(
+                                         user_invalidator())
+                                     ):
+    if len(entity_ids) > cfg.bulk_neighbourhood_max_entities:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {cfg.bulk_neighbourhood_max_entities} entities "
+                   f"can be asked for at once")
+    access_log.record("entity", [URI(e).n3() for e in entity_ids])
+    missing = await graph.check_existence_of_entities(entity_ids,
+                                                      onto_config=onto)
+    skipped = set([URI(e).n3() for e in missing])
+    found = [e for e in entity_ids if URI(e).n3() not in skipped]
+    res = await graph.fetch_entities_around_many(
+        entity_ids=found, onto_config=onto, lang=lang,
+        batch_size=cfg.neighbourhood_batch_size)
+    return {"neighbourhoods": res, "missing": missing}
+
+
+@router.get(
+    "/entities/neighbourhood", tags=["Statements"],
+    description="The entities up to depth links away from an entity, with "
+                "the links among them, as lists of nodes and edges. The "
+                "expansion stops early, telling why in truncated, after "
+                "max_nodes nodes, max_edges edges or a deadline",
+    response_model=EntityNeighbourhoodGraph)
+async def entity_neighbourhood(central_entity: EntityURI = exent,
+                               depth: int = 2,
+                               lang: str = deflang,
+                               max_nodes: int = cfg.neighbourhood_max_nodes,
+                               max_edges: int = cfg.neighbourhood_max_edges,
+                               user_info: str = Depends(user_invalidator())
+                               ):
+    if not 1 <= depth <= cfg.neighbourhood_max_depth:
+        raise HTTPException(
+            status_code=400,
+            detail=f"depth must be from 1 to {cfg.neighbourhood_max_depth}")
+    access_log.record("entity", [URI(central_entity).n3()])
+    chk = await graph.check_existence_of_entities([central_entity],
+                                                  onto_config=onto)
+    if len(chk) > 0:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Entity does not exist", "entities": chk})
+    return await graph.fetch_neighbourhood(
+        entity_id=central_entity, onto_config=onto, depth=depth, lang=lang,
+        max_nodes=max(1, min(max_nodes, cfg.neighbourhood_max_nodes)),
+        max_edges=max(1, min(max_edges, cfg.neighbourhood_max_edges)),
+        timeout=cfg.neighbourhood_timeout,
+        batch_size=cfg.neighbourhood_batch_size)
+
+
+def check_maintenance_size(count: int):
+    if count > cfg.maintenance_max_uris:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {cfg.maintenance_max_uris} URIs can be given "
+                   f"at once")
+
+
+@router.post(
+    "/cache/invalidate", tags=["Maintenance"],
+    description="Drops the cached results about the given entities or "
+                "classes, e.g. after loading new triples about them. With "
+                "the in-memory cache only the worker answering is "
+                "affected. Needs maintenance_enabled")
+async def invalidate_cache(entity_ids: List[EntityURI] = exents,
+                           user_info: str = Depends(maintainer())
+                           ):
+    check_maintenance_size(len(entity_ids))
+    deleted = await graph.invalidate_entities(entity_ids)
+    return {"message": "OK", "invalidated": deleted}
+
+
+async def warm_cache(entity_ids: List[str] = (), class_ids: List[str] = ()):
+    """
+    Warms the cache with the given entities and classes, those of the config
+    and the ones asked for the most
+    """
+    entities = list(entity_ids) + cfg.openAPIExamples["entities"] + \
+        cfg.warmup_entities + \
+        await access_log.top("entity", cfg.warmup_top_accessed)
+    classes = list(class_ids) + cfg.openAPIExamples["classes"] + \
+        cfg.warmup_classes + \
+        await access_log.top("class", cfg.warmup_top_accessed)
+    # Without duplicates, keeping the order
+    entities = list(dict.fromkeys(URI(e).n3() for e in entities))
+    classes = list(dict.fromkeys(URI(c).n3() for c in classes))
+    return await graph.warm_up(entities, classes, onto=onto, lang=deflang,
+                               concurrency=cfg.warmup_concurrency)
+
+
+@router.post(
+    "/cache/warm", tags=["Maintenance"],
+    description="Fetches the given entities and classes, those configured "
+                "for warm-up and the ones asked for the most, so that they "
+                "are cached. With the in-memory cache only the worker "
+                "answering is warmed up. Needs maintenance_enabled")
+async def warm_up_cache(entity_ids: List[EntityURI] = [],
+                        class_ids: List[ClassURI] = [],
+                        user_info: str = Depends(maintainer())
+                        ):
+    check_maintenance_size(len(entity_ids) + len(class_ids))
+    result = await warm_cache(entity_ids, class_ids)
+    return {"message": "OK", **result}
@@ -1,5 +1,11 @@
 import cachetools
 import datetime
+import hashlib
+import time
+import zlib
+
+import msgpack
+from aiocache.serializers import BaseSerializer
 
 CACHE_SIZE = 32 * 1024  # Number of Items to save
 CACHE_LIFETIME = 300  # Number of seconds after which cache is invalid
@@ -36,4 +42,141 @@ class TimeLimitedCache:
         return len(self.cache)
 
     def __delitem__(self, key):
-        self.cache.__delitem__(key)
\ No newline at end of file
+        self.cache.__delitem__(key)
+
+
+class CompactSerializer(BaseSerializer):
+    """
+    Serializer for the shared (redis) cache. Values are packed with msgpack
+    and, when they are large enough, compressed with zlib. The first byte of
+    every stored value tells whether it was compressed.
+    """
+    DEFAULT_ENCODING = None
+
+    _PLAIN = b"\x00"
+    _ZLIB = b"\x01"
+
+    def __init__(self, *args, compression_level=6, min_compress_size=512,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compression_level = compression_level
+        self.min_compress_size = min_compress_size
+
+    def dumps(self, value):
+        packed = msgpack.packb(value, use_bin_type=True)
+        if (self.compression_level is None
+                or self.compression_level <= 0
+                or len(packed) < self.min_compress_size):
+            return self._PLAIN + packed
+        return self._ZLIB + zlib.compress(packed, self.compression_level)
+
+    def loads(self, value):
+        if value is None:
+            return None
+        flag, payload = value[:1], value[1:]
+        if flag == self._ZLIB:
+            payload = zlib.decompress(payload)
+        return msgpack.unpackb(payload, raw=False)
+
+
+def cache_key(query: str, prefix: str = "q") -> str:
+    """
+    Keys of the shared cache are digests of the (normalized) query, so that
+    long SPARQL strings are not stored once more as redis keys
+    """
+    return prefix + ":" + hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+
+class CacheTagIndex:
+    """
+    Remembers which keys of a cache hold results about which tags (the URIs
+    of entities and classes), so that only those keys are deleted when the
+    data about a tag changes.
+    With redis, every tag is a redis set of keys, updated atomically by lua
+    scripts, so that workers sharing the cache never lose each other's keys.
+    With the in-memory cache, tags are kept in a dict local to the process.
+    Tags last ttl seconds (the lifetime of the keys, 0 for ever) from the
+    last key added to them, so that they are dropped once all their keys
+    expired.
+    """
+    # KEYS: the tags. ARGV: the key, the ttl of the tags
+    _ADD_SCRIPT = """
+        local ttl = tonumber(ARGV[2])
+        for i, tagkey in ipairs(KEYS) do
+            redis.call('SADD', tagkey, ARGV[1])
+            if ttl > 0 then
+                redis.call('EXPIRE', tagkey, ttl)
+            end
+        end
+        return 0
+    """
+    _INVALIDATE_SCRIPT = """
+        local deleted = 0
+        for i, tagkey in ipairs(KEYS) do
+            local keys = redis.call('SMEMBERS', tagkey)
+            for j = 1, #keys, 500 do
+                deleted = deleted + redis.call(
+                    'DEL', unpack(keys, j, math.min(j + 499, #keys)))
+            end
+            redis.call('DEL', tagkey)
+        end
+        return deleted
+    """
+
+    def __init__(self, cache, shared: bool, ttl: int = 0):
+        self.cache = cache
+        self.shared = shared
+        self.ttl = int(ttl or 0)
+        # Tag: [when it expires, its keys]
+        self._local = dict()
+        self._next_prune = 0
+
+    def _full_key(self, key: str) -> str:
+        # Raw redis commands need the keys with the namespace of the cache
+        return self.cache._build_key(key)
+
+    async def add(self, key: str, tags):
+        if not tags:
+            return
+        tagkeys = [cache_key(t, prefix="t") for t in set(tags)]
+        if not self.shared:
+            now = time.monotonic()
+            expires = now + self.ttl if self.ttl else None
+            for tk in tagkeys:
+                entry = self._local.setdefault(tk, [expires, set()])
+                entry[0] = expires
+                entry[1].add(key)
+            if self.ttl and now >= self._next_prune:
+                self._prune(now)
+            return
+        await self.cache.raw("eval", self._ADD_SCRIPT,
+                             [self._full_key(tk) for tk in tagkeys],
+                             [self._full_key(key), self.ttl])
+
+    def _prune(self, now: float):
+        # Tags are not looked at once expired, so they are dropped now and
+        # then instead
+        expired = [tk for tk, (expires, _) in self._local.items()
+                   if expires is not None and expires <= now]
+        for tk in expired:
+            del self._local[tk]
+        self._next_prune = now + min(self.ttl, 600)
+
+    async def invalidate(self, tags) -> int:
+        """
+        Deletes every key tagged with any of tags
+        :return: the number of keys deleted
+        """
+        tagkeys = [cache_key(t, prefix="t") for t in set(tags)]
+        if not tagkeys:
+            return 0
+        if not self.shared:
+            keys = set()
+            for tk in tagkeys:
+                keys.update(self._local.pop(tk, (None, ()))[1])
+            for key in keys:
+                await self.cache.delete(key)
+            return len(keys)
+        return await self.cache.raw("eval", self._INVALIDATE_SCRIPT,
+                                    [self._full_key(tk) for tk in tagkeys],
+                                    [])
@@ -1,9 +1,12 @@
+import hashlib
+import time
+
 from fastapi import HTTPException, status
-from jose import JWTError, jwt, ExpiredSignatureError
+from jose import JWTError, jwt, jwk, ExpiredSignatureError
 from starlette.requests import Request
 
 from config import conf
-
+from utils.Caching import TimeLimitedCache
 
 
 ALGORITHM = "HS256"
@@ -17,6 +20,18 @@ RSA_KEY = {
     'e': 'AQAB'
 }
 
+# Tokens of the auth server are signed with RS256, whatever their (not yet
+# verified) header says
+ALGORITHMS = ["RS256"]
+# Building the key is costly, so it is done once instead of on every request
+PUBLIC_KEY = jwk.construct(RSA_KEY, ALGORITHMS[0]) \
+    if conf.auth_server_n else None
+
+# Payloads of tokens whose signature was already verified, by token digest.
+# Entries never outlive the `exp` claim of their token
+_verified_tokens = TimeLimitedCache(ttl=conf.auth_token_cache_ttl,
+                                    cache_size=conf.auth_token_cache_size)
+
 CREDENTIALS_EXCEPTION = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
@@ -29,6 +44,16 @@ CREDENTIALS_EXCEPTION_EMAIL = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+MAINTENANCE_DISABLED_EXCEPTION = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Maintenance routes are disabled",
+)
+
+MAINTENANCE_ROLE_EXCEPTION = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Maintenance routes need the maintenance role",
+)
+
 EXPIRED_TOKEN_EXCEPTION = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Token is expired... ",
@@ -46,7 +71,21 @@ def decode_token(token):
             "roles": [],
             "email": "user@domain.grontopi"
         }
-    return jwt.decode(token, RSA_KEY, options=JWT_OPTIONS)
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _verified_tokens[digest]
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is None or time.time() < float(exp):
+            return payload
+        del _verified_tokens[digest]
+        raise ExpiredSignatureError("Signature has expired.")
+
+    if PUBLIC_KEY is None:
+        raise JWTError("The key of the auth server is not configured")
+    payload = jwt.decode(token, PUBLIC_KEY, algorithms=ALGORITHMS,
+                         options=JWT_OPTIONS)
+    _verified_tokens[digest] = payload
+    return payload
 
 
 def found_access(search, info):
@@ -77,3 +116,23 @@ def user_invalidator():
             raise CREDENTIALS_EXCEPTION
 
     return verify_jwt_in_request
+
+
+def maintainer():
+    """
+    As user_invalidator, but only for maintainers, see
+    conf.maintenance_enabled
+    """
+    verify_user = user_invalidator()
+
+    async def verify_maintainer(request: Request):
+        if not conf.maintenance_enabled:
+            raise MAINTENANCE_DISABLED_EXCEPTION
+        user_info = await verify_user(request)
+        if conf.use_OAuth2 and user_info is not None and not (
+                user_info["static_token"]
+                or conf.maintenance_role in user_info["roles"]):
+            raise MAINTENANCE_ROLE_EXCEPTION
+        return user_info
+
+    return verify_maintainer
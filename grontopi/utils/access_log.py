@@ -0,0 +1,108 @@
+"""
+Counts how often entities and classes are asked for, so that the cache can
+be warmed with the most popular ones (see routes.warm_cache).
+
+Counting must not slow requests down, so counts are buffered in the worker
+and only every few seconds added to redis sorted sets, shared by all
+workers, in a single call. With the memory cache backend they stay in the
+worker.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, Iterable, List
+
+from aiocache import Cache
+
+from config import conf
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLog:
+    # KEYS: the sorted set of counts. ARGV: the max size of the set, then
+    # member, count, member, count...
+    _FLUSH_SCRIPT = """
+        for i = 2, #ARGV, 2 do
+            redis.call('ZINCRBY', KEYS[1], ARGV[i + 1], ARGV[i])
+        end
+        redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[1]) - 1)
+        return 0
+    """
+
+    def __init__(self, shared: bool, flush_interval: float = 10,
+                 max_size: int = 10000):
+        """
+        :param max_size: only the counts of this many entities (and as many
+            classes) are kept, the least asked for are forgotten
+        """
+        self.shared = shared
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._pending: Dict[str, Counter] = dict()
+        self._counts: Dict[str, Counter] = dict()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self.cache = None
+        if shared:
+            self.cache = Cache(cache_class=Cache.REDIS,
+                               namespace="access",
+                               endpoint=conf.redis_cache_url,
+                               port=int(conf.redis_cache_port))
+
+    def record(self, kind: str, uris: Iterable[str]):
+        """
+        Counts one access to each of uris, of the given kind ("entity" or
+        "class")
+        """
+        if not self.shared:
+            counts = self._counts.setdefault(kind, Counter())
+            counts.update(uris)
+            if len(counts) > 2 * self.max_size:
+                self._counts[kind] = Counter(
+                    dict(counts.most_common(self.max_size)))
+            return
+        self._pending.setdefault(kind, Counter()).update(uris)
+        if (not self._flushing
+                and time.monotonic() - self._last_flush > self.flush_interval):
+            self._flushing = True
+            asyncio.get_event_loop().create_task(self.flush())
+
+    async def flush(self):
+        pending, self._pending = self._pending, dict()
+        self._last_flush = time.monotonic()
+        try:
+            for kind, counts in pending.items():
+                args = [self.max_size]
+                for uri, count in counts.items():
+                    args += [uri, count]
+                await self.cache.raw("eval", self._FLUSH_SCRIPT,
+                                     [self.cache._build_key(kind)], args)
+        except Exception as e:
+            # Losing some counts is better than failing requests
+            logger.warning("Could not flush the access log: %s", e)
+        finally:
+            self._flushing = False
+
+    async def top(self, kind: str, n: int) -> List[str]:
+        """
+        The n URIs of the given kind asked for the most
+        """
+        if n <= 0:
+            return []
+        if not self.shared:
+            return [uri for uri, _ in
+                    self._counts.get(kind, Counter()).most_common(n)]
+        await self.flush()
+        try:
+            uris = await self.cache.raw("zrevrange",
+                                        self.cache._build_key(kind), 0, n - 1)
+        except Exception as e:
+            logger.warning("Could not read the access log: %s", e)
+            return []
+        return [u.decode("utf-8") if isinstance(u, bytes) else u
+                for u in uris]
+
+
+access_log = AccessLog(shared=conf.cache_backend != "memory")
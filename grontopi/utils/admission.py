@@ -0,0 +1,215 @@
+"""
+Admission control in front of the routes: per-client token buckets and a
+cap on the requests being served at once. Requests over a client's rate get
+a 429 and those over the cap a 503, both right away and with a Retry-After
+header, before any SPARQL query is made.
+
+With the redis cache backend the buckets and the in-flight requests live in
+redis, updated by a lua script, so that the limits hold for all the workers
+together. With the memory backend every worker keeps its own.
+"""
+import logging
+import math
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiocache import Cache
+from fastapi import HTTPException, status
+from jose import JWTError
+from starlette.requests import Request
+
+from config import conf
+from utils import metrics
+from utils.OAuth2_serverside import decode_token
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of an admission check
+ADMITTED, RATE_LIMITED, OVERLOADED = 0, 1, 2
+
+
+class AdmissionController:
+    # KEYS: the bucket of the client, the set of requests in flight
+    # ARGV: now, rate, burst, cost, max in flight, in flight timeout, ticket
+    # Returns the outcome and, if not admitted, the seconds to wait
+    _ADMIT_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local burst = tonumber(ARGV[3])
+        local cost = tonumber(ARGV[4])
+        local max_in_flight = tonumber(ARGV[5])
+        if max_in_flight > 0 then
+            redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf',
+                       now - tonumber(ARGV[6]))
+            if redis.call('ZCARD', KEYS[2]) >= max_in_flight then
+                return {2, '1'}
+            end
+        end
+        if rate > 0 then
+            local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+            local tokens = tonumber(bucket[1]) or burst
+            local ts = tonumber(bucket[2]) or now
+            tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+            if tokens < cost then
+                return {1, tostring((cost - tokens) / rate)}
+            end
+            redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens - cost),
+                       'ts', tostring(now))
+            redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        end
+        if max_in_flight > 0 then
+            redis.call('ZADD', KEYS[2], now, ARGV[7])
+        end
+        return {0, '0'}
+    """
+    _IN_FLIGHT_KEY = "in_flight"
+
+    def __init__(self, rate: float, burst: float, max_in_flight: int,
+                 in_flight_timeout: float, shared: bool):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.in_flight_timeout = in_flight_timeout
+        self.shared = shared
+        self._buckets: Dict[str, List[float]] = dict()
+        self._in_flight = 0
+        self.cache = None
+        if shared:
+            self.cache = Cache(cache_class=Cache.REDIS,
+                               namespace="admission",
+                               endpoint=conf.redis_cache_url,
+                               port=int(conf.redis_cache_port))
+
+    async def admit(self, client: str, cost: float) -> Optional[str]:
+        """
+        :return: a ticket to release once the request is served
+        :raises HTTPException: 429 or 503 if the request is not admitted
+        """
+        # A request costing more than a full bucket could never pass
+        cost = min(cost, self.burst)
+        if self.shared:
+            ticket = uuid.uuid4().hex
+            try:
+                outcome, wait = await self.cache.raw(
+                    "eval", self._ADMIT_SCRIPT,
+                    [self.cache._build_key("b:" + client),
+                     self.cache._build_key(self._IN_FLIGHT_KEY)],
+                    [time.time(), self.rate, self.burst, cost,
+                     self.max_in_flight, self.in_flight_timeout, ticket])
+            except Exception as e:
+                # Better to serve without limits than not to serve at all
+                logger.warning("Admission control unavailable: %s", e)
+                return None
+            outcome, wait = int(outcome), float(wait)
+        else:
+            ticket = "local"
+            outcome, wait = self._admit_locally(client, cost)
+        if outcome == ADMITTED:
+            return ticket
+        self._reject(outcome, wait)
+
+    def _admit_locally(self, client: str, cost: float):
+        if 0 < self.max_in_flight <= self._in_flight:
+            return OVERLOADED, 1.0
+        if self.rate > 0:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - ts) * self.rate)
+            if tokens < cost:
+                return RATE_LIMITED, (cost - tokens) / self.rate
+            self._buckets[client] = [tokens - cost, now]
+            if len(self._buckets) > 100000:
+                self._forget_full_buckets(now)
+        self._in_flight += 1
+        return ADMITTED, 0.0
+
+    def _forget_full_buckets(self, now: float):
+        # A bucket that refilled completely is the same as a missing one
+        full = [client for client, (tokens, ts) in self._buckets.items()
+                if tokens + (now - ts) * self.rate >= self.burst]
+        for client in full:
+            del self._buckets[client]
+
+    @staticmethod
+    def _reject(outcome: int, wait: float):
+        retry_after = str(max(1, math.ceil(wait)))
+        if outcome == RATE_LIMITED:
+            metrics.ADMISSION_REJECTIONS.labels(reason="rate_limited").inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": retry_after})
+        metrics.ADMISSION_REJECTIONS.labels(reason="overloaded").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy",
+            headers={"Retry-After": retry_after})
+
+    async def release(self, ticket: Optional[str]):
+        if ticket is None:
+            return
+        if not self.shared:
+            self._in_flight -= 1
+        elif self.max_in_flight > 0:
+            try:
+                await self.cache.raw(
+                    "zrem", self.cache._build_key(self._IN_FLIGHT_KEY),
+                    ticket)
+            except Exception as e:
+                # The entry expires after in_flight_timeout anyway
+                logger.warning("Could not release request: %s", e)
+
+
+controller = AdmissionController(
+    rate=conf.rate_limit_per_second if conf.rate_limit_enabled else 0,
+    burst=conf.rate_limit_burst,
+    max_in_flight=conf.max_in_flight_requests,
+    in_flight_timeout=conf.in_flight_timeout,
+    shared=conf.cache_backend != "memory")
+
+
+def client_id(request: Request) -> str:
+    """
+    The email in the request's token if it has a valid one, else its IP
+    """
+    if conf.use_OAuth2:
+        token = request.headers.get("Authorization", "")[7:]
+        if token:
+            try:
+                email = decode_token(token).get("email")
+                if email:
+                    return "user:" + email
+            except (JWTError, HTTPException):
+                # Rejected later by the route itself
+                pass
+    host = request.client.host if request.client is not None else "unknown"
+    return "ip:" + host
+
+
+async def request_cost(request: Request) -> float:
+    cost = 1.0
+    if request.method == "POST":
+        try:
+            body = await request.json()
+        except ValueError:
+            return cost
+        if isinstance(body, list):
+            cost += len(body) / conf.rate_limit_entities_per_token
+    return cost
+
+
+async def admission_control(request: Request):
+    """
+    Dependency admitting (or rejecting) requests, and releasing their slot
+    once they are served
+    """
+    if not (conf.rate_limit_enabled or conf.max_in_flight_requests > 0):
+        yield
+        return
+    ticket = await controller.admit(client_id(request),
+                                    await request_cost(request))
+    try:
+        yield
+    finally:
+        await controller.release(ticket)
@@ -0,0 +1,308 @@
+"""
+A Bloom filter of every typed entity in the knowledge graph, to tell without
+a SPARQL query whether an entity exists (see
+SPARQLAccess.check_existence_of_entities).
+
+Entities the filter does not contain surely do not exist. Those it contains
+exist, but for a small fraction (entity_filter_error_rate) of the missing
+ones, which are then served as entities without statements.
+
+The filter is built by paging through the typed entities of the endpoint,
+and rebuilt every entity_filter_refresh_interval seconds. With the redis
+cache backend it is built by one worker and stored in redis, as a bit
+string other workers copy whenever it changed. Every build is stored under
+a key of its own, and its meta (size, number of hashes) switched to it at
+once, so that workers never read bits with the meta of another build.
+Entities invalidated after being loaded (see
+SPARQLAccess.invalidate_entities) are added to it right away, and those
+added while it is rebuilt are added to the new one too. With the memory
+backend every worker builds its own.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from typing import Iterable, List
+
+from aiocache import Cache
+from aiocache.serializers import NullSerializer
+
+from config import conf
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, size_bits: int, hashes: int, bits: bytes = None):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        if bits is None:
+            bits = bytes((size_bits + 7) // 8)
+        self.bits = bytearray(bits)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float):
+        """
+        The smallest filter keeping the rate of false positives at
+        error_rate once it contains capacity items
+        """
+        capacity = max(capacity, 1)
+        size_bits = math.ceil(-capacity * math.log(error_rate)
+                              / math.log(2) ** 2)
+        hashes = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hashes)
+
+    def positions(self, item: str) -> List[int]:
+        # Double hashing, from the two halves of a single digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for pos in self.positions(item):
+            # Most significant bit first, as redis SETBIT
+            self.bits[pos >> 3] |= 0x80 >> (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (0x80 >> (pos & 7))
+                   for pos in self.positions(item))
+
+
+class EntityFilter:
+    # KEYS: the meta, the bit string of the generation of the caller, the
+    # stamp, the lock and the pending list. ARGV: the generation, the
+    # number of bits to set, the bits, and the entities they are for.
+    # Returns -1, setting no bit, if the filter is of another generation.
+    # While the filter is rebuilt the entities are also kept, to be added
+    # to the new one
+    _ADD_SCRIPT = """
+        local npos = tonumber(ARGV[2])
+        if redis.call('EXISTS', KEYS[4]) == 1 then
+            for i = 3 + npos, #ARGV do
+                redis.call('RPUSH', KEYS[5], ARGV[i])
+            end
+        end
+        local meta = redis.call('GET', KEYS[1])
+        if not meta or
+                cjson.decode(meta)['generation'] ~= tonumber(ARGV[1]) then
+            return -1
+        end
+        for i = 3, 2 + npos do
+            redis.call('SETBIT', KEYS[2], ARGV[i], 1)
+        end
+        return redis.call('INCR', KEYS[3])
+    """
+    # KEYS: the meta, the stamp and the pending list. ARGV: the new meta,
+    # the prefix of the bit strings, and how long the previous one is kept
+    # for workers reading it. Returns the entities added meanwhile
+    _PUBLISH_SCRIPT = """
+        local old = redis.call('GET', KEYS[1])
+        redis.call('SET', KEYS[1], ARGV[1])
+        if old then
+            redis.call('EXPIRE', ARGV[2] .. cjson.decode(old)['generation'],
+                       ARGV[3])
+        end
+        redis.call('INCR', KEYS[2])
+        local pending = redis.call('LRANGE', KEYS[3], 0, -1)
+        redis.call('DEL', KEYS[3])
+        return pending
+    """
+    # KEYS: the lock. ARGV: its ttl, in case its worker dies building
+    _LOCK_SCRIPT = """
+        if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, shared: bool, error_rate: float = 0.01,
+                 refresh_interval: float = 3600, reload_interval: float = 30,
+                 page_size: int = 10000):
+        """
+        :param refresh_interval: seconds after which the filter is rebuilt
+        :param reload_interval: how often workers check whether the shared
+            filter changed
+        """
+        self.shared = shared
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self.page_size = page_size
+        self.bloom = None
+        self.built_at = 0
+        # Changes whenever the shared filter does
+        self.stamp = None
+        # Of the shared filter, whose bits are under a key of their own
+        self.generation = None
+        self.cache = None
+        if shared:
+            self.cache = Cache(cache_class=Cache.REDIS,
+                               namespace="entity_filter",
+                               endpoint=conf.redis_cache_url,
+                               port=int(conf.redis_cache_port),
+                               # Replies are bytes, the bits are not text
+                               serializer=NullSerializer(encoding=None))
+
+    @property
+    def ready(self) -> bool:
+        return self.bloom is not None
+
+    def __contains__(self, entity: str) -> bool:
+        return entity in self.bloom
+
+    def _key(self, name: str) -> str:
+        return self.cache._build_key(name)
+
+    async def maintain(self, source, onto_config):
+        """
+        Keeps the filter up to date, forever
+        :param source: has typed_entities_count(onto_config) and
+            typed_entities(onto_config, start, size), see SPARQLAccess
+        """
+        while True:
+            try:
+                await self.sync(source, onto_config)
+            except Exception as e:
+                logger.warning("Could not update the entity filter: %s", e)
+            await asyncio.sleep(self.reload_interval)
+
+    async def sync(self, source, onto_config):
+        if not self.shared:
+            if time.time() - self.built_at > self.refresh_interval:
+                self.bloom = await self.build(source, onto_config)
+                self.built_at = time.time()
+            return
+        meta = await self._meta()
+        if meta is None or time.time() - meta["built_at"] > \
+                self.refresh_interval:
+            # Only one worker rebuilds it, the others keep the old one
+            locked = await self.cache.raw(
+                "eval", self._LOCK_SCRIPT, [self._key("lock")],
+                [max(1, int(self.refresh_interval))])
+            if locked:
+                try:
+                    await self._build_shared(source, onto_config)
+                finally:
+                    await self.cache.raw("delete", self._key("lock"))
+                return
+            if meta is None:
+                return
+        stamp = await self.cache.raw("get", self._key("stamp"))
+        if stamp != self.stamp or self.bloom is None:
+            await self._load(meta, stamp)
+
+    async def _meta(self):
+        meta = await self.cache.raw("get", self._key("meta"))
+        return json.loads(meta) if meta else None
+
+    async def _load(self, meta, stamp):
+        bits = await self.cache.raw(
+            "get", self._key(f"bits:{meta['generation']}"))
+        if bits is None:
+            # Replaced meanwhile, the next sync loads the new one
+            return
+        if len(bits) != (meta["size_bits"] + 7) // 8:
+            # Entities are then checked with queries, until it is rebuilt
+            logger.warning("The shared entity filter has %d bytes instead "
+                           "of %d, not using it", len(bits),
+                           (meta["size_bits"] + 7) // 8)
+            self.bloom = None
+            return
+        self.bloom = BloomFilter(meta["size_bits"], meta["hashes"], bits)
+        self.generation = meta["generation"]
+        self.built_at = meta["built_at"]
+        self.stamp = stamp
+        logger.info("Entity filter reloaded")
+
+    async def _build_shared(self, source, onto_config):
+        bloom = await self.build(source, onto_config)
+        built_at = time.time()
+        generation = await self.cache.raw("incr", self._key("generation"))
+        meta = {"built_at": built_at, "size_bits": bloom.size_bits,
+                "hashes": bloom.hashes, "generation": generation}
+        # Under a key of its own, used once the meta points to it
+        await self.cache.raw("set", self._key(f"bits:{generation}"),
+                             bytes(bloom.bits))
+        pending = await self.cache.raw(
+            "eval", self._PUBLISH_SCRIPT,
+            [self._key("meta"), self._key("stamp"), self._key("pending")],
+            [json.dumps(meta), self._key("bits:"),
+             max(1, int(2 * self.reload_interval))])
+        self.bloom = bloom
+        self.generation = generation
+        self.built_at = built_at
+        self.stamp = await self.cache.raw("get", self._key("stamp"))
+        if pending:
+            # Added while it was built, maybe after they were paged through
+            await self.add([e.decode("utf-8") if isinstance(e, bytes) else e
+                            for e in pending])
+
+    async def build(self, source, onto_config) -> BloomFilter:
+        stime = time.perf_counter()
+        total = await source.typed_entities_count(onto_config)
+        # Room for the entities loaded until it is rebuilt
+        bloom = BloomFilter.for_capacity(int(total * 1.1) + 1000,
+                                         self.error_rate)
+        start = 0
+        while True:
+            page = await source.typed_entities(onto_config, start,
+                                               self.page_size)
+            for entity in page:
+                bloom.add(entity)
+            if len(page) < self.page_size:
+                break
+            start += self.page_size
+        logger.info("Entity filter of %d entities (%d KiB) built in %.1fs",
+                    start + len(page), len(bloom.bits) // 1024,
+                    time.perf_counter() - stime)
+        return bloom
+
+    async def add(self, entities: Iterable[str]):
+        """
+        Adds the given entities (in n3), which may have just been loaded
+        """
+        if self.bloom is None:
+            return
+        entities = list(entities)
+        for entity in entities:
+            self.bloom.add(entity)
+        if not self.shared:
+            return
+        try:
+            for _ in range(2):
+                positions = [pos for e in entities
+                             for pos in self.bloom.positions(e)]
+                done = await self.cache.raw(
+                    "eval", self._ADD_SCRIPT,
+                    [self._key("meta"),
+                     self._key(f"bits:{self.generation}"),
+                     self._key("stamp"), self._key("lock"),
+                     self._key("pending")],
+                    [self.generation, len(positions)] + positions + entities)
+                if done != -1:
+                    return
+                # Rebuilt meanwhile: added to the new one instead
+                meta = await self._meta()
+                if meta is None:
+                    return
+                await self._load(
+                    meta, await self.cache.raw("get", self._key("stamp")))
+                if self.bloom is None:
+                    return
+                for entity in entities:
+                    self.bloom.add(entity)
+        except Exception as e:
+            # Until the next rebuild other workers may reject them
+            logger.warning("Could not add entities to the shared entity "
+                           "filter: %s", e)
+
+
+entity_filter = EntityFilter(
+    shared=conf.cache_backend != "memory",
+    error_rate=conf.entity_filter_error_rate,
+    refresh_interval=conf.entity_filter_refresh_interval,
+    reload_interval=conf.entity_filter_reload_interval,
+    page_size=conf.entity_filter_page_size)
@@ -0,0 +1,79 @@
+"""
+Validators for HTTP caching of the read-only routes.
+
+Responses are not hashed: their ETag is derived from the route, its query
+parameters, the deployment and the data version, the time cached results
+were last invalidated (see SPARQLAccess.data_version). Responses are built
+from those cached results, so they can only have changed if the data
+version did, or if a new deployment (another version of the app, or other
+settings) builds them differently. This lets conditional requests be
+answered with a 304 before the route runs, with neither a SPARQL query nor
+serialization.
+"""
+import hashlib
+import json
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Tuple
+
+from starlette.datastructures import Headers
+
+
+# The settings responses depend on, besides the data
+RESPONSE_SETTINGS = ("sparql_endpoint", "different_graphs", "ontonamespace",
+                     "type_predicate", "label_uris", "label_fallback_languages",
+                     "links_per_predicate", "links_max_page_size",
+                     "neighbourhood_max_depth", "neighbourhood_max_nodes",
+                     "neighbourhood_max_edges", "neighbourhood_batch_size")
+
+
+def deployment_tag(app_version: str, schema: Dict, conf) -> str:
+    """
+    A digest of what responses depend on besides the data: the version of
+    the app, its OpenAPI schema (the shape of responses), the ontology and
+    the settings in RESPONSE_SETTINGS
+    """
+    digest = hashlib.sha1()
+    settings = {name: getattr(conf, name, None) for name in RESPONSE_SETTINGS}
+    digest.update(json.dumps([app_version, schema, settings], sort_keys=True,
+                             default=str).encode("utf-8"))
+    if os.path.isfile(conf.ontology_path):
+        with open(conf.ontology_path, "rb") as fin:
+            digest.update(fin.read())
+    return digest.hexdigest()[:16]
+
+
+def make_etag(route: str, query_items: Iterable[Tuple[str, str]],
+              version: float, deployment: str = "") -> str:
+    # Weak, as the GZip middleware changes the bytes but not the meaning
+    key = route + "?" + "&".join(f"{k}={v}" for k, v in sorted(query_items))
+    digest = hashlib.sha1(f"{key}|{version!r}|{deployment}"
+                          .encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(headers: Headers, etag: str, version: float) -> bool:
+    """
+    Whether the client's copy is current, as per If-None-Match or, only when
+    that is absent, If-Modified-Since
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, ignoring the W/ prefixes
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return etag[2:] in [t[2:] if t.startswith("W/") else t for t in tags]
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have a resolution of one second
+        return int(version) <= since
+    return False
@@ -0,0 +1,236 @@
+"""
+Builds a knowledge graph out of many wikitext lists and CSV files at once.
+
+Every source is parsed and converted in a pool of processes, each writing
+the N-Triples of its source to a part file. The parts are then merged, in
+the order the sources were given, into a single (optionally gzipped)
+N-Triples file, dropping the labels and classes of entities already written
+by previous parts. URIs minted for records and unlinked entities are
+derived from the path of the source, relative to the directory holding all
+of them, and the position of the row in it, so rebuilding the KG gives the
+same URIs whatever the number of workers.
+
+    python grontopi/utils/ingest.py --spec spec.json --mapping index.db \\
+        --workers 8 --output kg.nt.gz lists/*.txt tables/*.csv
+
+The spec describes how columns map to the ontology, see x2KG.LEADERS_SPEC,
+which is used when no spec is given. CSV files need a header row with the
+column names of the spec; any other source is read as wikitext containing a
+"wikitable sortable" table.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import rdflib
+
+from x2KG import (LEADERS_SPEC, WikimarkupDynamicList, open_ntriples_output,
+                  records2rdf_from_spec, rdftype)
+
+# The type and label predicates are those GrOntoPI is configured with
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+from config import conf  # noqa: E402
+
+
+def read_records(path: str) -> List[Dict]:
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as fin:
+            # Missing trailing cells come as None
+            return [{k: v or "" for k, v in row.items() if k is not None}
+                    for row in csv.DictReader(fin)]
+    with open(path, encoding="utf-8") as fin:
+        # The first record precedes the first row of the table
+        return WikimarkupDynamicList(fin.read()).content[1:]
+
+
+def source_ids(paths: List[str]) -> List[str]:
+    """
+    The paths relative to the deepest directory holding all of them, so
+    that sources with the same name in different directories mint different
+    URIs, while moving the whole tree elsewhere does not change them
+    """
+    if not paths:
+        return []
+    absolute = [os.path.abspath(p) for p in paths]
+    root = os.path.commonpath([os.path.dirname(p) for p in absolute])
+    return [os.path.relpath(p, root).replace(os.sep, "/") for p in absolute]
+
+
+def entity_description_predicates() -> Set[str]:
+    """
+    The predicates, in n3, of the triples merge_parts dedupes: the type and
+    label predicates of the config, and those the converter writes
+    """
+    return set(["<" + str(p) + ">"
+                for p in list(conf.type_predicate) + list(conf.label_uris)
+                + [rdftype, rdflib.RDFS["label"]]])
+
+
+def convert_source(path: str, part: str, spec: Dict,
+                   mappingfile: Optional[str],
+                   source_id: Optional[str] = None) -> Dict:
+    """
+    Parses and converts one source into the part file `part`.
+    Runs in the worker processes, so it only takes picklable arguments
+    :param source_id: what minted URIs are derived from, the path by default
+    """
+    stime = time.perf_counter()
+    records = read_records(path)
+    parse_time = time.perf_counter() - stime
+
+    stime = time.perf_counter()
+    r2rdf = records2rdf_from_spec(spec, mappingfile=mappingfile,
+                                  source_id=source_id or path)
+    numtriples = r2rdf.convert_to_ntriples(records, part, skip_first=False)
+    return {"source": path, "part": part,
+            "rows": len(records), "triples": numtriples,
+            "parse_s": parse_time,
+            "convert_s": time.perf_counter() - stime}
+
+
+def _part_lines(part: str) -> Iterator[str]:
+    with open(part, encoding="utf-8") as fin:
+        yield from fin
+
+
+def merge_parts(parts: List[str], destination: str,
+                dedupe_entities: bool = True,
+                predicates: Iterable[str] = None) -> int:
+    """
+    Concatenates the part files into destination
+    :param dedupe_entities: only write the first of the type and label
+        triples repeated across parts, as convert_to_ntriples does within one
+    :param predicates: those of the triples to dedupe, in n3. By default
+        entity_description_predicates()
+    :return: the number of triples written
+    """
+    if predicates is None:
+        predicates = entity_description_predicates()
+    predicates = set(predicates)
+    seen = set()
+    written = 0
+    with open_ntriples_output(destination) as fout:
+        for part in parts:
+            for line in _part_lines(part):
+                if dedupe_entities and \
+                        _is_entity_description(line, predicates):
+                    if line in seen:
+                        continue
+                    seen.add(line)
+                fout.write(line)
+                written += 1
+    return written
+
+
+def _is_entity_description(line: str, predicates: Set[str]) -> bool:
+    # The lines convert_to_ntriples dedupes: classes and labels
+    return line.split(" ", 2)[1] in predicates
+
+
+def ingest(sources: List[str], destination: str, spec: Dict,
+           mappingfile: Optional[str] = None, workers: int = None,
+           dedupe_entities: bool = True) -> Dict:
+    """
+    :return: a report with the statistics of every source and stage
+    """
+    workdir = tempfile.mkdtemp(prefix="grontopi_ingest_")
+    wall = time.perf_counter()
+    try:
+        parts = [os.path.join(workdir, f"part{i:05d}.nt")
+                 for i in range(len(sources))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(convert_source, src, part, spec,
+                                   mappingfile, sid)
+                       for src, part, sid in zip(sources, parts,
+                                                 source_ids(sources))]
+            per_source = []
+            for future in futures:
+                stats = future.result()
+                per_source.append(stats)
+                print(f"\t{stats['source']}: {stats['rows']} rows, "
+                      f"{stats['triples']} triples", flush=True)
+        convert_wall = time.perf_counter() - wall
+
+        stime = time.perf_counter()
+        written = merge_parts(parts, destination,
+                              dedupe_entities=dedupe_entities)
+        merge_time = time.perf_counter() - stime
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = sum(s["rows"] for s in per_source)
+    triples = sum(s["triples"] for s in per_source)
+    parse_time = sum(s["parse_s"] for s in per_source)
+    convert_time = sum(s["convert_s"] for s in per_source)
+    return {
+        "sources": per_source,
+        "rows": rows,
+        "triples_converted": triples,
+        "triples_written": written,
+        # Per stage throughput is per worker, out of the summed stage times
+        "parse_rows_per_s": rows / max(parse_time, 1e-9),
+        "convert_triples_per_s": triples / max(convert_time, 1e-9),
+        "parse_and_convert_wall_s": convert_wall,
+        "merge_s": merge_time,
+        "merge_triples_per_s": triples / max(merge_time, 1e-9),
+        "wall_s": time.perf_counter() - wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+",
+                        help="wikitext or .csv files to convert")
+    parser.add_argument("--spec",
+                        help="JSON file describing how columns map to the "
+                             "ontology. Defaults to the leaders sample one")
+    parser.add_argument("--mapping", default=None,
+                        help="wikimapper database used to turn wikipedia "
+                             "URIs into wikidata ones")
+    parser.add_argument("--output", default="kg.nt.gz",
+                        help="where to write the KG as N-Triples, '-' for "
+                             "the standard output. A .gz suffix compresses "
+                             "it")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes, by default one per CPU")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="keep repeated labels and classes, using less "
+                             "memory")
+    parser.add_argument("--report", help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    spec = LEADERS_SPEC
+    if args.spec is not None:
+        with open(args.spec) as fin:
+            spec = json.load(fin)
+
+    print(f"Ingesting {len(args.sources)} sources", flush=True)
+    report = ingest(args.sources, args.output, spec,
+                    mappingfile=args.mapping, workers=args.workers,
+                    dedupe_entities=not args.no_dedupe)
+    print(f"{report['rows']} rows, {report['triples_written']} triples "
+          f"written to {args.output}\n"
+          f"\tparse   {report['parse_rows_per_s']:12.0f} rows/s per worker\n"
+          f"\tconvert {report['convert_triples_per_s']:12.0f} triples/s "
+          f"per worker\n"
+          f"\tparse and convert {report['parse_and_convert_wall_s']:.2f}s, "
+          f"merge {report['merge_s']:.2f}s "
+          f"({report['merge_triples_per_s']:.0f} triples/s), "
+          f"total {report['wall_s']:.2f}s")
+    if args.report:
+        with open(args.report, "w") as fout:
+            json.dump(report, fout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
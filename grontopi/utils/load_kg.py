@@ -0,0 +1,254 @@
+"""
+Loads triples generated by x2KG.py or ingest.py into the SPARQL store, and
+tells GrOntoPI to drop what it has cached about the loaded entities.
+
+Triples are sent in chunks, several at a time, either with the SPARQL 1.1
+Graph Store protocol (POST of N-Triples to e.g. Fuseki's /ds/data) or as
+`INSERT DATA` updates (to e.g. Fuseki's /ds/update). Failed chunks are
+retried with exponential backoff.
+
+    python grontopi/utils/load_kg.py kg.nt.gz \\
+        --gsp http://local_fuseki:3030/ds/data --user admin --password ... \\
+        --batch-size 50000 --workers 4 --api http://localhost:8000
+
+N-Triples files (optionally gzipped) are streamed line by line; other
+formats (e.g. the Turtle x2KG.py writes by default) are parsed with rdflib
+first. Blank nodes are not kept across chunks.
+"""
+import argparse
+import base64
+import gzip
+import json
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional, Set
+
+import rdflib
+from rdflib.plugins.parsers.ntriples import ParseError, W3CNTriplesParser
+
+from x2KG import nt_line
+
+# Errors worth retrying: the store is busy or restarting
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """
+    The triples of an RDF file as N-Triples lines
+    """
+    if path.endswith(".nt") or path.endswith(".nt.gz"):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as fin:
+            for line in fin:
+                if line.strip() and not line.lstrip().startswith("#"):
+                    yield line if line.endswith("\n") else line + "\n"
+        return
+    g = rdflib.Graph()
+    g.parse(path)
+    for triple in g:
+        yield nt_line(triple)
+
+
+def chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _LastTriple:
+    # The sink of W3CNTriplesParser, which hands it every triple parsed
+    def __init__(self):
+        self.last = None
+
+    def triple(self, s, p, o):
+        self.last = (s, p, o)
+
+
+def line_uris(line: str) -> List[str]:
+    """
+    The subject and object of an N-Triples line that are URIs, in n3.
+    Blank nodes and literals are left out, as the API caches nothing about
+    them, and so are URIs without "://", which it does not take
+    """
+    sink = _LastTriple()
+    parser = W3CNTriplesParser(sink)
+    parser.line = line.strip()
+    try:
+        parser.parseline()
+    except ParseError:
+        # Left for the store to reject
+        return []
+    if sink.last is None:
+        return []
+    sub, _pred, obj = sink.last
+    return [t.n3() for t in (sub, obj)
+            if isinstance(t, rdflib.URIRef) and "://" in t]
+
+
+class StoreLoader:
+    def __init__(self, gsp: Optional[str] = None,
+                 update: Optional[str] = None,
+                 graph: Optional[str] = None,
+                 user: Optional[str] = None,
+                 password: Optional[str] = None,
+                 retries: int = 5,
+                 timeout: float = 300):
+        if (gsp is None) == (update is None):
+            raise ValueError("Give either a graph store or update endpoint")
+        self.gsp = gsp
+        self.update = update
+        self.graph = graph
+        self.retries = retries
+        self.timeout = timeout
+        self.headers = {}
+        if user is not None:
+            creds = base64.b64encode(f"{user}:{password or ''}".encode())
+            self.headers["Authorization"] = "Basic " + creds.decode()
+
+    def _request(self, chunk: List[str]) -> urllib.request.Request:
+        if self.gsp is not None:
+            target = "default" if self.graph is None else "graph=" + \
+                urllib.parse.quote(self.graph, safe="")
+            sep = "&" if "?" in self.gsp else "?"
+            return urllib.request.Request(
+                self.gsp + sep + target, data="".join(chunk).encode("utf-8"),
+                headers=dict(self.headers,
+                             **{"Content-Type": "application/n-triples"}),
+                method="POST")
+        body = "".join(chunk)
+        if self.graph is not None:
+            body = f"GRAPH <{self.graph}> {{\n{body}}}\n"
+        return urllib.request.Request(
+            self.update, data=f"INSERT DATA {{\n{body}}}".encode("utf-8"),
+            headers=dict(self.headers,
+                         **{"Content-Type": "application/sparql-update"}),
+            method="POST")
+
+    def upload(self, chunk: List[str]) -> int:
+        """
+        Sends a chunk, retrying with exponential backoff
+        :return: the number of triples sent
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with urllib.request.urlopen(self._request(chunk),
+                                            timeout=self.timeout) as resp:
+                    resp.read()
+                return len(chunk)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS or attempt == self.retries:
+                    raise
+            except (urllib.error.URLError, OSError):
+                if attempt == self.retries:
+                    raise
+            time.sleep(min(60, 0.5 * 2 ** attempt))
+
+
+def invalidate(api: str, uris: Set[str], token: Optional[str] = None,
+               batch_size: int = 1000) -> int:
+    """
+    Asks GrOntoPI to drop its cached results about the given URIs, in
+    batches of at most its maintenance_max_uris
+    :return: the number of cached results dropped
+    """
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["Authorization"] = "Bearer " + token
+    uris = sorted(uris)
+    deleted = 0
+    for start in range(0, len(uris), batch_size):
+        req = urllib.request.Request(
+            api.rstrip("/") + "/cache/invalidate",
+            data=json.dumps(uris[start:start + batch_size]).encode("utf-8"),
+            headers=headers, method="POST")
+        with urllib.request.urlopen(req) as resp:
+            deleted += json.loads(resp.read())["invalidated"]
+    return deleted
+
+
+def load(paths: List[str], loader: StoreLoader, batch_size: int = 10000,
+         workers: int = 4, track_uris: bool = True):
+    """
+    Uploads the files in chunks, with at most 2 * workers chunks in memory
+    :return: the number of triples loaded and the URIs they are about
+    """
+    uris = set()
+    loaded = 0
+    pending = set()
+
+    def tracked(lines):
+        for line in lines:
+            if track_uris:
+                uris.update(line_uris(line))
+            yield line
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            for chunk in chunks(tracked(read_lines(path)), batch_size):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    loaded += sum(f.result() for f in done)
+                pending.add(pool.submit(loader.upload, chunk))
+        loaded += sum(f.result() for f in pending)
+    return loaded, uris
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="RDF files to load")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--gsp", help="graph store protocol endpoint")
+    target.add_argument("--update", help="SPARQL update endpoint")
+    parser.add_argument("--graph", help="named graph to load into, instead "
+                                        "of the default one")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="triples per request")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of requests sent at the same time")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--api", help="base URL of GrOntoPI, whose cache "
+                                      "about the loaded entities is dropped")
+    parser.add_argument("--token", help="bearer token for the GrOntoPI API, "
+                                        "with its maintenance role")
+    args = parser.parse_args()
+
+    loader = StoreLoader(gsp=args.gsp, update=args.update, graph=args.graph,
+                         user=args.user, password=args.password,
+                         retries=args.retries)
+    stime = time.perf_counter()
+    loaded, uris = load(args.files, loader, batch_size=args.batch_size,
+                        workers=args.workers, track_uris=args.api is not None)
+    elapsed = time.perf_counter() - stime
+    print(f"Loaded {loaded} triples in {elapsed:.1f}s "
+          f"({loaded / max(elapsed, 1e-9):.0f} triples/s)")
+    if args.api is not None:
+        # Links are cached for both of their ends, so objects are
+        # invalidated too
+        try:
+            deleted = invalidate(args.api, uris, token=args.token)
+        except (OSError, ValueError, KeyError) as e:
+            # The triples are loaded anyway, and cached results expire
+            print(f"Warning: could not drop the cached results about the "
+                  f"{len(uris)} loaded URIs ({e}). The data is loaded; "
+                  f"POST them to /cache/invalidate to see it right away",
+                  file=sys.stderr)
+            return
+        print(f"Dropped {deleted} cached results about {len(uris)} URIs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+
+# Id of the request being served, set by a middleware in main.py. Being a
+# context variable, it follows the request into every coroutine and task
+# spawned while serving it (e.g. the queries made by SPARQLAccess)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+DEFAULT_LOGGING_CONFIG = {
+    "level": "INFO",
+    "format": "text",
+    "loggers": {}
+}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: " \
+              "%(message)s"
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({})).keys()) | {
+    "message", "asctime", "request_id"}
+
+_listener = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Fields passed with `extra=` are kept as keys
+    """
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RECORD_ATTRS:
+                entry[k] = v
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(logging_config: dict = None):
+    """
+    Sends every log record through a queue, so that the code emitting it
+    never waits for the actual output, which is done by a listener thread.
+    :param logging_config: a dictionary with keys
+        `level`: the level of the root logger,
+        `format`: either "text" or "json" and
+        `loggers`: a {logger name: level} dictionary to set the level of
+        specific modules, e.g. {"data_access.sparql_data_access": "DEBUG"}
+    """
+    global _listener
+    lc = dict(DEFAULT_LOGGING_CONFIG)
+    lc.update(logging_config or {})
+
+    if lc["format"] == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    if _listener is not None:
+        _listener.stop()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, output,
+                                               respect_handler_level=True)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The filter runs in the emitting thread, where the request id is known
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(lc["level"].upper())
+    for name, level in lc["loggers"].items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener.start()
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,81 @@
+"""
+Prometheus metrics of the API. When gunicorn runs several workers, set the
+env variable PROMETHEUS_MULTIPROC_DIR to a writable, empty directory so that
+the /metrics endpoint aggregates the values of all of them.
+"""
+import os
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+REQUEST_LATENCY = Histogram(
+    "grontopi_request_duration_seconds",
+    "Latency of API requests",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS)
+
+RESPONSE_SIZE = Histogram(
+    "grontopi_response_size_bytes",
+    "Size of API response bodies, before compression",
+    ["route"],
+    buckets=SIZE_BUCKETS)
+
+SPARQL_LATENCY = Histogram(
+    "grontopi_sparql_duration_seconds",
+    "Latency of queries to the upstream SPARQL endpoint",
+    ["kind"],
+    buckets=LATENCY_BUCKETS)
+
+SPARQL_ROWS = Histogram(
+    "grontopi_sparql_result_rows",
+    "Number of bindings returned by the upstream SPARQL endpoint",
+    ["kind"],
+    buckets=ROWS_BUCKETS)
+
+SPARQL_IN_FLIGHT = Gauge(
+    "grontopi_sparql_in_flight",
+    "Queries currently waiting for the upstream SPARQL endpoint",
+    ["kind"],
+    multiprocess_mode="livesum")
+
+SPARQL_ERRORS = Counter(
+    "grontopi_sparql_errors_total",
+    "Queries to the upstream SPARQL endpoint that raised an error",
+    ["kind"])
+
+CACHE_LOOKUPS = Counter(
+    "grontopi_cache_lookups_total",
+    "Cache lookups, by cache tier and outcome (hit, stale or miss)",
+    ["tier", "kind", "outcome"])
+
+ADMISSION_REJECTIONS = Counter(
+    "grontopi_admission_rejections_total",
+    "Requests turned away by admission control, by reason (rate_limited "
+    "or overloaded)",
+    ["reason"])
+
+
+def record_cache_lookup(tier: str, kind: str, hit: bool, stale: bool = False):
+    outcome = "miss"
+    if hit:
+        outcome = "stale" if stale else "hit"
+    CACHE_LOOKUPS.labels(tier=tier, kind=kind, outcome=outcome).inc()
+
+
+def render_metrics():
+    """
+    :return: a (body, content_type) tuple with the text exposition format
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
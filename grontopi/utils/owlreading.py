@@ -1,3 +1,4 @@
+import logging
 import math
 import os
 import re
@@ -24,6 +25,8 @@ unionof_pred_str = "http://www.w3.org/2002/07/owl#unionOf"
 
 vocab_class = ontons["Catalogo"]
 
+logger = logging.getLogger(__name__)
+
 
 def _union2list(r1):
     for k, v in r1.items():
@@ -70,7 +73,7 @@ class OntologyReader:
         self.materialize_subclass_properties()
         self.materialize_domain_of_range_of()
         self.add_rdfs_labels()
-        print("\t", len(self.graph), "triples in full ontology")
+        logger.info("%d triples in full ontology", len(self.graph))
 
         self.rdfs_ns = rdflib.namespace.RDFS
         self.rdf_ns = rdflib.namespace.RDF
@@ -0,0 +1,87 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# The trace of the request being served, if it is being traced
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class QuerySpan:
+    __slots__ = ("kind", "cache", "rows", "query_size", "duration")
+
+    def __init__(self, kind: str, query_size: int):
+        self.kind = kind
+        self.query_size = query_size
+        self.cache = "none"
+        self.rows = None
+        self.duration = 0.0
+
+
+class RequestTrace:
+    """
+    Collects the SPARQL sub-queries made while serving one request
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[QuerySpan] = []
+
+    def server_timing(self) -> str:
+        """
+        :return: the value of a Server-Timing header, with one metric per
+            sub-query (in the order they were issued) plus the total
+        """
+        parts = []
+        for i, span in enumerate(self.spans):
+            desc = f"cache={span.cache} query_chars={span.query_size}"
+            if span.rows is not None:
+                desc += f" rows={span.rows}"
+            parts.append(f'{span.kind}-{i};dur={1000 * span.duration:.1f};'
+                         f'desc="{desc}"')
+        total = time.perf_counter() - self.start
+        parts.append(f"total;dur={1000 * total:.1f}")
+        return ", ".join(parts)
+
+
+def start_request_trace() -> contextvars.Token:
+    return current_trace.set(RequestTrace())
+
+
+@contextmanager
+def traced_query(kind: str, query_size: int, export_spans: bool = False):
+    """
+    Times a sub-query and adds it to the trace of the current request, if
+    any. The yielded span can be filled with the cache outcome and the
+    number of rows.
+    """
+    trace = current_trace.get()
+    span = QuerySpan(kind, query_size)
+    otel_span = None
+    if export_spans and otel_trace is not None:
+        otel_span = otel_trace.get_tracer(__name__).start_span(
+            "sparql." + kind)
+    stime = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.duration = time.perf_counter() - stime
+        if trace is not None:
+            trace.spans.append(span)
+        if otel_span is not None:
+            otel_span.set_attribute("grontopi.query_kind", span.kind)
+            otel_span.set_attribute("grontopi.cache", span.cache)
+            otel_span.set_attribute("grontopi.query_chars", span.query_size)
+            if span.rows is not None:
+                otel_span.set_attribute("grontopi.rows", span.rows)
+            otel_span.end()
+
+
+def finish_request_trace(token: contextvars.Token) -> Optional[RequestTrace]:
+    trace = current_trace.get()
+    current_trace.reset(token)
+    return trace
@@ -1,10 +1,17 @@
+import argparse
+import contextlib
+import gzip
+import io
+import itertools
 import json
-from wikimapper import WikiMapper
+import sqlite3
+import sys
 
 import rdflib
 import re
-from uuid import uuid4
-from typing import Dict, Tuple, List
+from uuid import uuid4, uuid5, NAMESPACE_URL
+from typing import Dict, Tuple, List, Iterable, Iterator, Optional, Set, \
+    Union
 
 fnwikipediainput = "sample_data/leaders_20221211.txt"
 fnttl = "sample_data/leaders_20221211.ttl"
@@ -14,12 +21,18 @@ mappingfile = "index_enwiki-20190420.db"
 
 rdftype = rdflib.RDF["type"]
 
+Triple = Tuple[rdflib.term.Node, rdflib.term.Node, rdflib.term.Node]
+
+
+LINK_PATTERN = re.compile(r'\[\[(.*?)\]\]')
+
 
 def links_from_cell(colval: str,
                     exclude_lists: bool = True):
-    linkpattern = re.compile('\[\[(.*?)\]\]')
     result = []
-    for lt in re.findall(linkpattern, colval):
+    if "[[" not in colval:
+        return result
+    for lt in LINK_PATTERN.findall(colval):
         if "|" in lt:
             lt = lt.split("|")[0]
         if exclude_lists and lt.lower().startswith("list of"):
@@ -30,6 +43,17 @@ def links_from_cell(colval: str,
     return result
 
 
+def cell_links(rec: Dict, colname: str) -> List[str]:
+    """
+    The links of a cell (excluding lists). Rows parsed by
+    WikimarkupDynamicList carry them already, other records are scanned
+    """
+    links = getattr(rec, "links", None)
+    if links is not None and colname in links:
+        return links[colname]
+    return links_from_cell(rec[colname], exclude_lists=True)
+
+
 def localname(uri: rdflib.URIRef):
     st = uri.n3()[1:-1]
     if "#" in st:
@@ -37,14 +61,58 @@ def localname(uri: rdflib.URIRef):
     return st.split("/")[-1]
 
 
+def tokenize_wikitable(text: Union[str, Iterable[str]],
+                       class_to_find: str) -> Iterator[Tuple[str, str]]:
+    """
+    Reads the first table of the given class in wikitext once, yielding its
+    tokens as (kind, markup) pairs:
+        ("header", ...) for every column header, without the "!"
+        ("row", "") for every row separator
+        ("cell", ...) for every cell, with its leading "|" if any
+    :param text: the wikitext, or its lines (e.g. an open file), which are
+        then read as the tokens are
+    """
+    lines = io.StringIO(text) if isinstance(text, str) else iter(text)
+    for line in lines:
+        srow = line.strip()
+        if (srow.startswith("{| class=")
+                and srow.endswith(class_to_find)):
+            break
+    for line in lines:
+        srow = line.strip()
+        if srow == "|}":
+            return
+        if srow.startswith("!"):
+            yield "header", srow.replace("!", "")
+        elif srow.startswith("|-"):
+            yield "row", ""
+        else:
+            yield "cell", srow
+
+
+class WikiRow(dict):
+    """
+    A row of a wikitable, as {column name: cell value}. The links of every
+    cell are extracted when the cell is parsed, and kept in `links`
+    """
+    __slots__ = ("links",)
+
+
 class WikimarkupDynamicList:
-    def __init__(self, source, sep="  \t  "):
+    def __init__(self, source, sep="  \t  ", lazy: bool = False):
+        """
+        :param source: the wikitext, or its lines (e.g. an open file, only
+            read once, with lazy)
+        :param lazy: do not parse the table up front. Rows are then read
+            with rows(), and content stays empty
+        """
         self.text = source
         self.class_to_find = '"wikitable sortable"'
         self.columns = []
         self.content = []
-        self.parse()
         self.sep = sep
+        if not lazy:
+            self.parse()
 
     def collec_links(self,
                      link_ns: rdflib.namespace.Namespace,
@@ -53,16 +121,16 @@ class WikimarkupDynamicList:
                      ):
         if cols is None:
             cols = self.columns
-        result = []
+        result = set()
         for cd in self.content:
             for cn in cols:
-                colval: str = cd[cn]
-                linkscell = links_from_cell(colval,
-                                            exclude_lists=exclude_lists)
-                result += [link_ns[lc]
-                           for lc in linkscell]
+                if exclude_lists:
+                    linkscell = cell_links(cd, cn)
+                else:
+                    linkscell = links_from_cell(cd[cn], exclude_lists=False)
+                result.update(link_ns[lc] for lc in linkscell)
 
-        return set(result)
+        return result
 
     def __str__(self):
         res = ""
@@ -104,87 +172,131 @@ class WikimarkupDynamicList:
             res = res.replace("[","").replace("]","")
         return res
 
-    def _colvals2dict(self, colvalues):
-        thisdict = dict()
-        for cnu, cna in enumerate(self.columns):
-            thisdict[cna] = colvalues[cna]
-        return thisdict
-
-    def parse(self):
-        found_list = False
+    def _process_cell(self, srow: str) -> Tuple[str, int]:
+        """
+        :return: the value of a cell and the number of rows it spans
+        """
+        colval = srow
+        rowspan = 1
+        if "rowspan=" in srow:
+            parts = srow.split("|")
+            colval = "|".join(parts[2:])
+            rowspan = int(parts[1].replace("rowspan=", '')
+                          .replace('"', '').strip())
+        if "sortname|" in colval:
+            colval = self._process_sorname(colval)
+        if colval.startswith("|"):
+            colval = colval[1:].strip()
+        lowval = colval[:6].lower()
+        if (lowval.startswith("{{flag")
+                or lowval.startswith("{{sfn")
+                or lowval.startswith("{{dts")):
+            colval = self._proces_flag(colval)
+        return colval, rowspan
+
+    def rows(self) -> Iterator[WikiRow]:
+        """
+        Parses the table while yielding its rows. The first row holds the
+        column headers. Cells spanning several rows are repeated in each
+        """
+        self.columns = []
         colvalues = dict()
+        collinks = dict()
+        # Number of rows still spanned by the last cell of every column
         colcounters = dict()
         currcol = 0
-        for row in self.text.split("\n"):
-            srow = row.strip()
-            srow: str
-            if not found_list:
-                if (srow.startswith("{| class=")
-                        and srow.endswith(self.class_to_find)):
-                    found_list = True
+        for kind, markup in tokenize_wikitable(self.text,
+                                               self.class_to_find):
+            if kind == "row":
+                for colname in self.columns[currcol:]:
+                    colcounters[colname] -= 1
+                yield self._row(colvalues, collinks)
+                currcol = 0
                 continue
-            if srow == "|}":
-                break
-            if srow.startswith("!"):
-                srow = srow.replace("!", "")
-                colname = srow.split("|")[-1]
+            if kind == "header":
+                colname = markup.split("|")[-1]
                 self.columns.append(colname)
                 colvalues[colname] = None
+                collinks[colname] = []
                 colcounters[colname] = 0
-            if srow.startswith("|-"):
-                row_length = 0
-                while currcol < len(self.columns):
-                    colname = self.columns[currcol]
-                    colval = colvalues[colname]
-                    colcounters[colname] -= 1
-                    colvalues[colname] = colval
-                    currcol += 1
-                self.content.append(self._colvals2dict(colvalues))
-                currcol = 0
-                #print("-")
-                continue
-            colname = self.columns[currcol]
-            #print(" row: ", srow)
-            while colcounters[colname] > 0:
-                colname = self.columns[currcol]
-                colval = colvalues[colname]
-                colcounters[colname] -= 1
-                colvalues[colname] = colval
-                #print(" Skipping ", currcol, colname, ":", colval, "count",
-                #      colcounters[colname] + 1)
+            # Headers are read as cells too, making up the first row
+            while (currcol < len(self.columns)
+                   and colcounters[self.columns[currcol]] > 0):
+                colcounters[self.columns[currcol]] -= 1
                 currcol += 1
-                colname = self.columns[currcol]
             if currcol >= len(self.columns):
-                row_length = 0
-                self.content.append(self._colvals2dict(colvalues))
-                currcol = 0
+                # More cells than columns
                 continue
-            else:
-                colval = srow
-                if "rowspan=" in srow:
-                    colval = "|".join(srow.split("|")[2:])
-                    a = srow.split("|")[1]
-                    r = int(a.replace("rowspan=", '').replace('"', '').strip())
-                    colcounters[colname] = r - 1
-                if "sortname|" in colval:
-                    colval = self._process_sorname(colval)
-                if colval.startswith("|"):
-                    colval = colval[1:].strip()
-                if (colval.lower().startswith("{{flag")
-                        or colval.lower().startswith("{{sfn")
-                        or colval.lower().startswith("{{dts")):
-                    colval = self._proces_flag(colval)
+            colname = self.columns[currcol]
+            colval, rowspan = self._process_cell(markup)
+            colcounters[colname] = rowspan - 1
             colvalues[colname] = colval
+            collinks[colname] = links_from_cell(colval, exclude_lists=True)
             currcol += 1
 
-        thisdict = dict()
-        for cnu, cna in enumerate(self.columns):
-            thisdict[cna] = colvalues[cna]
-        self.content.append(thisdict)
+        yield self._row(colvalues, collinks)
+
+    def _row(self, colvalues: Dict, collinks: Dict) -> WikiRow:
+        row = WikiRow((cn, colvalues[cn]) for cn in self.columns)
+        row.links = {cn: collinks[cn] for cn in self.columns}
+        return row
 
+    def parse(self):
+        self.content = list(self.rows())
         print("Parsing finished")
 
 
+class WikiURIResolver:
+    """
+    Maps wikipedia page names to wikidata entity URIs using a wikimapper
+    database (a sqlite file with a `mapping` table). Names are resolved in
+    bulk, with one query per batch of names, and every result is memoized,
+    so each distinct name is looked up only once.
+    """
+    def __init__(self, mappingfile: Optional[str],
+                 entity_namespace: rdflib.namespace.Namespace,
+                 batch_size: int = 500):
+        self.entns = entity_namespace
+        # sqlite limits the number of parameters of a query
+        self.batch_size = min(batch_size, 999)
+        self.memo: Dict[str, rdflib.URIRef] = dict()
+        self.conn = None
+        if mappingfile is not None:
+            self.conn = sqlite3.connect(mappingfile)
+
+    def _title(self, localname: str) -> str:
+        # The same page title wikimapper's url_to_id would look up
+        return self.entns[localname].n3()[1:-1].rsplit("/", 1)[-1]
+
+    def resolve_many(self, localnames: Iterable[str]):
+        missing = list({ln for ln in localnames if ln not in self.memo})
+        if self.conn is None:
+            for ln in missing:
+                self.memo[ln] = self.entns[ln]
+            return
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            titles = {ln: self._title(ln) for ln in batch}
+            marks = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                "SELECT wikipedia_title, wikidata_id FROM mapping "
+                f"WHERE wikipedia_title IN ({marks})",
+                list(set(titles.values()))).fetchall()
+            title2id = {t: wdid for t, wdid in rows if wdid is not None}
+            for ln, title in titles.items():
+                wdid = title2id.get(title)
+                if wdid is None:
+                    self.memo[ln] = self.entns[ln]
+                else:
+                    self.memo[ln] = rdflib.URIRef(
+                        "http://www.wikidata.org/entity/" + wdid)
+
+    def resolve(self, localname: str) -> rdflib.URIRef:
+        if localname not in self.memo:
+            self.resolve_many([localname])
+        return self.memo[localname]
+
+
 class Records2RDF:
     def __init__(self, record_class: rdflib.URIRef,
                  column_classes: Dict[str, rdflib.URIRef],
@@ -193,7 +305,10 @@ class Records2RDF:
                  rowname_pattern: str,
                  entity_namespace: rdflib.namespace.Namespace,
                  labelpred: rdflib.URIRef = rdflib.RDFS["label"],
-                 lang: str = "en"):
+                 lang: str = "en",
+                 mappingfile: Optional[str] = mappingfile,
+                 resolve_batch: int = 1000,
+                 source_id: Optional[str] = None):
         self.record_class = record_class
         self.column_classes = column_classes
         self.row_to_oolumn_links = row_to_oolumn_links
@@ -202,210 +317,411 @@ class Records2RDF:
         self.entns = entity_namespace
         self.labelpred = labelpred
         self.lang = lang
-        self.urimapper = WikiMapper(mappingfile)
+        # Without a mapping file, entities keep their wikipedia URIs
+        self.resolver = WikiURIResolver(mappingfile, entity_namespace)
+        # Number of records whose links are resolved together
+        self.resolve_batch = resolve_batch
+        # If given, minted URIs are derived from it and the position of the
+        # record, so converting the same source twice gives the same URIs
+        self.source_id = source_id
 
     def _get_uri(self, localname):
-        origurl = self.entns[localname].n3()[1:-1]
-        wdid = self.urimapper.url_to_id(origurl)
-        if wdid is None:
-            return rdflib.URIRef(origurl)
-        newuri = "http://www.wikidata.org/entity/" + wdid
-        return rdflib.URIRef(newuri)
-
-    def convert(self,
-                records: List[Dict]):
-        g = rdflib.Graph()
-        for rec in records[1:]:
-            # print("~~~~~~~~~~~~\n")
-            rowname = self.rownamepattern
-            rowuri = self._get_uri("E" + str(uuid4())[-12:])
-            entities_per_column = {cn: [] for cn in self.column_classes}
-            for colname, colval in rec.items():
-                if len(colval) < 2:
-                    continue
-                # print(colname,":",colval)
-                cv = colval
-                linkscell = links_from_cell(colval, exclude_lists=True)
+        return self.resolver.resolve(localname)
+
+    def _new_uri(self, *key):
+        # Minted for records and unlinked entities, so never in the mapping
+        if self.source_id is None:
+            return self.entns["E" + str(uuid4())[-12:]]
+        name = "|".join([self.source_id] + [str(k) for k in key])
+        return self.entns["E" + uuid5(NAMESPACE_URL, name).hex[-12:]]
+
+    def link_targets(self, records: Iterable[Dict]) -> Set[str]:
+        """
+        The distinct page names linked from the entity columns of records
+        """
+        result = set()
+        for rec in records:
+            for colname in self.column_classes:
+                colval = rec.get(colname)
+                if colval is not None and len(colval) >= 2:
+                    result.update(cell_links(rec, colname))
+        return result
+
+    def record_triples(self, rec: Dict, index: int = None) -> Iterator[Triple]:
+        """
+        The triples describing a single record (a row of the table) and the
+        entities in its columns
+        :param index: the position of the record in its source
+        """
+        rowname = self.rownamepattern
+        rowuri = self._new_uri(index)
+        entities_per_column = {cn: [] for cn in self.column_classes}
+        for colname, colval in rec.items():
+            if len(colval) < 2:
+                continue
+            cv = colval
+            linkscell = cell_links(rec, colname)
+            if len(linkscell) > 0:
+                cv = linkscell[0]
+            rowname = rowname.replace("{__" + colname + "__}", cv)
+            # If this column corresponds to an entity
+            if colname in self.column_classes:
+                col_ent_uris = []
                 if len(linkscell) > 0:
-                    cv = linkscell[0]
-                rowname = rowname.replace("{__" + colname + "__}", cv)
-                # If this column corresponds to an entity
-                if colname in self.column_classes:
-                    col_ent_uris = []
-                    if len(linkscell) > 0:
-                        for lc in linkscell:
-                            col_ent_uri = self._get_uri(lc)
-                            col_ent_uris.append(col_ent_uri)
-                            g.add((col_ent_uri,
-                                   self.labelpred,
-                                   rdflib.Literal(lc.replace("_", " "),
-                                                  lang=self.lang)))
-                    else:
-                        col_ent_uri = self._get_uri("E" + str(uuid4())[-12:])
-                        col_ent_label = rdflib.Literal(colval,
-                                                       lang=self.lang)
-                        g.add((col_ent_uri, self.labelpred, col_ent_label))
+                    for lc in linkscell:
+                        col_ent_uri = self._get_uri(lc)
                         col_ent_uris.append(col_ent_uri)
+                        yield (col_ent_uri,
+                               self.labelpred,
+                               rdflib.Literal(lc.replace("_", " "),
+                                              lang=self.lang))
+                else:
+                    col_ent_uri = self._new_uri(index, colname)
+                    col_ent_label = rdflib.Literal(colval,
+                                                   lang=self.lang)
+                    yield (col_ent_uri, self.labelpred, col_ent_label)
+                    col_ent_uris.append(col_ent_uri)
+
+                for col_ent_uri in col_ent_uris:
+                    yield (col_ent_uri, rdftype,
+                           self.column_classes[colname])
+                    # Links between this column and the record
+                    if colname in self.row_to_oolumn_links.keys():
+                        yield (rowuri,
+                               self.row_to_oolumn_links[colname],
+                               col_ent_uri)
+                    entities_per_column[colname].append(col_ent_uri)
+            # If the column is not in column_classes, its a literal
+            elif colname in self.row_to_oolumn_links.keys():
+                yield (rowuri,
+                       self.row_to_oolumn_links[colname],
+                       rdflib.Literal(colval))
+
+        # Intercolumn links
+        for soutar, link in self.intercolumn_links.items():
+            sourcecol, targetcol = soutar
+            for sourcenet in entities_per_column[sourcecol]:
+                for targetent in entities_per_column[targetcol]:
+                    yield (sourcenet, link, targetent)
+
+        yield (rowuri, rdftype, self.record_class)
+        yield (rowuri, self.labelpred, rdflib.Literal(rowname,
+                                                      lang=self.lang))
+
+    def triples(self, records: Iterable[Dict],
+                skip_first: bool = True) -> Iterator[Triple]:
+        """
+        :param skip_first: ignore the first record. The content of a
+            WikimarkupDynamicList starts with an empty one, preceding the
+            first row of the table
+        """
+        records = enumerate(records)
+        if skip_first:
+            records = itertools.islice(records, 1, None)
+        while True:
+            batch = list(itertools.islice(records, self.resolve_batch))
+            if len(batch) == 0:
+                return
+            # All the links of the batch are resolved in bulk beforehand
+            self.resolver.resolve_many(self.link_targets(
+                rec for _, rec in batch))
+            for index, rec in batch:
+                yield from self.record_triples(rec, index)
 
-                    for col_ent_uri in col_ent_uris:
-                        g.add((col_ent_uri, rdftype, self.column_classes[
-                            colname]))
-                        # Links between this column and the record
-                        if colname in self.row_to_oolumn_links.keys():
-                            g.add((rowuri,
-                                   self.row_to_oolumn_links[colname],
-                                   col_ent_uri))
-                        entities_per_column[colname].append(col_ent_uri)
-                # If the column is not in column_classes, its a literal
-                elif colname in row_to_column_links.keys():
-                    g.add((rowuri,
-                           self.row_to_oolumn_links[colname],
-                           rdflib.Literal(colval)))
-
-            # Intercolumn links
-            for soutar, link in self.intercolumn_links.items():
-                sourcecol, targetcol = soutar
-                for sourcenet in entities_per_column[sourcecol]:
-                    for targetent in entities_per_column[targetcol]:
-                        g.add((sourcenet,
-                               link,
-                               targetent))
-
-            g.add((rowuri, rdftype, self.record_class))
-            g.add((rowuri, self.labelpred, rdflib.Literal(rowname,
-                                                          lang=self.lang)))
-
+    def convert(self,
+                records: List[Dict],
+                skip_first: bool = True):
+        g = rdflib.Graph()
+        for triple in self.triples(records, skip_first=skip_first):
+            g.add(triple)
         return g
 
+    def convert_to_ntriples(self,
+                            records: Iterable[Dict],
+                            destination: str,
+                            dedupe_entities: bool = True,
+                            skip_first: bool = True) -> int:
+        """
+        Writes the triples as N-Triples while records are converted, one
+        record at a time, instead of building the whole graph in memory.
+        :param destination: a file path, "-" for the standard output. Paths
+            ending in .gz are gzip-compressed
+        :param dedupe_entities: labels and classes of entities appearing in
+            many records are written only once. This needs memory
+            proportional to the number of distinct entities; without it
+            memory use is constant, and duplicated triples are left for the
+            store to discard
+        :return: the number of triples written
+        """
+        seen = set()
+        written = 0
+        with open_ntriples_output(destination) as fout:
+            for triple in self.triples(records, skip_first=skip_first):
+                s, p, o = triple
+                if dedupe_entities and (p == rdftype or p == self.labelpred):
+                    if triple in seen:
+                        continue
+                    seen.add(triple)
+                fout.write(nt_line(triple))
+                written += 1
+        return written
+
+
+# The mapping of the sample list of assassinated leaders, as a spec for
+# records2rdf_from_spec. Names without "://" are local to the ontology
+LEADERS_SPEC = {
+    "ontology_namespace": "https://sample.ontolog/",
+    "entity_namespace": "https://en.wikipedia.org/wiki/",
+    "record_class": "Event",
+    "rowname_pattern": "Assesination of {__Target__}",
+    "column_classes": {
+        "Target": "Person",
+        "Title": "Office",
+        "Place": "Place",
+        "Assassin or other entity": "Collective_Person",
+        "Country": "Place"
+    },
+    "row_to_column_links": {
+        "Target": "hasAsVictim",
+        "Place": "happenedInPlace",
+        "Assassin or other entity": "hasAsPerpetrator",
+        "Date": "occurredInDate"
+    },
+    "intercolumn_links": [
+        ["Target", "Title", "holdsOfficeOf"],
+        ["Target", "Country", "livedInCountry"],
+        ["Place", "Country", "isLocatedIn"]
+    ],
+    "lang": "en"
+}
+
+
+def records2rdf_from_spec(spec: Dict,
+                          mappingfile: Optional[str] = None,
+                          source_id: Optional[str] = None) -> Records2RDF:
+    """
+    Builds a converter from a JSON-like mapping spec, see LEADERS_SPEC
+    """
+    ontns = rdflib.namespace.Namespace(spec["ontology_namespace"])
+
+    def term(name):
+        return rdflib.URIRef(name) if "://" in name else ontns[name]
+
+    return Records2RDF(
+        record_class=term(spec["record_class"]),
+        column_classes={k: term(v)
+                        for k, v in spec["column_classes"].items()},
+        row_to_oolumn_links={k: term(v)
+                             for k, v in spec["row_to_column_links"].items()},
+        intercolumn_links={(src, tgt): term(pred)
+                           for src, tgt, pred in spec["intercolumn_links"]},
+        rowname_pattern=spec["rowname_pattern"],
+        entity_namespace=rdflib.namespace.Namespace(spec["entity_namespace"]),
+        lang=spec.get("lang", "en"),
+        mappingfile=mappingfile,
+        source_id=source_id)
+
+
+def nt_term(term) -> str:
+    if isinstance(term, rdflib.Literal):
+        lex = str(term).replace("\\", "\\\\").replace('"', '\\"') \
+            .replace("\n", "\\n").replace("\r", "\\r")
+        if term.language:
+            return f'"{lex}"@{term.language}'
+        if term.datatype:
+            return f'"{lex}"^^<{term.datatype}>'
+        return f'"{lex}"'
+    return term.n3()
+
+
+def nt_line(triple: Triple) -> str:
+    s, p, o = triple
+    return f"{nt_term(s)} {nt_term(p)} {nt_term(o)} .\n"
+
+
+@contextlib.contextmanager
+def open_ntriples_output(destination: str):
+    if destination == "-":
+        yield sys.stdout
+    elif destination.endswith(".gz"):
+        with gzip.open(destination, "wt", encoding="utf-8") as fout:
+            yield fout
+    else:
+        with open(destination, "w", encoding="utf-8") as fout:
+            yield fout
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts the sample wikipedia list into a KG, and "
+                    "writes an ontology and config for it")
+    parser.add_argument("--stream", action="store_true",
+                        help="write the KG as N-Triples while the list is "
+                             "read and converted, one row at a time, "
+                             "instead of building it in memory and writing "
+                             "Turtle. Labels and classes of entities are "
+                             "written once, which keeps a set of them in "
+                             "memory, as are the links found")
+    parser.add_argument("--output", default=fnttl,
+                        help="where to write the KG. With --stream, '-' "
+                             "means the standard output and a .gz suffix "
+                             "compresses it")
+    parser.add_argument("--mapping", default=mappingfile,
+                        help="wikimapper database used to turn wikipedia "
+                             "URIs into wikidata ones. Pass '' to keep "
+                             "wikipedia URIs")
+    args = parser.parse_args()
+
+    with open(fnwikipediainput) as fin:
+        ontns = rdflib.namespace.Namespace("https://sample.ontolog/")
+        entns = rdflib.namespace.Namespace("https://en.wikipedia.org/wiki/")
+        row_class = ontns["Event"]
+        row_name = "Assesination of {__Target__}"
+        column_classes = {
+            "Target": ontns["Person"],
+            "Title": ontns["Office"],
+            "Place": ontns["Place"],
+            "Assassin or other entity": ontns["Collective_Person"],
+            "Country": ontns["Place"]
+        }
+        row_to_column_links = {
+            "Target": ontns["hasAsVictim"],
+            "Place": ontns["happenedInPlace"],
+            "Assassin or other entity": ontns["hasAsPerpetrator"],
+            "Date": ontns["occurredInDate"]
+        }
+        intercolumn_links = {
+            ("Target", "Title"): ontns["holdsOfficeOf"],
+            ("Target", "Country"): ontns["livedInCountry"],
+            ("Place", "Country"): ontns["isLocatedIn"]
+        }
+        datatypes = {
+            "Date": rdflib.URIRef("http://www.w3.org/2001/XMLSchema#string")
+        }
 
-with open(fnwikipediainput) as fin:
-    ontns = rdflib.namespace.Namespace("https://sample.ontolog/")
-    entns = rdflib.namespace.Namespace("https://en.wikipedia.org/wiki/")
-    row_class = ontns["Event"]
-    row_name = "Assesination of {__Target__}"
-    column_classes = {
-        "Target": ontns["Person"],
-        "Title": ontns["Office"],
-        "Place": ontns["Place"],
-        "Assassin or other entity": ontns["Collective_Person"],
-        "Country": ontns["Place"]
-    }
-    row_to_column_links = {
-        "Target": ontns["hasAsVictim"],
-        "Place": ontns["happenedInPlace"],
-        "Assassin or other entity": ontns["hasAsPerpetrator"],
-        "Date": ontns["occurredInDate"]
-    }
-    intercolumn_links = {
-        ("Target", "Title"): ontns["holdsOfficeOf"],
-        ("Target", "Country"): ontns["livedInCountry"],
-        ("Place", "Country"): ontns["isLocatedIn"]
-    }
-    datatypes = {
-        "Date": rdflib.URIRef("http://www.w3.org/2001/XMLSchema#string")
-    }
-
-    print("Starting parsing of ", fnwikipediainput)
-    wl = WikimarkupDynamicList(fin.read())
-    # print(str(wl))
-    cols_for_links = ["Target", "Place", "Country", "Assassin or other entity"]
-    links = wl.collec_links(cols=cols_for_links,
-                            link_ns=entns)
-    print(f"\tfound {len(links)} links")
-    with open("sample_data/leaders_uris_txt", "w") as fout:
-        for li in links:
-            fout.write(li + "\n")
-    print("\tcolumns:", wl.columns)
-
-    print(f"Will now run converter using urimapper {mappingfile}")
-    r2rdf = Records2RDF(
-        record_class=row_class,
-        column_classes=column_classes,
-        row_to_oolumn_links=row_to_column_links,
-        intercolumn_links=intercolumn_links,
-        rowname_pattern=row_name,
-        entity_namespace=entns,
-
-    )
-    the_kg = r2rdf.convert(wl.content)
-    # print(the_kg.serialize(format="ttl"))
-    print("\nA total of ", len(the_kg), "triples will be written to",
-          fnttl)
-
-    the_kg.serialize(format="ttl", destination=fnttl)
-
-    # Now we write down the ontology
-
-    ontology = rdflib.Graph()
-    owlns = rdflib.namespace.OWL
-    rdfsns = rdflib.namespace.RDFS
-    rdfns = rdflib.namespace.RDF
-    labelpred: rdflib.URIRef = rdflib.RDFS["label"]
-
-    # First all the classes, each with a label
-    ontology.add((ontns["ThingsDomain"], rdftype, owlns["Class"]))
-    ontology.add((ontns["ThingsDomain"], labelpred, rdflib.Literal(
-        "Reality", lang="en")))
-    ontology.add((row_class, rdftype, owlns["Class"]))
-    ontology.add((row_class, labelpred, rdflib.Literal("Event", lang="en")))
-    ontology.add((row_class, rdfsns["subClassOf"], ontns["ThingsDomain"]))
-    for k, v in column_classes.items():
-        ontology.add((v, rdftype, owlns["Class"]))
-        ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
-        ontology.add((v, rdfsns["subClassOf"], ontns["ThingsDomain"]))
-
-    # Now all the links
-    for k, v in row_to_column_links.items():
-        ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
-        ontology.add((v, rdfsns["domain"], row_class))
-        # Object Property
-        if k in column_classes.keys():
-            ontology.add((v, rdftype, owlns["ObjectProperty"]))
-            ontology.add((v, rdfsns["range"], column_classes[k]))
-        # Data Property
+        print("Starting parsing of ", fnwikipediainput)
+        if args.stream:
+            # Parsed while it is read and converted, one row at a time
+            wl = WikimarkupDynamicList(fin, lazy=True)
+            records = wl.rows()
         else:
-            ontology.add((v, rdftype, rdfns["Property"]))
-            ontology.add((v, rdfsns["range"], datatypes[k]))
-
-    for kk, v in intercolumn_links.items():
-        dom, ran = kk
-        ontology.add((v, rdftype, owlns["ObjectProperty"]))
-        ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
-        ontology.add((v, rdfsns["range"], column_classes[ran]))
-        ontology.add((v, rdfsns["domain"], column_classes[dom]))
-
-    print(f"The ontology consists of {len(ontology)} triples and"
-          f" will be written to {fnowl}")
-    ontology.serialize(format="ttl",
-                       destination=fnowl)
-
-    ents = [x.n3()[1:-1]
-            for x, _, _ in the_kg.triples((None,
-                                           rdftype,
-                                           column_classes["Target"]))][:3]
-
-    config_dict = {
-        "sparql_endpoint": "http://local_fuseki:3030/ds/query",
-        "sparql_credentials": ["admin", "PleaseD0Ch4ngeTh1sN0W!"],
-        "different_graphs": False,
-        "ontology_path": "/config/ontology_sample.owl",
-        "ontonamespace": "https://sample.ontolog/",
-        "ontology_config": {
-            "type_predicate": [
-                rdftype.n3()[1:-1]
-            ]
-        },
-        "openAPIExamples": {
-            "entities": ents,
-            "classes": [
-                column_classes["Target"].n3()[1:-1]
-            ],
-            "default_language": "en"
+            wl = WikimarkupDynamicList(fin.read())
+            records = wl.content
+        cols_for_links = ["Target", "Place", "Country",
+                          "Assassin or other entity"]
+        links = set()
+        # Of the config examples
+        targets = []
+
+        def collecting_links(recs, fout):
+            # The links of every record are written as it is converted
+            for index, rec in enumerate(recs):
+                for cn in cols_for_links:
+                    for lc in cell_links(rec, cn):
+                        if entns[lc] not in links:
+                            links.add(entns[lc])
+                            fout.write(entns[lc] + "\n")
+                if index > 0 and len(targets) < 3:
+                    targets.extend(links_from_cell(rec["Target"]))
+                yield rec
+
+        print(f"Will now run converter using mapping {args.mapping}")
+        r2rdf = Records2RDF(
+            record_class=row_class,
+            column_classes=column_classes,
+            row_to_oolumn_links=row_to_column_links,
+            intercolumn_links=intercolumn_links,
+            rowname_pattern=row_name,
+            entity_namespace=entns,
+            mappingfile=args.mapping or None
+        )
+        with open("sample_data/leaders_uris_txt", "w") as flinks:
+            records = collecting_links(records, flinks)
+            if args.stream:
+                numtriples = r2rdf.convert_to_ntriples(records, args.output)
+                print("\nA total of ", numtriples,
+                      "triples were written to", args.output)
+            else:
+                the_kg = r2rdf.convert(records)
+                print("\nA total of ", len(the_kg),
+                      "triples will be written to", args.output)
+                the_kg.serialize(format="ttl", destination=args.output)
+        print(f"\tfound {len(links)} links")
+        print("\tcolumns:", wl.columns)
+
+        # Now we write down the ontology
+
+        ontology = rdflib.Graph()
+        owlns = rdflib.namespace.OWL
+        rdfsns = rdflib.namespace.RDFS
+        rdfns = rdflib.namespace.RDF
+        labelpred: rdflib.URIRef = rdflib.RDFS["label"]
+
+        # First all the classes, each with a label
+        ontology.add((ontns["ThingsDomain"], rdftype, owlns["Class"]))
+        ontology.add((ontns["ThingsDomain"], labelpred, rdflib.Literal(
+            "Reality", lang="en")))
+        ontology.add((row_class, rdftype, owlns["Class"]))
+        ontology.add((row_class, labelpred, rdflib.Literal("Event", lang="en")))
+        ontology.add((row_class, rdfsns["subClassOf"], ontns["ThingsDomain"]))
+        for k, v in column_classes.items():
+            ontology.add((v, rdftype, owlns["Class"]))
+            ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
+            ontology.add((v, rdfsns["subClassOf"], ontns["ThingsDomain"]))
+
+        # Now all the links
+        for k, v in row_to_column_links.items():
+            ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
+            ontology.add((v, rdfsns["domain"], row_class))
+            # Object Property
+            if k in column_classes.keys():
+                ontology.add((v, rdftype, owlns["ObjectProperty"]))
+                ontology.add((v, rdfsns["range"], column_classes[k]))
+            # Data Property
+            else:
+                ontology.add((v, rdftype, rdfns["Property"]))
+                ontology.add((v, rdfsns["range"], datatypes[k]))
+
+        for kk, v in intercolumn_links.items():
+            dom, ran = kk
+            ontology.add((v, rdftype, owlns["ObjectProperty"]))
+            ontology.add((v, labelpred, rdflib.Literal(localname(v), lang="en")))
+            ontology.add((v, rdfsns["range"], column_classes[ran]))
+            ontology.add((v, rdfsns["domain"], column_classes[dom]))
+
+        print(f"The ontology consists of {len(ontology)} triples and"
+              f" will be written to {fnowl}")
+        ontology.serialize(format="ttl",
+                           destination=fnowl)
+
+        ents = [str(r2rdf._get_uri(lc)) for lc in targets[:3]]
+
+        config_dict = {
+            "sparql_endpoint": "http://local_fuseki:3030/ds/query",
+            "sparql_credentials": ["admin", "PleaseD0Ch4ngeTh1sN0W!"],
+            "different_graphs": False,
+            "ontology_path": "/config/ontology_sample.owl",
+            "ontonamespace": "https://sample.ontolog/",
+            "ontology_config": {
+                "type_predicate": [
+                    rdftype.n3()[1:-1]
+                ]
+            },
+            "openAPIExamples": {
+                "entities": ents,
+                "classes": [
+                    column_classes["Target"].n3()[1:-1]
+                ],
+                "default_language": "en"
+            }
         }
-    }
 
-    with open(fnconfig, "w") as fout:
-        fout.write(json.dumps(config_dict, indent=1))
-        print(f"The config was succesfully written to {fnconfig}")
+        with open(fnconfig, "w") as fout:
+            fout.write(json.dumps(config_dict, indent=1))
+            print(f"The config was succesfully written to {fnconfig}")
+
+        print("Finihsed\n\n")
+
 
-    print("Finihsed\n\n")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Fixtures of the tests. They run GrOntoPI, with an in-memory cache, against
+the SPARQL stand-in of the benchmarks serving a small synthetic knowledge
+graph in a thread of the test process, which counts the queries it gets.
+
+The config is read when the app is first imported, so it is written here,
+before any test module imports it. Tests needing other settings change the
+attributes of config.conf with monkeypatch.
+"""
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import rdflib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "grontopi"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+# For the command line tools, which import each other as top level modules
+sys.path.append(os.path.join(ROOT, "grontopi", "utils"))
+
+from sparql_standin import SPARQLHandler  # noqa: E402
+from synthetic import write_benchmark_data  # noqa: E402
+
+
+class CountingHandler(SPARQLHandler):
+    queries = []
+
+    def _answer(self, query):
+        CountingHandler.queries.append(query)
+        super()._answer(query)
+
+
+_server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+_workdir = tempfile.mkdtemp(prefix="grontopi_tests_")
+DATA = write_benchmark_data(
+    _workdir, num_classes=8, num_relations=8, num_entities=120,
+    mean_degree=4, num_hubs=2,
+    endpoint=f"http://127.0.0.1:{_server.server_port}/sparql")
+CountingHandler.graph = rdflib.Graph().parse(DATA["kg"])
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+os.environ["CONFIG_PATH"] = DATA["config"]
+
+
+def n3(uri: str) -> str:
+    return "<" + uri + ">"
+
+
+@pytest.fixture(scope="session")
+def kg():
+    """
+    The paths of the generated files, the URIs of the generated entities
+    and classes (see synthetic.write_benchmark_data) and the graph served
+    """
+    return dict(DATA, graph=CountingHandler.graph)
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    from fastapi.testclient import TestClient
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app_client):
+    """
+    A client of the app, whose cache is emptied before every test
+    """
+    from data_access.sparql_data_access import cache, tag_index
+    app_client.portal.call(cache.clear)
+    tag_index._local.clear()
+    return app_client
+
+
+@pytest.fixture
+def endpoint_queries():
+    """
+    The queries the stand-in gets during the test
+    """
+    CountingHandler.queries.clear()
+    return CountingHandler.queries
+
+
+@pytest.fixture
+def maintenance(monkeypatch):
+    """
+    Lets the maintenance routes (/cache/...) through
+    """
+    from config import conf
+    monkeypatch.setattr(conf, "maintenance_enabled", True)
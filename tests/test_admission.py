@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import n3
+
+from config import conf
+from utils import admission
+from utils.admission import AdmissionController
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def local_controller(rate=1.0, burst=2, max_in_flight=0):
+    return AdmissionController(rate=rate, burst=burst,
+                               max_in_flight=max_in_flight,
+                               in_flight_timeout=120, shared=False)
+
+
+def test_bucket_admits_a_burst_then_rejects_with_retry_after():
+    controller = local_controller(rate=0.5, burst=2)
+    for _ in range(2):
+        run(controller.release(run(controller.admit("ip:1", 1))))
+    with pytest.raises(HTTPException) as e:
+        run(controller.admit("ip:1", 1))
+    assert e.value.status_code == 429
+    assert int(e.value.headers["Retry-After"]) >= 1
+    # Other clients have their own bucket
+    assert run(controller.admit("ip:2", 1)) is not None
+
+
+def test_requests_costing_more_than_the_burst_can_pass():
+    controller = local_controller(rate=1, burst=2)
+    assert run(controller.admit("ip:1", 10)) is not None
+
+
+def test_in_flight_cap_rejects_with_503_until_released():
+    controller = local_controller(rate=0, max_in_flight=1)
+    ticket = run(controller.admit("ip:1", 1))
+    with pytest.raises(HTTPException) as e:
+        run(controller.admit("ip:2", 1))
+    assert e.value.status_code == 503
+    run(controller.release(ticket))
+    assert run(controller.admit("ip:2", 1)) is not None
+
+
+def test_routes_answer_429_over_the_rate(client, kg, monkeypatch):
+    monkeypatch.setattr(conf, "rate_limit_enabled", True)
+    monkeypatch.setattr(conf, "rate_limit_entities_per_token", 1)
+    monkeypatch.setattr(admission, "controller",
+                        local_controller(rate=0.01, burst=5))
+    entity = n3(kg["entities"][0])
+    # Posting 4 entities costs 5 tokens, the whole bucket
+    resp = client.post("/entities/by_ids", json=[entity] * 4)
+    assert resp.status_code == 200
+    resp = client.get("/entities/by_id", params={"entity_id": entity})
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+
+
+def test_304s_go_through_admission_control(client, kg, monkeypatch):
+    entity = n3(kg["entities"][0])
+    etag = client.get("/entities/by_id",
+                      params={"entity_id": entity}).headers["ETag"]
+    monkeypatch.setattr(conf, "rate_limit_enabled", True)
+    monkeypatch.setattr(admission, "controller",
+                        local_controller(rate=0.01, burst=1))
+    revalidate = {"If-None-Match": etag}
+    resp = client.get("/entities/by_id", params={"entity_id": entity},
+                      headers=revalidate)
+    assert resp.status_code == 304
+    resp = client.get("/entities/by_id", params={"entity_id": entity},
+                      headers=revalidate)
+    assert resp.status_code == 429
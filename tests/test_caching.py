@@ -0,0 +1,133 @@
+import asyncio
+
+from conftest import n3
+
+from config import conf
+from utils.Caching import CacheTagIndex, CompactSerializer, cache_key
+
+
+def test_serializer_round_trip_small_values_uncompressed():
+    serializer = CompactSerializer(compression_level=6,
+                                   min_compress_size=512)
+    value = [1.5, {"s": ["<a>", "<b>"], "n": None, "t": True}]
+    dumped = serializer.dumps(value)
+    assert dumped[:1] == CompactSerializer._PLAIN
+    assert serializer.loads(dumped) == value
+
+
+def test_serializer_round_trip_large_values_compressed():
+    serializer = CompactSerializer(compression_level=6,
+                                   min_compress_size=512)
+    value = [["<http://example.org/e%d>" % i, "label", "en"]
+             for i in range(200)]
+    dumped = serializer.dumps(value)
+    assert dumped[:1] == CompactSerializer._ZLIB
+    assert len(dumped) < len(CompactSerializer(
+        compression_level=0).dumps(value))
+    assert serializer.loads(dumped) == value
+
+
+def test_serializer_keeps_unicode_and_none():
+    serializer = CompactSerializer(compression_level=0)
+    assert serializer.loads(serializer.dumps("Tolstói")) == "Tolstói"
+    assert serializer.loads(None) is None
+
+
+def test_cache_key_is_a_prefixed_digest():
+    key = cache_key("SELECT * WHERE { ?s ?p ?o }", prefix="s")
+    assert key.startswith("s:")
+    assert len(key) == 2 + 40
+    assert key == cache_key("SELECT * WHERE { ?s ?p ?o }", prefix="s")
+    assert key != cache_key("SELECT * WHERE { ?s ?p ?o }", prefix="q")
+
+
+def test_repeated_description_is_served_from_the_cache(client, kg,
+                                                       endpoint_queries):
+    params = {"entity_id": n3(kg["entities"][5])}
+    first = client.get("/entities/by_id", params=params)
+    assert first.status_code == 200
+    assert len(endpoint_queries) > 0
+
+    endpoint_queries.clear()
+    second = client.get("/entities/by_id", params=params)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert endpoint_queries == []
+
+
+def run(coro):
+    return asyncio.get_event_loop_policy().new_event_loop() \
+        .run_until_complete(coro)
+
+
+class RecordingRedis:
+    """
+    Stands for the redis cache, keeping the raw commands sent to it
+    """
+    def __init__(self):
+        self.commands = []
+
+    def _build_key(self, key):
+        return "main:" + key
+
+    async def raw(self, *args):
+        self.commands.append(args)
+
+
+def test_shared_tags_expire_with_their_keys():
+    redis = RecordingRedis()
+    index = CacheTagIndex(redis, shared=True, ttl=3600)
+    run(index.add("s:1", ["<http://e/a>", "<http://e/b>"]))
+    command, script, tagkeys, args = redis.commands[0]
+    assert command == "eval" and "EXPIRE" in script
+    assert len(tagkeys) == 2
+    assert args == ["main:s:1", 3600]
+
+
+def test_local_tags_are_pruned_once_expired():
+    index = CacheTagIndex(cache=None, shared=False, ttl=1)
+    run(index.add("s:1", ["<http://e/a>"]))
+    assert len(index._local) == 1
+    # As if a second went by
+    for entry in index._local.values():
+        entry[0] -= 1
+    index._next_prune = 0
+    run(index.add("s:2", ["<http://e/b>"]))
+    assert list(index._local.values())[0][1] == {"s:2"}
+    assert len(index._local) == 1
+
+
+def test_local_tags_without_ttl_are_kept():
+    index = CacheTagIndex(cache=None, shared=False, ttl=0)
+    run(index.add("s:1", ["<http://e/a>"]))
+    run(index.add("s:2", ["<http://e/b>"]))
+    assert len(index._local) == 2
+
+
+def test_invalidation_drops_only_tagged_results(client, kg, maintenance,
+                                                endpoint_queries):
+    first, second = n3(kg["entities"][3]), n3(kg["entities"][4])
+    for entity in (first, second):
+        assert client.get("/entities/by_id",
+                          params={"entity_id": entity}).status_code == 200
+    resp = client.post("/cache/invalidate", json=[first])
+    assert resp.status_code == 200 and resp.json()["invalidated"] > 0
+
+    endpoint_queries.clear()
+    client.get("/entities/by_id", params={"entity_id": second})
+    assert endpoint_queries == []
+    client.get("/entities/by_id", params={"entity_id": first})
+    assert endpoint_queries != []
+
+
+def test_invalidation_is_refused_unless_enabled(client, kg):
+    resp = client.post("/cache/invalidate", json=[n3(kg["entities"][3])])
+    assert resp.status_code == 403
+
+
+def test_invalidation_takes_a_bounded_number_of_uris(client, kg, maintenance,
+                                                     monkeypatch):
+    monkeypatch.setattr(conf, "maintenance_max_uris", 2)
+    resp = client.post("/cache/invalidate",
+                       json=[n3(e) for e in kg["entities"][:3]])
+    assert resp.status_code == 400
@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import n3
+
+
+def connected_to(client, entity, **params):
+    return client.get("/entitites/connected_to",
+                      params=dict(params, central_entity=n3(entity)))
+
+
+@pytest.mark.parametrize("index", [0, 7, 42])
+def test_counts_only_gives_the_same_counts(client, kg, index):
+    entity = kg["entities"][index]
+    full = connected_to(client, entity).json()
+    counts = connected_to(client, entity, counts_only=True).json()
+    assert counts["linked_entities"] == []
+    assert counts["link_count"] == full["link_count"]
+
+
+def test_counts_only_takes_a_single_query(client, kg, endpoint_queries):
+    connected_to(client, kg["entities"][9], counts_only=True)
+    # The existence check, and the counts
+    assert len(endpoint_queries) == 2
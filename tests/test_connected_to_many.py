@@ -0,0 +1,43 @@
+import json
+
+from conftest import n3
+
+from config import conf
+
+URL = "/entitites/connected_to_many"
+UNKNOWN = "<https://bench.grontopi/entity/Nobody>"
+
+
+def canonical(summary):
+    return (sorted(json.dumps(le, sort_keys=True)
+                   for le in summary["linked_entities"]),
+            summary["link_count"])
+
+
+def test_every_entity_gets_what_connected_to_gives(client, kg, monkeypatch):
+    # Several batches, sharing some neighbours (the hubs)
+    monkeypatch.setattr(conf, "neighbourhood_batch_size", 2)
+    entities = [n3(e) for e in kg["entities"][:5]]
+    resp = client.post(URL, json=entities)
+    assert resp.status_code == 200
+    result = resp.json()
+    assert result["missing"] == []
+    assert set(result["neighbourhoods"]) == set(entities)
+    for entity in entities:
+        alone = client.get("/entitites/connected_to",
+                           params={"central_entity": entity}).json()
+        assert canonical(result["neighbourhoods"][entity]) == \
+            canonical(alone)
+
+
+def test_missing_entities_are_reported(client, kg):
+    entity = n3(kg["entities"][3])
+    result = client.post(URL, json=[UNKNOWN, entity]).json()
+    assert result["missing"] == [UNKNOWN]
+    assert list(result["neighbourhoods"]) == [entity]
+
+
+def test_too_many_entities_are_rejected(client, kg, monkeypatch):
+    monkeypatch.setattr(conf, "bulk_neighbourhood_max_entities", 2)
+    resp = client.post(URL, json=[n3(e) for e in kg["entities"][:3]])
+    assert resp.status_code == 400
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from conftest import n3
+
+from utils.entity_filter import BloomFilter, EntityFilter, entity_filter
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    added = [f"<https://e.org/in/{i}>" for i in range(1000)]
+    for item in added:
+        bloom.add(item)
+    assert all(item in bloom for item in added)
+    others = [f"<https://e.org/out/{i}>" for i in range(10000)]
+    false_positives = sum(item in bloom for item in others)
+    # 1% expected, with room for chance
+    assert false_positives < 300
+
+
+def test_bits_are_set_most_significant_first():
+    bloom = BloomFilter(size_bits=16, hashes=1)
+    item = "<https://e.org/x>"
+    pos = bloom.positions(item)[0]
+    bloom.add(item)
+    # As redis GETBIT reads the string
+    assert bloom.bits[pos // 8] == 1 << (7 - pos % 8)
+    assert item in BloomFilter(16, 1, bytes(bloom.bits))
+
+
+class PagedSource:
+    def __init__(self, entities):
+        self.entities = entities
+        self.pages = 0
+
+    async def typed_entities_count(self, onto_config):
+        return len(self.entities)
+
+    async def typed_entities(self, onto_config, start, size):
+        self.pages += 1
+        return self.entities[start:start + size]
+
+
+def test_build_pages_through_the_entities(client):
+    entities = [f"<https://e.org/in/{i}>" for i in range(25)]
+    source = PagedSource(entities)
+    bloom = client.portal.call(
+        EntityFilter(shared=False, page_size=10).build, source, None)
+    assert source.pages == 3
+    assert all(e in bloom for e in entities)
+
+
+@pytest.fixture
+def built_filter(client, monkeypatch):
+    from routes import graph, onto
+    bloom = client.portal.call(
+        EntityFilter(shared=False).build, graph, onto)
+    monkeypatch.setattr(entity_filter, "bloom", bloom)
+    return bloom
+
+
+def test_filter_holds_the_typed_entities(built_filter, kg):
+    assert all(n3(e) in built_filter for e in kg["entities"])
+
+
+def test_existence_is_checked_without_queries(client, built_filter, kg,
+                                              endpoint_queries, monkeypatch):
+    from routes import graph
+    asked = []
+
+    async def classes_for_entities(entitylist, onto_config):
+        asked.extend(entitylist)
+        return await real(entitylist=entitylist, onto_config=onto_config)
+    real = graph._get_classes_for_entities
+    monkeypatch.setattr(graph, "_get_classes_for_entities",
+                        classes_for_entities)
+
+    unknown = "<https://bench.grontopi/entity/Nobody>"
+    assert unknown not in built_filter
+    resp = client.get("/entitites/connected_to",
+                      params={"central_entity": unknown, "counts_only": True})
+    assert resp.status_code == 400
+    assert endpoint_queries == []
+
+    resp = client.get("/entitites/connected_to",
+                      params={"central_entity": n3(kg["entities"][3]),
+                              "counts_only": True})
+    assert resp.status_code == 200
+    assert asked == []
+
+
+@pytest.fixture
+def shared_conf(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import threading
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    from config import conf
+    monkeypatch.setattr(conf, "redis_cache_url", "127.0.0.1")
+    monkeypatch.setattr(conf, "redis_cache_port", server.server_address[1])
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+class BlockingSource(PagedSource):
+    # Pages through the entities once released
+    def __init__(self, entities):
+        super().__init__(entities)
+        self.paging = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def typed_entities(self, onto_config, start, size):
+        self.paging.set()
+        await self.release.wait()
+        return await super().typed_entities(onto_config, start, size)
+
+
+def test_shared_filter_keeps_entities_added_while_rebuilt(shared_conf):
+    entities = [f"<https://e.org/in/{i}>" for i in range(50)]
+    added = "<https://e.org/loaded>"
+
+    async def scenario():
+        builder = EntityFilter(shared=True, refresh_interval=0)
+        other = EntityFilter(shared=True, refresh_interval=3600)
+        await builder.sync(PagedSource(entities), None)
+        await other.sync(PagedSource([]), None)
+        assert other.generation == builder.generation
+        assert all(e in other for e in entities)
+
+        # Rebuilt while the other worker adds an entity
+        source = BlockingSource(entities)
+        rebuild = asyncio.ensure_future(builder.sync(source, None))
+        await source.paging.wait()
+        await other.add([added])
+        source.release.set()
+        await rebuild
+        assert added in builder
+
+        await other.sync(PagedSource([]), None)
+        assert other.generation == builder.generation
+        assert added in other
+
+    asyncio.new_event_loop().run_until_complete(scenario())
+
+
+def test_shared_bits_not_matching_the_meta_are_not_used(shared_conf):
+    async def scenario():
+        builder = EntityFilter(shared=True)
+        await builder.sync(PagedSource(["<https://e.org/a>"]), None)
+        await builder.cache.raw(
+            "set", builder._key(f"bits:{builder.generation}"), b"\x00")
+        await builder.cache.raw("incr", builder._key("stamp"))
+        other = EntityFilter(shared=True)
+        await other.sync(PagedSource([]), None)
+        assert not other.ready
+
+    asyncio.new_event_loop().run_until_complete(scenario())
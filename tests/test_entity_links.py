@@ -0,0 +1,116 @@
+import rdflib
+import pytest
+
+from conftest import n3
+
+RELATION = "https://bench.grontopi/onto/relation{}"
+
+
+def links(client, entity, predicate, **params):
+    return client.get("/entities/links",
+                      params=dict(params, entity_id=n3(entity),
+                                  predicate=n3(predicate)))
+
+
+def linked(graph, entity, predicate, direction):
+    entity, predicate = rdflib.URIRef(entity), rdflib.URIRef(predicate)
+    if direction == "out":
+        return {n3(str(o)) for o in graph.objects(entity, predicate)}
+    return {n3(str(s)) for s in graph.subjects(predicate, entity)}
+
+
+def busiest_relation(graph, entity):
+    # The relation with the most links into the entity
+    counts = {}
+    for _, p in graph.subject_predicates(rdflib.URIRef(entity)):
+        counts[str(p)] = counts.get(str(p), 0) + 1
+    return max(counts, key=counts.get)
+
+
+def test_page_without_links_is_empty(client, kg):
+    graph = kg["graph"]
+    entity = kg["entities"][5]
+    predicate = next(RELATION.format(i) for i in range(8)
+                     if not linked(graph, entity, RELATION.format(i), "out"))
+    resp = links(client, entity, predicate, direction="out")
+    assert resp.status_code == 200
+    page = resp.json()
+    assert page["total"] == 0
+    assert page["next_cursor"] is None
+    assert page["object_properties"] == []
+
+
+def test_cursor_pages_through_all_the_links(client, kg):
+    graph = kg["graph"]
+    hub = kg["entities"][0]
+    predicate = busiest_relation(graph, hub)
+    expected = linked(graph, hub, predicate, "in")
+    assert len(expected) > 3
+
+    seen, cursor, pages = [], "", 0
+    while True:
+        page = links(client, hub, predicate, direction="in", limit=3,
+                     cursor=cursor).json()
+        assert page["total"] == len(expected)
+        seen += [link["object"] for link in page["inverse_properties"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+    assert pages == -(-len(expected) // 3)
+
+
+@pytest.mark.parametrize("params", [{"cursor": "%%%"},
+                                    {"direction": "sideways"}])
+def test_invalid_parameters_are_rejected(client, kg, params):
+    resp = links(client, kg["entities"][0], RELATION.format(0), **params)
+    assert resp.status_code == 400
+
+
+def describe(client, entity, links_per_predicate):
+    return client.get("/entities/by_id",
+                      params={"entity_id": n3(entity),
+                              "links_per_predicate": links_per_predicate})
+
+
+@pytest.fixture
+def paged_links(monkeypatch):
+    from config import conf
+    monkeypatch.setattr(conf, "links_per_predicate", 2)
+    monkeypatch.setattr(conf, "links_max_page_size", 3)
+
+
+def links_by_predicate(desc):
+    counts = {}
+    for direction in ("object_properties", "inverse_properties"):
+        for link in desc[direction]:
+            if link["object"] == desc["uri"]:
+                # Links to itself are listed as out of it either way
+                continue
+            key = (link["predicate"], direction)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+@pytest.mark.parametrize("asked, most", [(1, 1), (2, 2), (1000, 3)])
+def test_links_per_predicate_is_bounded(client, kg, paged_links, asked,
+                                        most):
+    resp = describe(client, kg["entities"][0], asked)
+    assert resp.status_code == 200
+    desc = resp.json()
+    assert desc["link_pages"]
+    assert max(links_by_predicate(desc).values()) == most
+
+
+@pytest.mark.parametrize("asked", [0, -1])
+def test_all_the_links_cannot_be_asked_for_when_paged(client, kg,
+                                                      paged_links, asked):
+    assert describe(client, kg["entities"][0], asked).status_code == 400
+
+
+def test_all_the_links_are_given_unless_paged(client, kg):
+    assert describe(client, kg["entities"][0], -1).status_code == 400
+    desc = describe(client, kg["entities"][0], 0).json()
+    assert desc["link_pages"] is None
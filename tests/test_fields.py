@@ -0,0 +1,55 @@
+from conftest import n3
+
+LISTS = ("data_properties", "object_properties", "inverse_properties")
+
+
+def without_labels(links):
+    # In no particular order, as rows of different queries need not come in
+    # the same order
+    return sorted([dict(t, object_labels=None) for t in links],
+                  key=lambda t: sorted((k, str(v)) for k, v in t.items()))
+
+
+def describe(client, entity, **params):
+    return client.get("/entities/by_id",
+                      params=dict(params, entity_id=n3(entity)))
+
+
+def test_only_the_asked_fields_are_given(client, kg):
+    entity = kg["entities"][5]
+    full = describe(client, entity).json()
+    for field in LISTS:
+        resp = describe(client, entity, fields=field)
+        assert resp.status_code == 200
+        desc = resp.json()
+        # Labels of the objects are a field of their own
+        assert without_labels(desc[field]) == without_labels(full[field])
+        assert all(desc[other] is None for other in LISTS if other != field)
+        assert desc["label"] == full["label"]
+
+
+def test_object_labels_are_left_out_unless_asked(client, kg):
+    entity = kg["entities"][5]
+    links = describe(client, entity, fields="object_properties").json()
+    assert links["object_properties"]
+    assert not any(t["object_labels"] for t in links["object_properties"])
+    labelled = describe(client, entity,
+                        fields="object_properties, object_labels").json()
+    assert all(t["object_labels"] for t in labelled["object_properties"])
+
+
+def test_fewer_fields_take_fewer_queries(client, kg, endpoint_queries):
+    describe(client, kg["entities"][6])
+    full = len(endpoint_queries)
+    endpoint_queries.clear()
+    describe(client, kg["entities"][7], fields="data_properties")
+    assert len(endpoint_queries) < full
+
+
+def test_unknown_fields_are_rejected(client, kg):
+    resp = describe(client, kg["entities"][5], fields="data_properties,nope")
+    assert resp.status_code == 400
+    assert resp.json()["detail"]["fields"] == ["nope"]
+    resp = client.post("/entities/by_ids", params={"fields": "labels"},
+                       json=[n3(kg["entities"][5])])
+    assert resp.status_code == 400
@@ -0,0 +1,91 @@
+from email.utils import formatdate
+
+from conftest import n3
+
+import main
+from config import conf
+from utils import http_caching
+
+
+def get_entity(client, entity, **headers):
+    return client.get("/entities/by_id", params={"entity_id": entity},
+                      headers=headers)
+
+
+def test_listed_routes_carry_validators(client, kg):
+    resp = get_entity(client, n3(kg["entities"][1]))
+    assert resp.status_code == 200
+    assert resp.headers["ETag"].startswith('W/"')
+    assert resp.headers["Cache-Control"] == \
+        conf.http_cache_control["/entities/by_id"]
+    assert "Last-Modified" in resp.headers
+    other = get_entity(client, n3(kg["entities"][2]))
+    assert other.headers["ETag"] != resp.headers["ETag"]
+
+
+def test_unlisted_routes_carry_none(client, kg):
+    resp = client.post("/entities/by_ids", json=[n3(kg["entities"][1])])
+    assert resp.status_code == 200
+    assert "ETag" not in resp.headers
+
+
+def test_matching_etag_gets_304_without_queries(client, kg,
+                                                endpoint_queries):
+    entity = n3(kg["entities"][1])
+    etag = get_entity(client, entity).headers["ETag"]
+    endpoint_queries.clear()
+    resp = get_entity(client, entity, **{"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert endpoint_queries == []
+
+
+def test_recent_if_modified_since_gets_304(client, kg):
+    entity = n3(kg["entities"][1])
+    last_modified = get_entity(client, entity).headers["Last-Modified"]
+    resp = get_entity(client, entity, **{"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+    old = formatdate(0, usegmt=True)
+    assert get_entity(client, entity, **{
+        "If-Modified-Since": old}).status_code == 200
+
+
+def test_invalidation_changes_the_etag(client, kg, maintenance):
+    entity = n3(kg["entities"][1])
+    etag = get_entity(client, entity).headers["ETag"]
+    client.post("/cache/invalidate", json=[entity])
+    resp = get_entity(client, entity, **{"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_new_deployment_changes_the_etag(client, kg, monkeypatch):
+    entity = n3(kg["entities"][1])
+    first = get_entity(client, entity)
+    monkeypatch.setattr(main, "_deployment", "another")
+    resp = get_entity(client, entity, **{
+        "If-None-Match": first.headers["ETag"],
+        "If-Modified-Since": first.headers["Last-Modified"]})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != first.headers["ETag"]
+
+
+def test_deployment_tag_depends_on_version_schema_and_settings(
+        monkeypatch):
+    schema = {"paths": {"/entities/by_id": {}}}
+    tag = http_caching.deployment_tag("1.0", schema, conf)
+    assert tag == http_caching.deployment_tag("1.0", schema, conf)
+    assert tag != http_caching.deployment_tag("1.1", schema, conf)
+    assert tag != http_caching.deployment_tag(
+        "1.0", {"paths": {"/entities/by_id": {"total": 1}}}, conf)
+    monkeypatch.setattr(conf, "label_fallback_languages", ["es"])
+    assert tag != http_caching.deployment_tag("1.0", schema, conf)
+
+
+def test_304_carries_cors_headers(client, kg):
+    entity = n3(kg["entities"][1])
+    origin = {"Origin": "https://elsewhere.example"}
+    etag = get_entity(client, entity, **origin).headers["ETag"]
+    resp = get_entity(client, entity, **origin, **{"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert "access-control-allow-origin" in resp.headers
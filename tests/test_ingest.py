@@ -0,0 +1,61 @@
+import os
+
+import ingest
+
+
+WIKITABLE = """Some text
+{| class="wikitable sortable"
+!Target
+!Title
+|-
+|[[Person A]]
+|[[Office A]]
+|}
+"""
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fout:
+        fout.write(text)
+    return path
+
+
+def test_source_ids_tell_apart_files_with_the_same_name(tmp_path):
+    paths = [str(tmp_path / "a" / "table.wiki"),
+             str(tmp_path / "b" / "table.wiki")]
+    assert ingest.source_ids(paths) == ["a/table.wiki", "b/table.wiki"]
+    # A single source keeps its name alone
+    assert ingest.source_ids(paths[:1]) == ["table.wiki"]
+
+
+def test_same_named_sources_mint_different_uris(tmp_path):
+    spec = dict(ingest.LEADERS_SPEC, row_to_column_links={},
+                intercolumn_links=[], column_classes={"Target": "Person"})
+    sources = [write(str(tmp_path / d / "table.wiki"), WIKITABLE)
+               for d in ("a", "b")]
+    parts = [str(tmp_path / f"part{i}.nt") for i in range(2)]
+    for src, part, sid in zip(sources, parts, ingest.source_ids(sources)):
+        ingest.convert_source(src, part, spec, None, sid)
+
+    def record_uris(part):
+        with open(part) as fin:
+            return set(line.split(" ")[0] for line in fin
+                       if "Assesination of" in line)
+
+    first, second = record_uris(parts[0]), record_uris(parts[1])
+    assert len(first) == 1 and len(second) == 1
+    assert first != second
+
+
+def test_merge_dedupes_the_configured_label_predicates(tmp_path):
+    label = "<http://www.w3.org/2004/02/skos/core#prefLabel>"
+    assert label in ingest.entity_description_predicates()
+    line = f'<http://e/x> {label} "x"@en .\n'
+    link = "<http://e/x> <http://o/rel> <http://e/y> .\n"
+    parts = [write(str(tmp_path / f"p{i}.nt"), line + link)
+             for i in range(2)]
+    destination = str(tmp_path / "kg.nt")
+    assert ingest.merge_parts(parts, destination) == 3
+    with open(destination) as fin:
+        assert fin.read() == line + link + link
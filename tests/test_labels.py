@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import n3
+
+RDFS_LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
+
+
+def label_langs(client, entity, lang):
+    desc = client.get("/entities/by_id",
+                      params={"entity_id": n3(entity), "lang": lang,
+                              "fields": "data_properties"}).json()
+    return {label["label_lang"] for label in desc["label"]
+            if label["label_predicate"] == RDFS_LABEL}
+
+
+@pytest.mark.parametrize("lang", ["en", "es", "fr", "de"])
+def test_labels_in_the_language_asked(client, kg, lang):
+    # E3 has labels in all of them
+    assert label_langs(client, kg["entities"][3], lang) == {lang}
+
+
+def test_labels_fall_back_to_english(client, kg):
+    # E0 has only English labels
+    assert label_langs(client, kg["entities"][0], "de") == {"en"}
+
+
+def test_labels_are_fetched_once_for_all_languages(client, kg,
+                                                   endpoint_queries):
+    entities = [n3(e) for e in kg["entities"][10:20]]
+    client.post("/entities/by_ids", params={"lang": "en"}, json=entities)
+    assert any("label" in q for q in endpoint_queries)
+    endpoint_queries.clear()
+    resp = client.post("/entities/by_ids", params={"lang": "fr"},
+                       json=entities)
+    assert all(d["label"] for d in resp.json())
+    assert not any("label" in q for q in endpoint_queries)
@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+import rdflib
+
+import load_kg
+from config import conf
+
+
+A, B, P = "<http://e.org/a>", "<http://e.org/b>", "<http://o.org/p>"
+
+
+def test_line_uris_keeps_only_uris():
+    assert load_kg.line_uris(f"{A} {P} {B} .\n") == [A, B]
+    assert load_kg.line_uris(f'{A} {P} "a b . c"@en .\n') == [A]
+    assert load_kg.line_uris(f"_:b0 {P} {B} .\n") == [B]
+    assert load_kg.line_uris(f"{A} {P} _:b1 .\n") == [A]
+    assert load_kg.line_uris("not a triple\n") == []
+
+
+def test_uris_of_loaded_lines_are_accepted_by_invalidate(client,
+                                                        maintenance):
+    lines = ['<http://example.org/e/a> <http://example.org/o/p> "x"@en .\n',
+             "<http://example.org/e/a> <http://example.org/o/p> _:b0 .\n",
+             "_:b0 <http://example.org/o/p> <http://example.org/e/b> .\n"]
+    uris = sorted(set(u for line in lines for u in load_kg.line_uris(line)))
+    resp = client.post("/cache/invalidate", json=uris)
+    assert resp.status_code == 200
+
+
+@pytest.fixture
+def loaded_graph(kg):
+    graph = kg["graph"]
+    before = set(graph)
+    yield graph
+    for triple in set(graph) - before:
+        graph.remove(triple)
+
+
+def test_failed_invalidation_keeps_the_loaded_data(tmp_path, loaded_graph,
+                                                   monkeypatch, capsys):
+    path = tmp_path / "new.nt"
+    path.write_text("<http://example.org/loaded/a> <http://example.org/o/p> "
+                    "_:b0 .\n"
+                    "<http://example.org/loaded/a> <http://example.org/o/q> "
+                    '"x" .\n')
+    monkeypatch.setattr(sys, "argv", [
+        "load_kg.py", str(path),
+        "--gsp", conf.sparql_endpoint.replace("/sparql", "/data"),
+        "--retries", "0",
+        # Nothing listens there
+        "--api", "http://127.0.0.1:9"])
+    load_kg.main()
+    assert (rdflib.URIRef("http://example.org/loaded/a"), None, None) \
+        in loaded_graph
+    assert "could not drop the cached results" in capsys.readouterr().err
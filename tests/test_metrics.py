@@ -0,0 +1,73 @@
+import logging
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from conftest import n3
+
+from config import conf
+from utils.logconfig import RequestIdFilter, request_id_var
+
+
+def samples(client, name):
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    for family in text_string_to_metric_families(resp.text):
+        for sample in family.samples:
+            if sample.name == name:
+                yield sample.labels, sample.value
+
+
+def total(client, name, **labels):
+    return sum(value for found, value in samples(client, name)
+               if all(found.get(k) == v for k, v in labels.items()))
+
+
+def describe(client, kg, **headers):
+    return client.get("/entities/by_id",
+                      params={"entity_id": n3(kg["entities"][7])},
+                      headers=headers)
+
+
+def test_describing_counts_the_request_and_cache_lookups(client, kg):
+    requests = ("grontopi_request_duration_seconds_count",
+                {"route": "/entities/by_id", "method": "GET",
+                 "status": "200"})
+    before = total(client, requests[0], **requests[1])
+    misses = total(client, "grontopi_cache_lookups_total",
+                   tier=conf.cache_backend, outcome="miss")
+    hits = total(client, "grontopi_cache_lookups_total",
+                 tier=conf.cache_backend, outcome="hit")
+    assert describe(client, kg).status_code == 200
+    assert total(client, requests[0], **requests[1]) == before + 1
+    assert total(client, "grontopi_cache_lookups_total",
+                 tier=conf.cache_backend, outcome="miss") > misses
+    assert describe(client, kg).status_code == 200
+    assert total(client, "grontopi_cache_lookups_total",
+                 tier=conf.cache_backend, outcome="hit") > hits
+    assert total(client, "grontopi_cache_lookups_total", tier="redis") == 0
+
+
+def test_request_id_is_echoed_or_generated(client, kg):
+    resp = describe(client, kg, **{"X-Request-ID": "from-the-proxy"})
+    assert resp.headers["X-Request-ID"] == "from-the-proxy"
+    first = describe(client, kg).headers["X-Request-ID"]
+    second = describe(client, kg).headers["X-Request-ID"]
+    assert first and second and first != second
+
+
+def test_log_records_carry_the_request_id():
+    record = logging.makeLogRecord({"msg": "hello"})
+    token = request_id_var.set("abc")
+    try:
+        assert RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    assert record.request_id == "abc"
+
+
+def test_server_timing_is_sent_when_asked_for(client, kg):
+    assert "Server-Timing" not in describe(client, kg).headers
+    resp = describe(client, kg, **{"X-GrOntoPI-Trace": "1"})
+    timing = resp.headers["Server-Timing"]
+    assert "cache=" in timing
+    assert timing.split(", ")[-1].startswith("total;dur=")
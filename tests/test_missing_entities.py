@@ -0,0 +1,56 @@
+from conftest import n3
+
+UNKNOWN = "<https://bench.grontopi/entity/Nobody>"
+
+
+def test_unknown_entity_is_not_found(client):
+    resp = client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    assert resp.status_code == 404
+
+
+def test_repeated_unknown_lookup_makes_no_queries(client, endpoint_queries):
+    client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    assert endpoint_queries != []
+
+    endpoint_queries.clear()
+    resp = client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    assert resp.status_code == 404
+    resp = client.get("/entitites/connected_to",
+                      params={"central_entity": UNKNOWN})
+    assert resp.status_code == 400
+    assert endpoint_queries == []
+
+
+def test_invalidation_forgets_missing_entities(client, maintenance,
+                                              endpoint_queries):
+    client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    client.post("/cache/invalidate", json=[UNKNOWN])
+    endpoint_queries.clear()
+    client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    assert endpoint_queries != []
+
+
+def test_existing_entity_is_described(client, kg):
+    entity = n3(kg["entities"][0])
+    resp = client.get("/entities/by_id", params={"entity_id": entity})
+    assert resp.status_code == 200
+    assert resp.json()["uri"] == entity
+
+
+def test_unknown_entity_let_through_is_not_found(client, monkeypatch):
+    # As one of the few the entity filter wrongly lets through
+    from routes import graph
+
+    async def nothing_missing(entities, onto_config):
+        return []
+    monkeypatch.setattr(graph, "check_existence_of_entities",
+                        nothing_missing)
+    resp = client.get("/entities/by_id", params={"entity_id": UNKNOWN})
+    assert resp.status_code == 404
+
+
+def test_unknown_entities_are_left_out_of_by_ids(client, kg):
+    entity = n3(kg["entities"][0])
+    resp = client.post("/entities/by_ids", json=[entity, UNKNOWN])
+    assert resp.status_code == 200
+    assert [d["uri"] for d in resp.json()] == [entity]
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from conftest import n3
+
+from config import conf
+from routes import graph
+
+SUBJECT = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#subject>"
+
+
+def neighbourhood(client, entity, **params):
+    return client.get("/entities/neighbourhood",
+                      params=dict(params, central_entity=entity))
+
+
+def edge_set(graph):
+    return {(e["subject"], e["predicate"], e["object"])
+            for e in graph["edges"]}
+
+
+@pytest.mark.parametrize("index", [0, 11])
+def test_depth_one_has_the_links_of_connected_to(client, kg, index):
+    center = n3(kg["entities"][index])
+    graph = neighbourhood(client, center, depth=1).json()
+    around = client.get("/entitites/connected_to",
+                        params={"central_entity": center}).json()
+    links = {(center, le["link_type"], le["entity"])
+             if le["central_entity_role"] == SUBJECT
+             else (le["entity"], le["link_type"], center)
+             for le in around["linked_entities"]}
+    assert graph["truncated"] is None
+    assert edge_set(graph) == links
+    nodes = {n["entity"]: n for n in graph["nodes"]}
+    assert set(nodes) == {center} | {le["entity"]
+                                     for le in around["linked_entities"]}
+    assert nodes[center]["depth"] == 0
+    assert all(n["labels"] and n["entity_class"] for n in nodes.values())
+
+
+def test_deeper_levels_extend_the_graph(client, kg):
+    center = n3(kg["entities"][11])
+    one = neighbourhood(client, center, depth=1).json()
+    two = neighbourhood(client, center, depth=2).json()
+    assert edge_set(one) < edge_set(two)
+    depths = {n["entity"]: n["depth"] for n in two["nodes"]}
+    assert set(depths.values()) == {0, 1, 2}
+    assert all(s in depths and o in depths for s, _, o in edge_set(two))
+
+
+@pytest.mark.parametrize("limit, reason", [("max_nodes", "nodes"),
+                                           ("max_edges", "edges")])
+def test_expansion_stops_at_the_limits(client, kg, limit, reason):
+    graph = neighbourhood(client, n3(kg["entities"][0]), depth=2,
+                          **{limit: 5}).json()
+    assert graph["truncated"] == reason
+    assert len(graph["nodes" if reason == "nodes" else "edges"]) == 5
+
+
+@pytest.mark.parametrize("depth", [0, 4])
+def test_depth_out_of_range_is_rejected(client, kg, depth):
+    resp = neighbourhood(client, n3(kg["entities"][0]), depth=depth)
+    assert resp.status_code == 400
+
+
+def test_unknown_entity_is_rejected(client):
+    resp = neighbourhood(client, "<https://bench.grontopi/entity/Nobody>")
+    assert resp.status_code == 400
+
+
+def test_frontier_queries_do_not_depend_on_the_budget(client, kg,
+                                                      endpoint_queries):
+    center = n3(kg["entities"][11])
+    first = neighbourhood(client, center, depth=1, max_edges=50).json()
+    endpoint_queries.clear()
+    second = neighbourhood(client, center, depth=1, max_edges=60).json()
+    assert endpoint_queries == []
+    assert edge_set(first) == edge_set(second)
+
+
+def test_slow_queries_are_cut_at_the_deadline(client, kg, monkeypatch):
+    query_endpoint = graph._query_endpoint
+
+    def slow_query_endpoint(query, kind, *args):
+        if kind == "neighbourhood":
+            time.sleep(1)
+        return query_endpoint(query, kind, *args)
+
+    monkeypatch.setattr(graph, "_query_endpoint", slow_query_endpoint)
+    monkeypatch.setattr(conf, "neighbourhood_timeout", 0.2)
+    stime = time.monotonic()
+    result = neighbourhood(client, n3(kg["entities"][12]), depth=1).json()
+    assert time.monotonic() - stime < 1
+    assert result["truncated"] == "deadline"
+    assert result["edges"] == []
@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
+
+from conftest import n3
+
+from config import conf
+from utils import OAuth2_serverside as oauth
+
+
+def new_private_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM,
+                            serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo)
+    return pem, public_pem
+
+
+SERVER_KEY, SERVER_PUBLIC_KEY = new_private_key()
+OTHER_KEY, _ = new_private_key()
+
+
+@pytest.fixture(autouse=True)
+def auth_server(monkeypatch):
+    monkeypatch.setattr(oauth, "PUBLIC_KEY",
+                        jwk.construct(SERVER_PUBLIC_KEY, "RS256"))
+    oauth._verified_tokens.invalidate()
+    yield
+    oauth._verified_tokens.invalidate()
+
+
+def token(key=SERVER_KEY, expires_in=60, algorithm="RS256", roles=()):
+    claims = {"exp": int(time.time()) + expires_in,
+              "email": "someone@example.org", "resource_access": {},
+              "realm_access": {"roles": list(roles)}}
+    return jwt.encode(claims, key, algorithm=algorithm)
+
+
+def hmac_token(secret):
+    def encode(part):
+        return base64.urlsafe_b64encode(part).rstrip(b"=").decode()
+    unsigned = encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode()) \
+        + "." + encode(json.dumps(jwt.get_unverified_claims(token()))
+                       .encode())
+    signature = hmac.new(secret, unsigned.encode(), hashlib.sha256).digest()
+    return unsigned + "." + encode(signature)
+
+
+def cached(tok):
+    return oauth._verified_tokens[hashlib.sha256(tok.encode()).digest()]
+
+
+def test_verified_tokens_are_cached_by_their_digest():
+    tok = token()
+    payload = oauth.decode_token(tok)
+    assert cached(tok) == payload
+    assert len(oauth._verified_tokens) == 1
+
+
+def test_cached_tokens_are_rejected_once_expired(monkeypatch):
+    tok = token(expires_in=5)
+    oauth.decode_token(tok)
+    later = time.time() + 10
+    monkeypatch.setattr(oauth.time, "time", lambda: later)
+    with pytest.raises(ExpiredSignatureError):
+        oauth.decode_token(tok)
+    assert cached(tok) is None
+
+
+def tampered(tok):
+    header, payload, signature = tok.split(".")
+    middle = len(signature) // 2
+    flipped = "A" if signature[middle] != "A" else "B"
+    return ".".join([header, payload, signature[:middle] + flipped
+                     + signature[middle + 1:]])
+
+
+@pytest.mark.parametrize("bad", [
+    lambda: token(key=OTHER_KEY),
+    lambda: tampered(token()),
+    # Signed with the public key as an HMAC secret
+    lambda: hmac_token(SERVER_PUBLIC_KEY),
+])
+def test_badly_signed_tokens_are_never_cached(bad):
+    tok = bad()
+    for _ in range(2):
+        with pytest.raises(JWTError):
+            oauth.decode_token(tok)
+    assert len(oauth._verified_tokens) == 0
+
+
+def test_tokens_differing_from_a_cached_one_are_verified():
+    tok = token()
+    oauth.decode_token(tok)
+    with pytest.raises(JWTError):
+        oauth.decode_token(tampered(tok))
+
+
+def test_routes_reject_expired_cached_tokens(client, kg, monkeypatch):
+    monkeypatch.setattr(conf, "use_OAuth2", True)
+    tok = token(expires_in=5)
+    params = {"entity_id": n3(kg["entities"][0])}
+    headers = {"Authorization": "Bearer " + tok}
+    assert client.get("/entities/by_id", params=params,
+                      headers=headers).status_code == 200
+    assert client.get("/entities/by_id",
+                      params=params).status_code == 401
+    later = time.time() + 10
+    monkeypatch.setattr(oauth.time, "time", lambda: later)
+    assert client.get("/entities/by_id", params=params,
+                      headers=headers).status_code == 401
+
+
+def test_maintenance_needs_the_maintenance_role(client, maintenance,
+                                                monkeypatch):
+    monkeypatch.setattr(conf, "use_OAuth2", True)
+
+    def warm(tok):
+        return client.post("/cache/warm", json={},
+                           headers={"Authorization": "Bearer " + tok})
+    assert warm(token()).status_code == 403
+    assert warm(token(roles=[conf.maintenance_role])).status_code == 200
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+import rdflib
+
+from conftest import n3
+
+from config import conf
+from routes import graph
+
+# Long enough for results refreshed in a test not to be stale again before
+# it checks them, even on a loaded machine
+SOFT_TTL = 1
+
+
+def wait_for_refreshes(timeout=10):
+    deadline = time.time() + timeout
+    while graph._refresh_tasks or graph._refreshing:
+        assert time.time() < deadline, "the refresh did not finish"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def stale_soon(monkeypatch):
+    monkeypatch.setattr(conf, "cache_soft_ttl", SOFT_TTL)
+    # Results are refreshed at most once per cache_refresh_timeout
+    monkeypatch.setattr(conf, "cache_refresh_timeout", 0.1)
+
+
+def describe(client, entity):
+    resp = client.get("/entities/by_id", params={"entity_id": entity})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_stale_results_are_served_and_refreshed_once(client, kg, stale_soon,
+                                                     endpoint_queries):
+    entity = n3(kg["entities"][7])
+    fresh = describe(client, entity)
+    time.sleep(SOFT_TTL + 0.1)
+
+    endpoint_queries.clear()
+    assert describe(client, entity) == fresh
+    # Served from the cache; the stale results are refreshed afterwards
+    wait_for_refreshes()
+    refreshed = len(endpoint_queries)
+    assert refreshed > 0
+    # Fresh again, and a refresh is not started twice
+    endpoint_queries.clear()
+    describe(client, entity)
+    wait_for_refreshes()
+    assert endpoint_queries == []
+
+
+@pytest.fixture
+def new_link(kg):
+    graph_served = kg["graph"]
+    triple = (rdflib.URIRef(kg["entities"][8]),
+              rdflib.URIRef("https://bench.grontopi/onto/relation0"),
+              rdflib.URIRef(kg["entities"][9]))
+    assert triple not in graph_served
+    yield triple
+    graph_served.remove(triple)
+
+
+def test_version_changes_only_when_a_refresh_finds_new_data(
+        client, kg, stale_soon, new_link):
+    entity = n3(kg["entities"][8])
+    describe(client, entity)
+    version = client.portal.call(graph.data_version)
+
+    time.sleep(SOFT_TTL + 0.1)
+    describe(client, entity)
+    wait_for_refreshes()
+    assert client.portal.call(graph.data_version) == version
+
+    kg["graph"].add(new_link)
+    time.sleep(SOFT_TTL + 0.1)
+    describe(client, entity)
+    wait_for_refreshes()
+    assert client.portal.call(graph.data_version) > version
+    assert n3(kg["entities"][9]) in [
+        op["object"] for op in describe(client, entity)["object_properties"]]
+
+
+@pytest.fixture
+def new_label(kg):
+    triple = (rdflib.URIRef(kg["entities"][10]), rdflib.RDFS.label,
+              rdflib.Literal("Relabelled", lang="en"))
+    yield triple
+    kg["graph"].remove(triple)
+
+
+def test_stale_labels_are_refreshed_and_change_the_version(
+        client, kg, stale_soon, new_label, endpoint_queries):
+    entity = n3(kg["entities"][10])
+
+    def labels():
+        found = client.portal.call(graph._get_labels_for_entities, [entity])
+        return [label.label_value for label in found[entity]]
+
+    assert "Relabelled" not in labels()
+    version = client.portal.call(graph.data_version)
+    time.sleep(SOFT_TTL + 0.1)
+    endpoint_queries.clear()
+    labels()
+    wait_for_refreshes()
+    assert len(endpoint_queries) == 1
+    assert client.portal.call(graph.data_version) == version
+
+    kg["graph"].add(new_label)
+    time.sleep(SOFT_TTL + 0.1)
+    # Served stale, then refreshed
+    assert "Relabelled" not in labels()
+    wait_for_refreshes()
+    assert "Relabelled" in labels()
+    assert client.portal.call(graph.data_version) > version
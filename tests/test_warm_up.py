@@ -0,0 +1,35 @@
+from conftest import n3
+
+from config import conf
+
+
+def test_warm_up_is_refused_unless_enabled(client):
+    assert client.post("/cache/warm", json={}).status_code == 403
+
+
+def test_warmed_up_entities_are_served_from_the_cache(client, kg, maintenance,
+                                                      endpoint_queries):
+    entities = [n3(e) for e in kg["entities"][20:23]]
+    resp = client.post("/cache/warm", json={"entity_ids": entities,
+                                            "class_ids": []})
+    assert resp.status_code == 200
+    assert resp.json()["failures"] == 0
+    assert endpoint_queries != []
+
+    endpoint_queries.clear()
+    for entity in entities:
+        assert client.get("/entities/by_id",
+                          params={"entity_id": entity}).status_code == 200
+        assert client.get("/entitites/connected_to",
+                          params={"central_entity": entity}
+                          ).status_code == 200
+    assert endpoint_queries == []
+
+
+def test_warm_up_takes_a_bounded_number_of_uris(client, kg, maintenance,
+                                                monkeypatch):
+    monkeypatch.setattr(conf, "maintenance_max_uris", 2)
+    resp = client.post("/cache/warm", json={
+        "entity_ids": [n3(e) for e in kg["entities"][:2]],
+        "class_ids": [n3(kg["classes"][0])]})
+    assert resp.status_code == 400
@@ -0,0 +1,75 @@
+import io
+
+import rdflib
+
+from x2KG import Records2RDF, WikimarkupDynamicList, cell_links
+
+TABLE = """Some text before the table
+{| class="wikitable sortable"
+!Target
+!Title
+!Date
+|-
+|[[Person A]]
+| rowspan="2" |[[Office A]]
+|{{dts|1901}}
+|-
+|[[Person B|B]]
+|{{dts|1902}}
+|-
+|[[Person C]], [[Person D]]
+|[[Office B]]
+|1903
+|}
+Some text after it
+"""
+
+
+def test_rows_repeat_cells_spanning_several_rows():
+    rows = list(WikimarkupDynamicList(TABLE, lazy=True).rows())
+    header, *records = rows
+    assert list(header.keys()) == ["Target", "Title", "Date"]
+    assert [r["Title"] for r in records] == \
+        ["[[Office A]]", "[[Office A]]", "[[Office B]]"]
+    assert [r["Date"] for r in records] == ["1901", "1902", "1903"]
+
+
+def test_links_are_extracted_once_per_cell():
+    records = list(WikimarkupDynamicList(TABLE, lazy=True).rows())[1:]
+    assert cell_links(records[1], "Target") == ["Person_B"]
+    assert cell_links(records[2], "Target") == ["Person_C", "Person_D"]
+
+
+def test_lazy_rows_match_the_parsed_content():
+    eager = WikimarkupDynamicList(TABLE)
+    lazy = WikimarkupDynamicList(TABLE, lazy=True)
+    assert [dict(r) for r in lazy.rows()] == [dict(r) for r in eager.content]
+    assert lazy.columns == eager.columns
+
+
+def test_rows_can_be_read_from_lines():
+    from_lines = WikimarkupDynamicList(io.StringIO(TABLE), lazy=True)
+    assert [dict(r) for r in from_lines.rows()] == \
+        [dict(r) for r in WikimarkupDynamicList(TABLE).content]
+
+
+def converter():
+    ns = rdflib.Namespace("https://o.org/")
+    return Records2RDF(
+        record_class=ns["Event"],
+        column_classes={"Target": ns["Person"], "Title": ns["Office"]},
+        row_to_oolumn_links={"Target": ns["victim"], "Date": ns["date"]},
+        intercolumn_links={("Target", "Title"): ns["holds"]},
+        rowname_pattern="Event of {__Target__}",
+        entity_namespace=rdflib.Namespace("https://en.wikipedia.org/wiki/"),
+        mappingfile=None, source_id="table")
+
+
+def test_streamed_ntriples_match_the_converted_graph(tmp_path):
+    converted = converter().convert(WikimarkupDynamicList(TABLE).content)
+    path = tmp_path / "kg.nt"
+    rows = WikimarkupDynamicList(io.StringIO(TABLE), lazy=True).rows()
+    written = converter().convert_to_ntriples(rows, str(path))
+    streamed = rdflib.Graph().parse(str(path), format="nt")
+    assert written == len(streamed)
+    assert set(streamed) == set(converted)